@@ -611,7 +611,7 @@ def display_answer():
                     </div>
                     <div style="background: #f9fafb; padding: 1rem; border-radius: 6px; border-left: 3px solid #f59e0b; margin-bottom: 1rem;">
                         <div style="font-weight: 600; color: #1f2937; margin-bottom: 0.5rem;">คำอธิบาย</div>
-                        <div style="color: #6b7280; line-height: 1.6;">{law['text']}</div>
+                        <div style="color: #6b7280; line-height: 1.6;">{law.get('snippet', law.get('text', ''))}</div>
                     </div>
                 </div>
                 """, unsafe_allow_html=True)
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Thai AI Lawyer - Index Artifact
+คอมไพล์ law_data.json เป็นไฟล์ดัชนีสำเร็จรูป (binary) ล่วงหน้า แล้วให้ server เปิดแบบ mmap ตอนเริ่มระบบ
+ไม่ต้องอ่าน JSON และตัดคำใหม่ทุก worker และทุก worker ใช้หน้าหน่วยความจำของไฟล์ร่วมกันผ่าน page cache
+
+สร้างไฟล์ด้วย:  python artifact.py [--data law_data.json] [--output law_data.idx]
+"""
+
+import argparse
+import hashlib
+import importlib
+import importlib.metadata
+import json
+import logging
+import math
+import mmap
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from keyword_matcher import KeywordMatcher
+from law_index import BM25_B, BM25_FIELD_WEIGHTS, BM25_K1, LawIndex
+from law_store import LawStore
+from passages import PASSAGE_LENGTH
+from term_matrix import TermMatrix
+
+logger = logging.getLogger("thai_ai_lawyer.artifact")
+
+DEFAULT_ARTIFACT = "law_data.idx"
+MAGIC = b"THLAWIDX"
+FORMAT_VERSION = 2
+# array แต่ละชุดเริ่มที่ตำแหน่งหารด้วย ALIGNMENT ลงตัว (อ่านเป็น array ได้โดยตรงจาก mmap)
+ALIGNMENT = 64
+# MAGIC + ความยาว header (8 byte)
+PREAMBLE_SIZE = len(MAGIC) + 8
+
+Snapshot = Tuple[LawStore, LawIndex, TermMatrix]
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def build_key(data_version: str, matcher: Optional[KeywordMatcher]) -> str:
+    """
+    ค่าที่ไฟล์ดัชนีต้องตรงจึงจะใช้ได้: รุ่นข้อมูล (hash ของ JSON) รุ่นรูปแบบไฟล์ รุ่นตัวตัดคำ
+    ขนาด passage ค่า BM25F และคำสำคัญของ matcher ที่ใช้คำนวณป้ายกำกับ
+    """
+    parts = {
+        "format": FORMAT_VERSION,
+        "data_version": data_version,
+        "pythainlp": importlib.metadata.version("pythainlp"),
+        "passage_length": PASSAGE_LENGTH,
+        "bm25": [BM25_K1, BM25_B, BM25_FIELD_WEIGHTS],
+        "matcher": matcher.fingerprint if matcher else None,
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def write_artifact(path: str, key: str, store: LawStore, index: LawIndex, matrix: TermMatrix) -> int:
+    """
+    บันทึก store, ดัชนี และเมทริกซ์ BM25F เป็นไฟล์เดียว คืนขนาดไฟล์ (byte)
+    รูปแบบ: MAGIC, ความยาว header, header JSON (key, ข้อมูลประกอบ, ตำแหน่ง/ชนิด/ขนาดของ array) แล้วตามด้วย array
+    เขียนไฟล์ชั่วคราวแล้วแทนที่ทีเดียว server ที่เปิดไฟล์เดิมอยู่จึงยังอ่านไฟล์เดิมได้ตามปกติ
+    """
+    arrays: Dict[str, np.ndarray] = {}
+    meta: dict = {}
+    for part_arrays, part_meta in (store.to_arrays(), index.to_arrays(), (matrix.to_arrays(), {})):
+        arrays.update(part_arrays)
+        meta.update(part_meta)
+
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        array = arrays[name] = np.ascontiguousarray(array)
+        layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset = _align(offset + array.nbytes)
+
+    header = json.dumps(
+        {"format": FORMAT_VERSION, "key": key, "meta": meta, "arrays": layout}, ensure_ascii=False
+    ).encode("utf-8")
+    data_start = _align(PREAMBLE_SIZE + len(header))
+
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(len(header).to_bytes(8, "little"))
+        f.write(header)
+        for name, array in arrays.items():
+            f.write(b"\0" * (data_start + layout[name]["offset"] - f.tell()))
+            f.write(array.tobytes())
+        size = f.tell()
+    os.replace(temporary_path, path)
+    return size
+
+
+def load_artifact(path: str, key: str) -> Optional[Snapshot]:
+    """
+    เปิดไฟล์ดัชนีแบบ mmap (อ่านอย่างเดียว) แล้วสร้าง store, ดัชนี และเมทริกซ์จาก array ในไฟล์โดยไม่คัดลอก
+    คืน None เมื่อไม่มีไฟล์ ไฟล์เสีย หรือ key ไม่ตรง (ข้อมูลหรือค่าตั้งต้นเปลี่ยนไปแล้ว) ให้สร้างจาก JSON แทน
+    """
+    try:
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        logger.info("ไม่พบไฟล์ดัชนีสำเร็จรูป %s", path)
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning("เปิดไฟล์ดัชนี %s ไม่ได้: %s", path, e)
+        return None
+
+    try:
+        if mapped[:len(MAGIC)] != MAGIC:
+            raise ValueError("ไม่ใช่ไฟล์ดัชนีของระบบ")
+        header_length = int.from_bytes(mapped[len(MAGIC):PREAMBLE_SIZE], "little")
+        header = json.loads(mapped[PREAMBLE_SIZE:PREAMBLE_SIZE + header_length].decode("utf-8"))
+        if header.get("format") != FORMAT_VERSION or header.get("key") != key:
+            logger.warning("ไฟล์ดัชนี %s สร้างจากข้อมูลหรือค่าตั้งต้นรุ่นอื่น ต้องสร้างใหม่ด้วย python artifact.py", path)
+            return None
+
+        data_start = _align(PREAMBLE_SIZE + header_length)
+        arrays = {}
+        for name, spec in header["arrays"].items():
+            dtype = np.dtype(spec["dtype"])
+            count = math.prod(spec["shape"])
+            array = np.frombuffer(mapped, dtype=dtype, count=count, offset=data_start + spec["offset"]) \
+                if count else np.empty(0, dtype=dtype)
+            arrays[name] = array.reshape(spec["shape"])
+
+        meta = header["meta"]
+        store = LawStore.from_arrays(arrays, meta)
+        index = LawIndex.from_arrays(store, arrays, meta)
+        matrix = TermMatrix.from_arrays(index, arrays)
+    except (ValueError, KeyError, TypeError) as e:
+        logger.warning("อ่านไฟล์ดัชนี %s ไม่ได้: %s", path, e)
+        return None
+    return store, index, matrix
+
+
+def main():
+    parser = argparse.ArgumentParser(description="คอมไพล์ law_data.json เป็นไฟล์ดัชนีสำเร็จรูป")
+    parser.add_argument("--data", default=os.getenv("LAW_DATA_PATH", "law_data.json"), help="ไฟล์ข้อมูลกฎหมาย (JSON)")
+    parser.add_argument("--output", default=os.getenv("LAW_ARTIFACT_PATH") or DEFAULT_ARTIFACT,
+                        help="ไฟล์ดัชนีที่จะสร้าง")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    # สร้างดัชนีจาก JSON เสมอ (ไม่อ่านไฟล์ดัชนีเดิม) ด้วยค่าตั้งต้นเดียวกับ server
+    os.environ["LAW_DATA_PATH"] = args.data
+    os.environ["LAW_ARTIFACT_PATH"] = ""
+    os.environ["LAW_BACKEND"] = "memory"
+    started = time.perf_counter()
+    app_module = importlib.import_module("main")
+    app_module.startup()
+    snapshot = app_module.SNAPSHOT
+    if not len(snapshot.store):
+        raise SystemExit(f"ไม่มีข้อมูลกฎหมายใน {args.data}")
+
+    key = build_key(snapshot.version, app_module.LAW_MATCHER)
+    size = write_artifact(args.output, key, snapshot.store, snapshot.index, snapshot.matrix)
+    logger.info("สร้าง %s สำเร็จ (%d ข้อ, %.1f MB) ใน %.2f วินาที",
+                args.output, len(snapshot.store), size / 1e6, time.perf_counter() - started)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Thai AI Lawyer - Cache
+cache แบบ LRU จำกัดขนาด (มีอายุข้อมูลได้) พร้อมสถิติ hit/miss/eviction
+และ cache บน SQLite สำหรับใช้ร่วมกันระหว่างหลาย worker
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class LRUCache:
+    """cache ในหน่วยความจำของ process ที่ลบรายการที่ไม่ได้ใช้นานที่สุดเมื่อเต็ม"""
+
+    def __init__(self, maxsize: int = 256, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        # อายุของแต่ละรายการ (วินาที) None หรือ 0 คือไม่หมดอายุ
+        self.ttl = ttl or None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._expires: Dict[Hashable, float] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """คืนค่าที่เก็บไว้ หรือ None ถ้าไม่มีหรือหมดอายุแล้ว"""
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None and self.ttl and self._expires[key] <= time.monotonic():
+                del self._data[key]
+                del self._expires[key]
+                self.expirations += 1
+                value = None
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        """เก็บค่า และลบรายการเก่าที่สุดถ้าเกินขนาด"""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if self.ttl:
+                self._expires[key] = time.monotonic() + self.ttl
+            while len(self._data) > self.maxsize:
+                old_key, _ = self._data.popitem(last=False)
+                self._expires.pop(old_key, None)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._expires.clear()
+
+    def reset_stats(self):
+        """เริ่มนับสถิติใหม่ (เรียกใน process ลูกที่ fork มา ซึ่งได้ตัวนับของ process แม่ติดมาด้วย)"""
+        # ไม่ใช้ self._lock เพราะ lock ที่ fork มาอาจถูกถือค้างโดย thread ของ process แม่
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """สถิติการใช้งาน cache"""
+        lookups = self.hits + self.misses
+        return {
+            "backend": "memory",
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class SQLiteCache:
+    """
+    cache บนไฟล์ SQLite ที่หลาย process ใช้ร่วมกันได้ (เช่น uvicorn หลาย worker)
+    มีเมธอดเหมือน LRUCache เก็บค่าเป็น JSON และคีย์ต้องเป็นข้อความ
+    สถิติ hits/misses/evictions นับเฉพาะของ process นี้ ส่วน size อ่านจากฐานข้อมูล
+    """
+
+    def __init__(self, path: str, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl or None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._lock = threading.Lock()
+        self._connect()
+
+    def _connect(self):
+        # การเชื่อมต่อ SQLite ใช้ข้าม fork ไม่ได้ จึงจำ pid ไว้และเชื่อมต่อใหม่ใน process ลูก
+        self._pid = os.getpid()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)")
+        self._conn.commit()
+
+    @property
+    def _connection(self) -> sqlite3.Connection:
+        if self._pid != os.getpid():
+            self._connect()
+        return self._conn
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def get(self, key: str) -> Optional[Any]:
+        """คืนค่าที่เก็บไว้ หรือ None ถ้าไม่มีหรือหมดอายุแล้ว"""
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[1] is not None and row[1] <= now:
+                self._connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self._connection.commit()
+                self.expirations += 1
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._connection.execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+            self._connection.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Any):
+        """เก็บค่า และลบรายการที่ไม่ได้ใช้นานที่สุดถ้าเกินขนาด"""
+        if self.maxsize <= 0:
+            return
+        now = time.time()
+        expires = now + self.ttl if self.ttl else None
+        data = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires, accessed) VALUES (?, ?, ?, ?)",
+                (key, data, expires, now)
+            )
+            cursor = self._connection.execute(
+                "DELETE FROM cache WHERE key IN ("
+                "SELECT key FROM cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.maxsize,)
+            )
+            self.evictions += max(cursor.rowcount, 0)
+            self._connection.commit()
+
+    def clear(self):
+        with self._lock:
+            self._connection.execute("DELETE FROM cache")
+            self._connection.commit()
+
+    def reset_stats(self):
+        """เริ่มนับสถิติใหม่ (เรียกใน process ลูกที่ fork มา ซึ่งได้ตัวนับของ process แม่ติดมาด้วย)"""
+        # ไม่ใช้ self._lock เพราะ lock ที่ fork มาอาจถูกถือค้างโดย thread ของ process แม่
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """สถิติการใช้งาน cache"""
+        lookups = self.hits + self.misses
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "size": len(self),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Thai AI Lawyer - Search Executor
+รันงานค้นหาที่ใช้ CPU หนักนอก event loop (inline, thread pool หรือ process pool)
+พร้อมจำกัดจำนวนคำขอที่ทำงานพร้อมกัน (admission control)
+"""
+
+import asyncio
+import contextvars
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+EXECUTION_MODES = ("inline", "thread", "process")
+
+
+class ExecutorSaturated(Exception):
+    """คำขอเต็มทั้ง worker และคิวแล้ว ควรตอบ 503 ให้ผู้ใช้ลองใหม่"""
+
+
+class StaleWorker(Exception):
+    """worker process มีข้อมูลคนละรุ่นกับ snapshot ที่คำขอตรึงไว้"""
+
+
+def _run_checked(snapshot_version: Callable[[], Any], expected: Any, func: Callable[..., Any], *args: Any) -> Any:
+    # รันใน worker process: ปฏิเสธงานถ้าข้อมูลที่ fork มาไม่ใช่รุ่นที่คำขอใช้
+    if snapshot_version() != expected:
+        raise StaleWorker()
+    return func(*args)
+
+
+class SearchExecutor:
+    """
+    ตัวรันงานค้นหาแบบเลือกโหมดได้
+    - inline: รันใน event loop โดยตรง (แบบเดิม)
+    - thread: รันใน thread pool ขนาดจำกัด event loop จึงรับคำขออื่นได้ระหว่างรอ
+    - process: รันใน process pool ที่โหลดข้อมูลและดัชนีไว้แล้วในทุก worker (ใช้ CPU ได้หลายคอร์)
+    รับคำขอพร้อมกันได้ไม่เกิน workers + queue_depth ที่เหลือจะถูกปฏิเสธด้วย ExecutorSaturated
+    snapshot_version (ฟังก์ชันระดับโมดูล) คืนรุ่นข้อมูลที่งานใช้ โหมด process ส่งรุ่นของคำขอไปกับงานทุกชิ้น
+    ถ้า worker มีข้อมูลคนละรุ่น (เช่น pool ใหม่ที่ fork หลัง reload) งานนั้นจะรันใน thread ของ process นี้แทน
+    """
+
+    def __init__(self, mode: str = "thread", workers: Optional[int] = None, queue_depth: int = 32,
+                 initializer: Optional[Callable[[], Any]] = None,
+                 snapshot_version: Optional[Callable[[], Any]] = None):
+        if mode not in EXECUTION_MODES:
+            raise ValueError(f"ไม่รู้จักโหมดการรัน: {mode} (เลือกได้: {', '.join(EXECUTION_MODES)})")
+        self.mode = mode
+        self.workers = 1 if mode == "inline" else (workers or os.cpu_count() or 1)
+        self.queue_depth = queue_depth
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.stale = 0
+        self._lock = threading.Lock()
+        self._initializer = initializer
+        self._snapshot_version = snapshot_version
+        self._pool: Optional[Executor] = None
+
+    @property
+    def capacity(self) -> int:
+        """จำนวนคำขอสูงสุดที่รับได้พร้อมกัน (กำลังทำงาน + รอคิว)"""
+        return self.workers + self.queue_depth
+
+    def _get_pool(self) -> Optional[Executor]:
+        # สร้าง pool เมื่อใช้ครั้งแรก เพื่อให้ process worker fork หลังโหลดข้อมูลเสร็จแล้ว
+        if self._pool is None and self.mode != "inline":
+            if self.mode == "thread":
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="search")
+            else:
+                # fork ทำให้ worker ได้ข้อมูลและดัชนีที่สร้างไว้แล้วแบบ copy-on-write
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context("fork" if "fork" in methods else None)
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=context, initializer=self._initializer
+                )
+        return self._pool
+
+    def _admit(self):
+        with self._lock:
+            if self.in_flight >= self.capacity:
+                self.rejected += 1
+                raise ExecutorSaturated()
+            self.in_flight += 1
+
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """รัน func(*args) ตามโหมดที่ตั้งไว้ (ในโหมด process ต้องเป็นฟังก์ชันระดับโมดูลที่ pickle ได้)"""
+        self._admit()
+        try:
+            pool = self._get_pool()
+            if pool is None:
+                return func(*args)
+            loop = asyncio.get_running_loop()
+            # ส่ง context ของคำขอ (เช่น snapshot ข้อมูลที่ตรึงไว้) ไปยัง thread ด้วย
+            context = contextvars.copy_context()
+            if self.mode == "thread":
+                return await loop.run_in_executor(pool, context.run, func, *args)
+            if self._snapshot_version is None:
+                return await loop.run_in_executor(pool, func, *args)
+            try:
+                return await loop.run_in_executor(
+                    pool, _run_checked, self._snapshot_version, self._snapshot_version(), func, *args
+                )
+            except StaleWorker:
+                # คำขอที่ตรึงข้อมูลรุ่นเดิมไว้แต่ได้ pool ที่ fork หลัง reload ใช้ snapshot ของ process นี้แทน
+                with self._lock:
+                    self.stale += 1
+                return await loop.run_in_executor(None, context.run, func, *args)
+        finally:
+            self._release()
+
+    def recycle(self):
+        """
+        ให้งานถัดไปใช้ process pool ใหม่ที่ fork จากข้อมูลปัจจุบัน (เรียกหลัง reload ข้อมูล)
+        งานที่ค้างอยู่ใน pool เดิมทำต่อจนเสร็จ (worker เดิมมีข้อมูลรุ่นที่งานเหล่านั้นใช้) โหมด thread และ inline ใช้ข้อมูลร่วมกับ server อยู่แล้ว
+        """
+        if self.mode == "process" and self._pool is not None:
+            pool, self._pool = self._pool, None
+            pool.shutdown(wait=False)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> Dict[str, Any]:
+        """สถานะการใช้งาน worker และคิว"""
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "queue_depth": self.queue_depth,
+            "in_flight": self.in_flight,
+            "capacity": self.capacity,
+            "saturation": round(self.in_flight / self.capacity, 4) if self.capacity else 0.0,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "stale": self.stale,
+        }
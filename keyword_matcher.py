@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Thai AI Lawyer - Keyword Matcher
+ตัวจับคำสำคัญหลายคำพร้อมกันด้วย Aho-Corasick automaton สร้างครั้งเดียวตอนเริ่มระบบ
+"""
+
+import hashlib
+import json
+from collections import deque
+from typing import Dict, List
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton ที่จับคู่คำทั้งหมดในข้อความได้ในการอ่านรอบเดียว
+
+    แต่ละคำผูกกับ bitmask ของป้ายกำกับ (label) ผลของ match() คือ OR ของ bitmask
+    ของทุกคำที่พบในข้อความ รวมถึงคำที่ซ้อนทับกัน จึงให้ผลเท่ากับการตรวจ `in` ทีละคำ
+    """
+
+    def __init__(self, patterns: Dict[str, int]):
+        # แต่ละ state เก็บ transitions, failure link และ mask ของคำที่จบที่ state นั้น
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[int] = [0]
+
+        for pattern, mask in patterns.items():
+            self._add(pattern.lower(), mask)
+        self._build()
+        # hash ของคำและป้ายกำกับทั้งหมด ใช้ตรวจว่าป้ายกำกับที่คำนวณไว้ล่วงหน้ายังใช้ได้
+        self.fingerprint = hashlib.sha256(
+            json.dumps(sorted((pattern.lower(), mask) for pattern, mask in patterns.items())).encode("utf-8")
+        ).hexdigest()[:16]
+
+    def _add(self, pattern: str, mask: int):
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(0)
+            state = next_state
+        self._output[state] |= mask
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] |= self._output[self._fail[next_state]]
+
+    def match(self, text: str) -> int:
+        """OR ของ bitmask ของทุกคำที่พบใน text (ต้องเป็นตัวพิมพ์เล็กแล้ว)"""
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        state = 0
+        found = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            found |= output[state]
+        return found
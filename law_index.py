@@ -0,0 +1,805 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Thai AI Lawyer - Law Index
+ดัชนีค้นหาข้อกฎหมาย (inverted index) ที่สร้างครั้งเดียวตอนโหลดข้อมูล
+"""
+
+import copy
+import math
+from collections import Counter, defaultdict
+from collections.abc import Mapping
+from typing import Dict, Hashable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from cache import LRUCache
+from keyword_matcher import KeywordMatcher
+from law_store import LawStore
+from passages import PASSAGE_LENGTH, split_passages
+
+
+# ฟิลด์ของแต่ละ passage ที่ตัดคำเก็บใน postings (ลำดับตรงกับค่าความถี่ใน postings)
+# title และ category ของ passage คือของข้อกฎหมายที่ passage นั้นอยู่
+FIELDS = ('title', 'text', 'category')
+
+# ค่าเริ่มต้นของ BM25F: น้ำหนักของแต่ละฟิลด์ ค่า k1 และค่า b
+BM25_FIELD_WEIGHTS = {'title': 3.0, 'text': 1.0, 'category': 0.5}
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# จำนวนคำในคำถามที่เก็บ postings ระดับ substring ไว้ต่อดัชนี (ดู LawIndex.word_postings)
+WORD_POSTINGS_CACHE_SIZE = 4096
+
+
+def word_tokenize(text: str) -> List[str]:
+    """
+    ตัดคำภาษาไทยด้วย pythainlp (ไม่รวมช่องว่าง)
+    import pythainlp เมื่อตัดคำครั้งแรก เพราะใช้เวลาหลายวินาที โมดูลที่ไม่ได้ตัดคำจึง import ได้เร็ว
+    """
+    import pythainlp
+    return pythainlp.word_tokenize(text, keep_whitespace=False)
+
+
+def tokenize(text: str) -> List[str]:
+    """ตัดคำภาษาไทยด้วย pythainlp และแปลงเป็นตัวพิมพ์เล็ก"""
+    return [token.lower() for token in word_tokenize(text) if token.strip()]
+
+
+def iter_bits(bits: int) -> Iterator[int]:
+    """ไล่ตำแหน่งบิตที่เป็น 1 (เช่น เลขเอกสารใน bitset) จากน้อยไปมาก"""
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+def bits_from_ids(doc_ids: Iterable[int], num_bits: int) -> int:
+    """bitset ของเลขเอกสารใน doc_ids (ทุกเลขน้อยกว่า num_bits) สร้างผ่าน array ของ bit จึงเร็วแม้ชุดใหญ่"""
+    flags = np.zeros(max(num_bits, 1), dtype=bool)
+    flags[np.fromiter(doc_ids, dtype=np.int64)] = True
+    return int.from_bytes(np.packbits(flags, bitorder='little').tobytes(), 'little')
+
+
+def pack_bitsets(bitsets: Sequence[int], num_bits: Optional[int] = None) -> np.ndarray:
+    """เก็บ bitset หลายชุดเป็น array ของ byte (แถวละชุด little-endian ความกว้างเท่ากัน)"""
+    if num_bits is None:
+        num_bits = max((bits.bit_length() for bits in bitsets), default=0)
+    width = max((num_bits + 7) // 8, 1)
+    packed = b''.join(bits.to_bytes(width, 'little') for bits in bitsets)
+    return np.frombuffer(packed, dtype=np.uint8).reshape(len(bitsets), width)
+
+
+def unpack_bitsets(packed: np.ndarray) -> List[int]:
+    """แปลงผลของ pack_bitsets กลับเป็น list ของ int"""
+    width = packed.shape[1]
+    if not width:
+        return [0] * packed.shape[0]
+    data = packed.tobytes()
+    return [int.from_bytes(data[i:i + width], 'little') for i in range(0, len(data), width)]
+
+
+def bits_mask(bits: int, num_bits: int) -> np.ndarray:
+    """bitset เป็น array bool ขนาด num_bits (ช่องที่ n เป็น True ถ้าบิตที่ n เป็น 1) ใช้จำกัดเอกสารในเมทริกซ์คะแนน"""
+    return np.unpackbits(pack_bitsets([bits], num_bits)[0], count=num_bits, bitorder='little').astype(bool)
+
+
+def select_bits(bitsets: Sequence[int], positions: Sequence[int], num_bits: int) -> List[int]:
+    """bitset ใหม่ที่บิตที่ i คือบิตที่ positions[i] ของ bitset เดิม (ใช้ย้ายเลขเอกสารตอน compact)"""
+    if not bitsets:
+        return []
+    bits = np.unpackbits(pack_bitsets(bitsets, num_bits), axis=1, bitorder='little')[:, list(positions)]
+    return unpack_bitsets(np.packbits(bits, axis=1, bitorder='little'))
+
+
+def _grams(text: str) -> set:
+    """อักษรคู่ (character bigram) ทั้งหมดใน text"""
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def tokenize_passages(law: dict, passage_length: int) -> Iterator[Tuple[int, int, List[List[str]]]]:
+    """
+    ช่วง (เริ่ม, จบ) ของแต่ละ passage ใน text ของข้อกฎหมาย พร้อมคำในแต่ละฟิลด์ตามลำดับ FIELDS
+    title และ category ตัดคำครั้งเดียวต่อข้อ ส่วน text ตัดคำทีละ passage
+    """
+    text = law.get('text', '')
+    shared_tokens = {field: tokenize(law.get(field, '')) for field in FIELDS if field != 'text'}
+    for start, end in split_passages(text, passage_length):
+        yield start, end, [tokenize(text[start:end]) if field == 'text' else shared_tokens[field] for field in FIELDS]
+
+
+def search_text(law: dict) -> str:
+    """ข้อความที่ใช้ตรวจคำแบบ substring ตอนให้คะแนน: title + text ตัวพิมพ์เล็ก"""
+    return f"{law.get('title', '')} {law.get('text', '')}".lower()
+
+
+def _has_upper(law: dict) -> bool:
+    text = f"{law.get('title', '')} {law.get('text', '')}"
+    return text != text.lower()
+
+
+class _TextColumn:
+    """
+    ข้อความตัวพิมพ์เล็กของแต่ละข้อ (index.search_texts[doc_id], index.titles[doc_id]) ถอดจาก buffer ของ store
+    ทุกครั้งที่อ่าน ดัชนีจึงไม่ต้องเก็บสำเนาข้อความทั้งหมดเป็น str ซ้ำกับ store (ข้อที่ลบแล้วได้ข้อความว่าง)
+    เรียก lower() เฉพาะข้อที่มีตัวพิมพ์ใหญ่ (ส่วนใหญ่เป็นอักษรไทยซึ่งไม่มีตัวพิมพ์ใหญ่)
+    """
+
+    def __init__(self, index: "LawIndex", title_only: bool):
+        self._index = index
+        self._title_only = title_only
+
+    def __getitem__(self, doc_id: int) -> str:
+        index = self._index
+        if not index.all_bits >> doc_id & 1:
+            return ''
+        text = index.laws.field(doc_id, 'title')
+        if not self._title_only:
+            text = f"{text} {index.laws.field(doc_id, 'text')}"
+        return text.lower() if index._mixed_case >> doc_id & 1 else text
+
+    def __len__(self) -> int:
+        return len(self._index.laws)
+
+
+def summarize_categories(category_bits: Dict[str, int], code_keys: Iterable[Tuple[str, str]]) -> List[dict]:
+    """
+    จำนวนข้อและช่วงรหัสมาตรา (น้อยสุด-มากสุด) ของแต่ละหมวดหมู่ ตามลำดับใน category_bits
+    code_keys คือ (หมวดหมู่, รหัสมาตรา) ทั้งหมดในข้อมูล
+    """
+    codes: Dict[str, List[str]] = defaultdict(list)
+    for category, code in code_keys:
+        if code:
+            codes[category].append(code)
+    summary = []
+    for category, bits in category_bits.items():
+        # รหัสที่เป็นตัวเลขเรียงตามค่า รหัสอื่นเรียงต่อท้ายตามตัวอักษร
+        ordered = sorted(codes[category], key=lambda code: (not code.isdigit(), int(code) if code.isdigit() else 0, code))
+        summary.append({
+            'category': category,
+            'count': bin(bits).count('1'),
+            'first_code': ordered[0] if ordered else None,
+            'last_code': ordered[-1] if ordered else None,
+        })
+    return summary
+
+
+class ArrayPostings(Mapping):
+    """
+    postings ที่เก็บเป็น array แบบ CSR (เรียงตามคำใน vocabulary) แทน dict ซ้อน dict
+    สร้าง dict ของคำที่ถูกใช้ครั้งแรกแล้วเก็บไว้ ไม่ต้องแปลงทั้งดัชนีตอนโหลด
+    """
+
+    def __init__(self, vocabulary: List[str], indptr: np.ndarray, passage_ids: np.ndarray,
+                 frequencies: np.ndarray):
+        self._term_ids = dict(zip(vocabulary, range(len(vocabulary))))
+        self._indptr = indptr
+        self._passage_ids = passage_ids
+        self._frequencies = frequencies
+        self._cache: Dict[str, Dict[int, List[int]]] = {}
+
+    def __getitem__(self, term: str) -> Dict[int, List[int]]:
+        doc_postings = self._cache.get(term)
+        if doc_postings is None:
+            term_id = self._term_ids[term]
+            start, end = int(self._indptr[term_id]), int(self._indptr[term_id + 1])
+            doc_postings = dict(zip(self._passage_ids[start:end].tolist(), self._frequencies[start:end].tolist()))
+            self._cache[term] = doc_postings
+        return doc_postings
+
+    def __contains__(self, term: object) -> bool:
+        return term in self._term_ids
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._term_ids)
+
+    def __len__(self) -> int:
+        return len(self._term_ids)
+
+
+class PackedBitsets(Mapping):
+    """
+    key -> bitset ที่เก็บเป็นผลของ pack_bitsets (แถวละ key ตามลำดับใน keys) เช่น array ใน mmap ของไฟล์ดัชนี
+    แปลงแถวเป็น int เมื่ออ่าน key นั้นครั้งแรกแล้วเก็บไว้ ไม่ต้องแปลงทุกแถวตอนโหลด
+    """
+
+    def __init__(self, keys: Sequence[Hashable], packed: np.ndarray):
+        self._rows = dict(zip(keys, range(len(keys))))
+        self._packed = packed
+        self._cache: Dict[Hashable, int] = {}
+
+    def __getitem__(self, key: Hashable) -> int:
+        bits = self._cache.get(key)
+        if bits is None:
+            bits = self._cache[key] = int.from_bytes(self._packed[self._rows[key]].tobytes(), 'little')
+        return bits
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._rows
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(self._rows)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+
+class PackedBitsetColumn:
+    """bitset ของแต่ละเอกสาร (แถวที่ n ของผล pack_bitsets คือเอกสาร n) แปลงแถวเป็น int เมื่ออ่านครั้งแรก"""
+
+    def __init__(self, packed: np.ndarray):
+        self._packed = packed
+        self._cache: List[Optional[int]] = [None] * len(packed)
+
+    def __getitem__(self, doc_id: int) -> int:
+        bits = self._cache[doc_id]
+        if bits is None:
+            bits = self._cache[doc_id] = int.from_bytes(self._packed[doc_id].tobytes(), 'little')
+        return bits
+
+    def __len__(self) -> int:
+        return len(self._packed)
+
+
+class ArrayDocLists(Mapping):
+    """key -> list ของเลขเอกสาร เก็บเป็น array แบบ CSR (indptr, doc_ids) ตามลำดับใน keys สร้าง list เมื่ออ่าน"""
+
+    def __init__(self, keys: Sequence[Hashable], indptr: np.ndarray, doc_ids: np.ndarray):
+        self._rows = dict(zip(keys, range(len(keys))))
+        self._indptr = indptr
+        self._doc_ids = doc_ids
+
+    def __getitem__(self, key: Hashable) -> List[int]:
+        row = self._rows[key]
+        return self._doc_ids[int(self._indptr[row]):int(self._indptr[row + 1])].tolist()
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._rows
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(self._rows)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+
+class PostingsOverlay(Mapping):
+    """
+    postings ของดัชนีที่ปรับปรุงบางข้อ: คำที่เปลี่ยนอ่านจาก changes (dict ว่างคือไม่มีคำนี้แล้ว)
+    คำอื่นอ่านจาก postings เดิมโดยไม่คัดลอก ซ้อนกันหลายชั้นจะถูกรวมเป็นชั้นเดียวบน postings เดิม
+    """
+
+    def __init__(self, base: Mapping, changes: Dict[str, Dict[int, List[int]]]):
+        if isinstance(base, PostingsOverlay):
+            changes = {**base._changes, **changes}
+            base = base._base
+        self._base = base
+        self._changes = changes
+        self._length = len(base) + sum(bool(postings) - (term in base) for term, postings in changes.items())
+
+    def __getitem__(self, term: str) -> Dict[int, List[int]]:
+        postings = self._changes.get(term)
+        if postings is None:
+            return self._base[term]
+        if not postings:
+            raise KeyError(term)
+        return postings
+
+    def __contains__(self, term: object) -> bool:
+        postings = self._changes.get(term)
+        return term in self._base if postings is None else bool(postings)
+
+    def __iter__(self) -> Iterator[str]:
+        for term in self._base:
+            if term not in self._changes:
+                yield term
+        for term, postings in self._changes.items():
+            if postings:
+                yield term
+
+    def __len__(self) -> int:
+        return self._length
+
+
+class _ChangedPostings(dict):
+    """postings ของคำที่ถูกแก้ไข คัดลอกจาก postings เดิมเมื่อใช้คำนั้นครั้งแรก (postings เดิมไม่ถูกแก้ไข)"""
+
+    def __init__(self, base: Mapping):
+        super().__init__()
+        self._base = base
+
+    def __missing__(self, term: str) -> Dict[int, List[int]]:
+        postings = self[term] = dict(self._base.get(term, {}))
+        return postings
+
+
+class LawIndex:
+    """
+    ดัชนีคำ -> รายการ passage (postings) พร้อมความถี่ของคำในแต่ละฟิลด์ของแต่ละ passage
+    และสถิติ passage (ความยาวฟิลด์, document frequency) สำหรับจัดอันดับแบบ BM25F
+
+    ข้อกฎหมายที่ยาวเกิน passage_length ถูกแบ่งเป็นหลาย passage (ข้อที่สั้นกว่าเป็น passage เดียว)
+    คะแนนของข้อกฎหมายคือคะแนนสูงสุดของ passage ในข้อนั้น ความยาวของข้อจึงไม่มีผลต่อคะแนนโดยตรง
+
+    ชุดเอกสารถูกเก็บเป็น bitset (int) โดยบิตที่ n แทนเอกสารลำดับที่ n
+    นอกจาก postings ของคำแล้ว ยังมีดัชนีอักษรคู่ (character bigram) สำหรับหาเอกสาร
+    ที่อาจมีข้อความใด ๆ เป็น substring ให้ผลตรงกับการตรวจ `in` แบบเดิมทุกกรณี
+    แม้ข้อความจะคร่อมขอบคำที่ pythainlp ตัดไว้
+
+    updated() สร้างดัชนีใหม่ที่เพิ่ม/ลบบางข้อโดยตัดคำเฉพาะข้อที่เปลี่ยน ข้อที่ลบยังคงเลขเอกสารไว้
+    (ไม่อยู่ในทุก bitset และ postings) จนกว่าจะ compacted() ซึ่งเรียงเลขเอกสารและ passage ใหม่
+    """
+
+    def __init__(self, laws: LawStore, matcher: Optional[KeywordMatcher] = None,
+                 passage_length: int = PASSAGE_LENGTH):
+        self.passage_length = passage_length
+        self._index_documents(laws)
+        # passages[เลข passage] = (เลขเอกสาร, ตำแหน่งเริ่ม, ตำแหน่งจบใน text)
+        # passage ของเอกสาร n คือเลข doc_passages[n] ถึง doc_passages[n + 1] - 1
+        self.passages: List[Tuple[int, int, int]] = []
+        self.doc_passages: List[int] = []
+        # postings[คำ][เลข passage] = [ความถี่ใน title, ความถี่ใน text, ความถี่ใน category]
+        postings: Dict[str, Dict[int, List[int]]] = defaultdict(dict)
+        self.field_lengths: Dict[str, List[int]] = {field: [] for field in FIELDS}
+        # ป้ายกำกับ (bitmask จาก matcher) ของคำสำคัญที่พบในแต่ละข้อ แยกทั้งข้อและเฉพาะชื่อมาตรา
+        self.text_labels: List[int] = []
+        self.title_labels: List[int] = []
+        label_docs: Dict[int, int] = defaultdict(int)
+        gram_docs: Dict[str, List[int]] = defaultdict(list)
+
+        for doc_id, law in enumerate(laws):
+            law_text = search_text(law)
+
+            text_labels = matcher.match(law_text) if matcher else 0
+            self.text_labels.append(text_labels)
+            self.title_labels.append(matcher.match(law.get('title', '').lower()) if matcher else 0)
+            for label in iter_bits(text_labels):
+                label_docs[label] |= 1 << doc_id
+
+            for gram in _grams(law_text):
+                gram_docs[gram].append(doc_id)
+
+            self._add_passages(doc_id, law, postings)
+
+        self.doc_passages.append(len(self.passages))
+        self.live_passages = len(self.passages)
+        self.postings: Mapping[str, Dict[int, List[int]]] = dict(postings)
+        self.vocabulary = sorted(self.postings)
+        self.doc_freq = {term: len(doc_postings) for term, doc_postings in self.postings.items()}
+        self._label_docs = dict(label_docs)
+        self._gram_bits = {gram: sum(1 << doc_id for doc_id in doc_ids) for gram, doc_ids in gram_docs.items()}
+        self._compute_averages()
+
+    def _add_passages(self, doc_id: int, law: dict, postings: Dict[str, Dict[int, List[int]]]):
+        """ตัดคำข้อกฎหมาย doc_id ทีละ passage แล้วเพิ่มใน passages, field_lengths และ postings"""
+        self.doc_passages.append(len(self.passages))
+        for start, end, field_tokens in tokenize_passages(law, self.passage_length):
+            passage_id = len(self.passages)
+            self.passages.append((doc_id, start, end))
+            for field_index, (field, tokens) in enumerate(zip(FIELDS, field_tokens)):
+                self.field_lengths[field].append(len(tokens))
+                for token in tokens:
+                    frequencies = postings[token].get(passage_id)
+                    if frequencies is None:
+                        frequencies = postings[token][passage_id] = [0] * len(FIELDS)
+                    frequencies[field_index] += 1
+
+    def _index_documents(self, laws: LawStore):
+        """ข้อมูลต่อข้อที่ไม่ต้องตัดคำ (หมวดหมู่ รหัสมาตรา) สร้างได้เร็วจากข้อมูลโดยตรง"""
+        self.laws = laws
+        self._text_columns()
+        category_bits: Dict[str, int] = defaultdict(int)
+        # หมวดหมู่ของแต่ละข้อ ใช้นับ facet ของผลการค้นหา
+        self.doc_categories: List[str] = []
+        # (หมวดหมู่, รหัสมาตรา) -> เลขเอกสาร (รหัสเดียวกันอาจมีหลายข้อ) และ รหัส -> bitset ของทุกหมวดหมู่
+        code_docs: Dict[Tuple[str, str], List[int]] = defaultdict(list)
+        code_bits: Dict[str, int] = defaultdict(int)
+        # ข้อที่ข้อความมีตัวพิมพ์ใหญ่ (ต้อง lower() เมื่ออ่าน search_texts/titles)
+        mixed_case = 0
+
+        for doc_id, law in enumerate(laws):
+            category = law.get('category', '')
+            code = law.get('code', '')
+            if _has_upper(law):
+                mixed_case |= 1 << doc_id
+            category_bits[category] |= 1 << doc_id
+            self.doc_categories.append(category)
+            code_docs[(category, code)].append(doc_id)
+            code_bits[code] |= 1 << doc_id
+
+        self.category_bits = dict(category_bits)
+        self.code_docs = dict(code_docs)
+        self._code_bits = dict(code_bits)
+        self._mixed_case = mixed_case
+        self.all_bits = (1 << len(laws)) - 1
+        self.category_summary = summarize_categories(self.category_bits, self.code_docs)
+
+    def _text_columns(self):
+        # ข้อความตัวพิมพ์เล็กของแต่ละข้อ (title + text และ title) ใช้ตรวจคำแบบ substring ตอนให้คะแนน
+        self.search_texts = _TextColumn(self, title_only=False)
+        self.titles = _TextColumn(self, title_only=True)
+        # postings ระดับ substring ของคำในคำถามที่เคยค้น สร้างจากข้อความชุดนี้ จึงสร้างใหม่ทุกครั้งที่ข้อความเปลี่ยน
+        self._word_postings = LRUCache(WORD_POSTINGS_CACHE_SIZE)
+
+    def _compute_averages(self):
+        # passage ของข้อที่ลบแล้วมีความยาวเป็นศูนย์และไม่นับรวม
+        self.avg_field_lengths = {
+            field: (sum(lengths) / self.live_passages if self.live_passages else 0.0) or 1.0
+            for field, lengths in self.field_lengths.items()
+        }
+
+    def updated(self, laws: LawStore, removed: Iterable[int],
+                matcher: Optional[KeywordMatcher] = None) -> "LawIndex":
+        """
+        ดัชนีใหม่ของ laws (ข้อกฎหมายเดิมทุกข้อตามลำดับเดิม แล้วต่อท้ายด้วยข้อที่เพิ่ม) ที่ลบเอกสาร removed
+        และเพิ่มเอกสารตั้งแต่ len(self) จนจบ laws ตัดคำเฉพาะข้อที่ลบและข้อที่เพิ่ม ส่วนอื่นใช้ร่วมกับดัชนีเดิม
+        ดัชนีเดิมไม่ถูกแก้ไข คำขอที่ใช้ดัชนีเดิมอยู่จึงทำงานต่อได้ตามปกติ
+        """
+        index = copy.copy(self)
+        index.laws = laws
+        index._text_columns()
+        index.doc_categories = list(self.doc_categories)
+        index.text_labels = list(self.text_labels)
+        index.title_labels = list(self.title_labels)
+        index.passages = list(self.passages)
+        index.doc_passages = self.doc_passages[:-1]
+        index.field_lengths = {field: list(lengths) for field, lengths in self.field_lengths.items()}
+        index.category_bits = dict(self.category_bits)
+        index.code_docs = dict(self.code_docs)
+        index._code_bits = dict(self._code_bits)
+        index._label_docs = dict(self._label_docs)
+        index._gram_bits = dict(self._gram_bits)
+        changes = _ChangedPostings(self.postings)
+
+        def clear_bit(bitsets: Dict, key, bit: int):
+            bits = bitsets.get(key, 0) & ~bit
+            if bits:
+                bitsets[key] = bits
+            else:
+                bitsets.pop(key, None)
+
+        for doc_id in removed:
+            bit = 1 << doc_id
+            if not index.all_bits & bit:
+                continue
+            law = self.laws[doc_id]
+            index.all_bits &= ~bit
+            index._mixed_case &= ~bit
+            category, code = index.doc_categories[doc_id], law.get('code', '')
+            clear_bit(index.category_bits, category, bit)
+            clear_bit(index._code_bits, code, bit)
+            docs = [other for other in index.code_docs[(category, code)] if other != doc_id]
+            if docs:
+                index.code_docs[(category, code)] = docs
+            else:
+                del index.code_docs[(category, code)]
+            for label in iter_bits(index.text_labels[doc_id]):
+                clear_bit(index._label_docs, label, bit)
+            for gram in _grams(search_text(law)):
+                clear_bit(index._gram_bits, gram, bit)
+            index.text_labels[doc_id] = index.title_labels[doc_id] = 0
+
+            # ตัดคำข้อที่ลบอีกครั้งเพื่อหาคำที่ต้องลบออกจาก postings (ผลเหมือนตอนสร้างดัชนี)
+            passage_ids = range(self.doc_passages[doc_id], self.doc_passages[doc_id + 1])
+            terms = set()
+            for _, _, field_tokens in tokenize_passages(law, self.passage_length):
+                for tokens in field_tokens:
+                    terms.update(tokens)
+            for term in terms:
+                for passage_id in passage_ids:
+                    changes[term].pop(passage_id, None)
+            for passage_id in passage_ids:
+                for lengths in index.field_lengths.values():
+                    lengths[passage_id] = 0
+            index.live_passages -= len(passage_ids)
+
+        for doc_id in range(len(self), len(laws)):
+            law = laws[doc_id]
+            bit = 1 << doc_id
+            title, category, code = law.get('title', ''), law.get('category', ''), law.get('code', '')
+            law_text = search_text(law)
+            if _has_upper(law):
+                index._mixed_case |= bit
+            index.doc_categories.append(category)
+            index.all_bits |= bit
+            index.category_bits[category] = index.category_bits.get(category, 0) | bit
+            index._code_bits[code] = index._code_bits.get(code, 0) | bit
+            index.code_docs[(category, code)] = index.code_docs.get((category, code), []) + [doc_id]
+
+            text_labels = matcher.match(law_text) if matcher else 0
+            index.text_labels.append(text_labels)
+            index.title_labels.append(matcher.match(title.lower()) if matcher else 0)
+            for label in iter_bits(text_labels):
+                index._label_docs[label] = index._label_docs.get(label, 0) | bit
+            for gram in _grams(law_text):
+                index._gram_bits[gram] = index._gram_bits.get(gram, 0) | bit
+
+            passages_before = len(index.passages)
+            index._add_passages(doc_id, law, changes)
+            index.live_passages += len(index.passages) - passages_before
+
+        index.doc_passages.append(len(index.passages))
+        # หมวดหมู่เรียงตามเอกสารแรกที่ยังอยู่ของแต่ละหมวด เหมือนการสร้างดัชนีใหม่จากข้อมูลชุดเดียวกัน
+        index.category_bits = dict(sorted(index.category_bits.items(), key=lambda item: item[1] & -item[1]))
+        index.category_summary = summarize_categories(index.category_bits, index.code_docs)
+        index.doc_freq = dict(self.doc_freq)
+        for term, postings in changes.items():
+            if postings:
+                index.doc_freq[term] = len(postings)
+            else:
+                index.doc_freq.pop(term, None)
+        index.postings = PostingsOverlay(self.postings, dict(changes))
+        # คำที่ postings เปลี่ยนจากดัชนีนี้ (ใช้ปรับ TermMatrix เฉพาะคำเหล่านี้)
+        index.changed_terms = frozenset(changes)
+        index.vocabulary = sorted(index.doc_freq)
+        index._compute_averages()
+        return index
+
+    @property
+    def deleted_count(self) -> int:
+        """จำนวนเอกสารที่ลบแล้วแต่ยังไม่ได้ compact"""
+        return len(self) - bin(self.all_bits).count('1')
+
+    def compacted(self, laws: LawStore) -> "LawIndex":
+        """
+        ดัชนีที่ไม่มีเอกสารที่ลบแล้ว: laws คือข้อกฎหมายที่ยังอยู่ตามลำดับเลขเอกสารเดิม
+        เรียงเลขเอกสารและ passage ใหม่จากดัชนีเดิมโดยไม่ต้องตัดคำใหม่ ผลเท่ากับสร้างดัชนีจาก laws ใหม่ทั้งหมด
+        """
+        live = list(iter_bits(self.all_bits))
+        index = self.__class__.__new__(self.__class__)
+        index.passage_length = self.passage_length
+        index._index_documents(laws)
+
+        index.passages = []
+        index.doc_passages = []
+        passage_map: Dict[int, int] = {}
+        for doc_id, old_doc_id in enumerate(live):
+            index.doc_passages.append(len(index.passages))
+            for old_passage_id in range(self.doc_passages[old_doc_id], self.doc_passages[old_doc_id + 1]):
+                passage_map[old_passage_id] = len(index.passages)
+                _, start, end = self.passages[old_passage_id]
+                index.passages.append((doc_id, start, end))
+        index.doc_passages.append(len(index.passages))
+        index.live_passages = len(index.passages)
+        index.field_lengths = {
+            field: [lengths[passage_id] for passage_id in passage_map] for field, lengths in self.field_lengths.items()
+        }
+        index.postings = {
+            term: {passage_map[passage_id]: frequencies for passage_id, frequencies in postings.items()}
+            for term, postings in self.postings.items()
+        }
+        index.vocabulary = self.vocabulary
+        index.doc_freq = dict(self.doc_freq)
+
+        index.text_labels = [self.text_labels[doc_id] for doc_id in live]
+        index.title_labels = [self.title_labels[doc_id] for doc_id in live]
+        labels = list(self._label_docs)
+        index._label_docs = dict(zip(labels, select_bits([self._label_docs[label] for label in labels], live, len(self))))
+        grams = list(self._gram_bits)
+        index._gram_bits = dict(zip(grams, select_bits([self._gram_bits[gram] for gram in grams], live, len(self))))
+        index._compute_averages()
+        return index
+
+    def to_arrays(self) -> Tuple[Dict[str, np.ndarray], dict]:
+        """
+        ส่วนของดัชนีที่สร้างช้า (postings, ความยาวฟิลด์, passage, ป้ายกำกับ, อักษรคู่) เป็น array
+        และข้อมูลประกอบที่แปลงเป็น JSON ได้ สำหรับบันทึกเป็นไฟล์ดัชนีสำเร็จรูป (ดู artifact.py)
+        """
+        indptr = [0]
+        passage_ids: List[int] = []
+        frequencies: List[List[int]] = []
+        for term in self.vocabulary:
+            for passage_id, field_frequencies in self.postings[term].items():
+                passage_ids.append(passage_id)
+                frequencies.append(field_frequencies)
+            indptr.append(len(passage_ids))
+        labels = sorted(self._label_docs)
+        grams = list(self._gram_bits)
+        codes = list(self._code_bits)
+        code_keys = list(self.code_docs)
+        code_doc_ids = [self.code_docs[key] for key in code_keys]
+        arrays = {
+            'postings_indptr': np.array(indptr, dtype=np.int64),
+            'postings_passages': np.array(passage_ids, dtype=np.int32),
+            'postings_frequencies': np.array(frequencies, dtype=np.int32).reshape(-1, len(FIELDS)),
+            'field_lengths': np.array([self.field_lengths[field] for field in FIELDS], dtype=np.int32)
+                               .reshape(len(FIELDS), len(self.passages)),
+            'passages': np.array(self.passages, dtype=np.int64).reshape(-1, 3),
+            'doc_passages': np.array(self.doc_passages, dtype=np.int64),
+            'text_labels': pack_bitsets(self.text_labels),
+            'title_labels': pack_bitsets(self.title_labels),
+            'label_docs': pack_bitsets([self._label_docs[label] for label in labels], len(self)),
+            'gram_docs': pack_bitsets([self._gram_bits[gram] for gram in grams], len(self)),
+            # ข้อมูลต่อข้อของ _index_documents ตอนโหลดจึงไม่ต้องอ่านข้อกฎหมายทุกข้อ
+            'category_docs': pack_bitsets(list(self.category_bits.values()), len(self)),
+            'code_bits': pack_bitsets([self._code_bits[code] for code in codes], len(self)),
+            'code_docs_indptr': np.cumsum([0] + [len(doc_ids) for doc_ids in code_doc_ids], dtype=np.int64),
+            'code_docs': np.array([doc_id for doc_ids in code_doc_ids for doc_id in doc_ids], dtype=np.int32),
+            'mixed_case': pack_bitsets([self._mixed_case], len(self)),
+        }
+        meta = {
+            'vocabulary': self.vocabulary, 'labels': labels, 'grams': grams,
+            'category_order': list(self.category_bits), 'codes': codes, 'code_keys': [list(key) for key in code_keys],
+            'category_summary': self.category_summary,
+        }
+        return arrays, meta
+
+    @classmethod
+    def from_arrays(cls, laws: LawStore, arrays: Dict[str, np.ndarray], meta: dict) -> "LawIndex":
+        """
+        สร้างดัชนีจากผลของ to_arrays() โดยไม่ต้องตัดคำใหม่ (array อาจเป็น mmap ของไฟล์ก็ได้)
+        ไม่อ่านข้อกฎหมายทีละข้อ: ข้อมูลต่อข้อและ bitset อ่านจาก array และแปลงเป็น int เมื่อใช้ครั้งแรก
+        """
+        index = cls.__new__(cls)
+        index.passage_length = PASSAGE_LENGTH
+        index.laws = laws
+        index._text_columns()
+        index.doc_categories = np.array(laws.categories, dtype=object)[laws.category_ids].tolist()
+        index.category_bits = dict(zip(meta['category_order'], unpack_bitsets(arrays['category_docs'])))
+        index.code_docs = ArrayDocLists([tuple(key) for key in meta['code_keys']],
+                                        arrays['code_docs_indptr'], arrays['code_docs'])
+        index._code_bits = PackedBitsets(meta['codes'], arrays['code_bits'])
+        index._mixed_case, = unpack_bitsets(arrays['mixed_case'])
+        index.all_bits = (1 << len(laws)) - 1
+        index.category_summary = meta['category_summary']
+        index.vocabulary = meta['vocabulary']
+        indptr = arrays['postings_indptr']
+        index.postings = ArrayPostings(
+            index.vocabulary, indptr, arrays['postings_passages'], arrays['postings_frequencies']
+        )
+        index.doc_freq = dict(zip(index.vocabulary, np.diff(indptr).tolist()))
+        index.field_lengths = {
+            field: lengths for field, lengths in zip(FIELDS, arrays['field_lengths'].tolist())
+        }
+        index.passages = [tuple(passage) for passage in arrays['passages'].tolist()]
+        index.live_passages = len(index.passages)
+        index.doc_passages = arrays['doc_passages'].tolist()
+        index.text_labels = PackedBitsetColumn(arrays['text_labels'])
+        index.title_labels = PackedBitsetColumn(arrays['title_labels'])
+        index._label_docs = PackedBitsets(meta['labels'], arrays['label_docs'])
+        index._gram_bits = PackedBitsets(meta['grams'], arrays['gram_docs'])
+        index._compute_averages()
+        return index
+
+    def __len__(self) -> int:
+        return len(self.laws)
+
+    def idf(self, term: str) -> float:
+        """inverse document frequency แบบ BM25 (ไม่ติดลบ) นับที่ระดับ passage"""
+        doc_freq = self.doc_freq.get(term, 0)
+        return math.log(1 + (self.live_passages - doc_freq + 0.5) / (doc_freq + 0.5))
+
+    def bm25_scores(self, terms: Iterable[str], k1: float = BM25_K1, b: float = BM25_B,
+                    field_weights: Optional[Dict[str, float]] = None) -> Dict[int, float]:
+        """
+        คะแนน BM25F ของเอกสารที่มีคำใน terms อย่างน้อยหนึ่งคำ (คะแนนสูงสุดของ passage ในเอกสาร)
+        ใช้เฉพาะ postings ของคำในคำถาม จึงใช้เวลาตามจำนวน postings ที่ตรง ไม่ใช่ขนาดข้อมูลทั้งหมด
+        """
+        scores: Dict[int, float] = {}
+        passages = self.passages
+        for passage_id, score in self.bm25_passage_scores(terms, k1, b, field_weights).items():
+            doc_id = passages[passage_id][0]
+            if score > scores.get(doc_id, 0.0):
+                scores[doc_id] = score
+        return scores
+
+    def bm25_passage_scores(self, terms: Iterable[str], k1: float = BM25_K1, b: float = BM25_B,
+                            field_weights: Optional[Dict[str, float]] = None) -> Dict[int, float]:
+        """คะแนน BM25F ของแต่ละ passage ที่มีคำใน terms อย่างน้อยหนึ่งคำ"""
+        field_weights = field_weights or BM25_FIELD_WEIGHTS
+        fields = [
+            (field_index, field_weights.get(field, 0.0), self.field_lengths[field], self.avg_field_lengths[field])
+            for field_index, field in enumerate(FIELDS)
+        ]
+        scores: Dict[int, float] = defaultdict(float)
+        for term, query_freq in Counter(terms).items():
+            doc_postings = self.postings.get(term)
+            if not doc_postings:
+                continue
+            idf = self.idf(term)
+            for passage_id, frequencies in doc_postings.items():
+                # ความถี่ถ่วงน้ำหนักและปรับตามความยาวของแต่ละฟิลด์
+                tf = 0.0
+                for field_index, weight, lengths, avg_length in fields:
+                    if weight and frequencies[field_index]:
+                        tf += weight * frequencies[field_index] / (1 - b + b * lengths[passage_id] / avg_length)
+                if tf:
+                    scores[passage_id] += query_freq * idf * tf / (k1 + tf)
+        return dict(scores)
+
+    def docs_containing(self, text: str) -> int:
+        """
+        เอกสารที่อาจมี text เป็น substring ของ title + text (ตัวพิมพ์เล็ก)
+        ผลเป็น superset ของเอกสารที่มี text จริง เพราะตรวจเพียงว่ามีอักษรคู่ครบทุกคู่
+        """
+        text = text.lower()
+        if len(text) < 2:
+            return self.all_bits
+        bits = self.all_bits
+        for i in range(len(text) - 1):
+            bits &= self._gram_bits.get(text[i:i + 2], 0)
+            if not bits:
+                break
+        return bits
+
+    def word_postings(self, word: str) -> Tuple[Dict[int, int], int, int]:
+        """
+        postings ของคำหรือวลี word (ตัวพิมพ์เล็ก) ในแต่ละข้อ: ({เลขเอกสาร: จำนวนครั้งที่พบใน title + text},
+        bitset ของเอกสารที่พบ, bitset ของเอกสารที่ชื่อมาตรามี word)
+        นับแบบ substring (str.count) ตามเกณฑ์ของ search_laws ซึ่งต่างจากความถี่ของคำที่ตัดแล้วใน postings
+        (เช่น 'ลัก' ใน 'ลักทรัพย์') จึงสร้างจากเอกสารที่ดัชนีอักษรคู่เลือกเมื่อค้นคำนั้นครั้งแรก แล้วเก็บไว้ใช้ซ้ำ
+        """
+        return self.word_postings_batch([word])[word]
+
+    def word_postings_batch(self, words: Iterable[str]) -> Dict[str, Tuple[Dict[int, int], int, int]]:
+        """word_postings ของหลายคำ คำที่ยังไม่เคยค้นสร้างพร้อมกันโดยอ่านข้อความของแต่ละเอกสารครั้งเดียว"""
+        result: Dict[str, Tuple[Dict[int, int], int, int]] = {}
+        missing: Dict[str, int] = {}
+        for word in dict.fromkeys(words):
+            postings = self._word_postings.get(word)
+            if postings is None:
+                missing[word] = self.docs_containing(word)
+            else:
+                result[word] = postings
+        if not missing:
+            return result
+
+        counts: Dict[str, Dict[int, int]] = {word: {} for word in missing}
+        title_bits = dict.fromkeys(missing, 0)
+        candidates = 0
+        for bits in missing.values():
+            candidates |= bits
+        for doc_id in iter_bits(candidates):
+            law_text = self.search_texts[doc_id]
+            law_title = None
+            for word, bits in missing.items():
+                if bits >> doc_id & 1:
+                    count = law_text.count(word)
+                    if count:
+                        counts[word][doc_id] = count
+                        # ชื่อมาตราเป็นส่วนต้นของ search_text จึงตรวจเฉพาะข้อที่พบคำแล้ว
+                        if law_title is None:
+                            law_title = self.titles[doc_id]
+                        if word in law_title:
+                            title_bits[word] |= 1 << doc_id
+        for word, doc_counts in counts.items():
+            result[word] = (doc_counts, bits_from_ids(doc_counts, len(self)), title_bits[word])
+            self._word_postings.put(word, result[word])
+        return result
+
+    def docs_with_labels(self, labels: int) -> int:
+        """เอกสารที่มีคำสำคัญของป้ายกำกับใดป้ายกำกับหนึ่งใน labels"""
+        bits = 0
+        for label in iter_bits(labels):
+            bits |= self._label_docs.get(label, 0)
+        return bits
+
+    def docs_in_categories(self, category_part: str) -> int:
+        """เอกสารทั้งหมดในหมวดหมู่ที่ชื่อมี category_part"""
+        bits = 0
+        for category, category_bits in self.category_bits.items():
+            if category_part in category.lower():
+                bits |= category_bits
+        return bits
+
+    def docs_with_codes(self, codes: Iterable[str]) -> int:
+        """เอกสารที่รหัสมาตราตรงกับรหัสใดรหัสหนึ่งใน codes ทุกตัวอักษร (ทุกหมวดหมู่)"""
+        bits = 0
+        for code in codes:
+            bits |= self._code_bits.get(code, 0)
+        return bits
+
+    def lookup(self, category: str, code: str) -> List[int]:
+        """เลขเอกสารของมาตรา code ในหมวดหมู่ category (ว่างถ้าไม่มี)"""
+        return self.code_docs.get((category, code), [])
+
+    def facet_counts(self, doc_ids: Iterable[int]) -> Dict[str, int]:
+        """จำนวนเอกสารใน doc_ids แยกตามหมวดหมู่ (เรียงจากมากไปน้อย)"""
+        counts = Counter(self.doc_categories[doc_id] for doc_id in doc_ids)
+        return dict(counts.most_common())
+
+    def filter_category(self, bits: int, category: Optional[str]) -> Iterator[int]:
+        """กรองเอกสารตามหมวดหมู่ แล้วไล่ตามลำดับในฐานข้อมูล"""
+        if category:
+            bits &= self.category_bits.get(category, 0)
+        return iter_bits(bits)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Thai AI Lawyer - Law Store
+ที่เก็บข้อกฎหมายแบบคอลัมน์: ข้อความทุกข้ออยู่ใน buffer ก้อนเดียวอ้างอิงด้วย offset
+และหมวดหมู่เก็บเป็นเลขประจำหมวด สร้าง dict ของข้อกฎหมายเฉพาะตอนตอบคำขอ
+"""
+
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+# ฟิลด์ของข้อกฎหมายตามลำดับใน JSON (category เก็บแยกเป็นเลขประจำหมวด)
+RECORD_FIELDS = ("title", "text", "code", "category")
+TEXT_FIELDS = ("title", "text", "code")
+_FIELD_SLOTS = {field: slot for slot, field in enumerate(TEXT_FIELDS)}
+# อักษรไทยใช้ 2 byte ใน UTF-16 แต่ 3 byte ใน UTF-8 จึงเก็บ buffer เป็น UTF-16
+ENCODING = "utf-16-le"
+
+
+class LawStore:
+    """
+    ข้อกฎหมายทั้งหมดแบบ read-only ใช้แทน list ของ dict ได้ (len, [doc_id], for)
+    - buffer: title, text, code ของทุกข้อต่อกันเป็น bytes (ENCODING) ก้อนเดียว (หรือ memoryview ของไฟล์ mmap)
+    - offsets: ฟิลด์ f ของข้อ n อยู่ที่ buffer[offsets[3n + f]:offsets[3n + f + 1]] (หน่วย byte)
+    - category_ids: เลขหมวดหมู่ของแต่ละข้อ ชี้ไปที่ categories (ชื่อหมวดเก็บครั้งเดียว)
+    store[doc_id] สร้าง dict ใหม่ทุกครั้ง จึงแก้ไขผลลัพธ์ได้โดยไม่กระทบข้อมูลใน store
+    """
+
+    __slots__ = ("buffer", "offsets", "category_ids", "categories", "_category_lookup")
+
+    def __init__(self, buffer: Union[bytes, memoryview], offsets: np.ndarray, category_ids: np.ndarray, categories: List[str]):
+        self.buffer = buffer
+        self.offsets = offsets
+        self.category_ids = category_ids
+        self.categories = categories
+        self._category_lookup = {name: category_id for category_id, name in enumerate(categories)}
+
+    @classmethod
+    def from_records(cls, records: Iterable[dict]) -> "LawStore":
+        """สร้าง store จาก list ของ dict (title, text, code, category) เช่นที่อ่านจาก law_data.json"""
+        return cls(b"", np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.uint16), []).extended(records)
+
+    def extended(self, records: Iterable[dict]) -> "LawStore":
+        """store ใหม่ที่มีข้อกฎหมายเดิมทุกข้อแล้วต่อท้ายด้วย records (store เดิมไม่ถูกแก้ไข)"""
+        buffer = bytearray(self.buffer)
+        offsets = self.offsets.tolist()
+        category_ids = self.category_ids.tolist()
+        lookup = dict(self._category_lookup)
+        for record in records:
+            for field in TEXT_FIELDS:
+                buffer += str(record.get(field, "")).encode(ENCODING)
+                offsets.append(len(buffer))
+            category_ids.append(lookup.setdefault(record.get("category", ""), len(lookup)))
+        return self.__class__(
+            bytes(buffer),
+            np.array(offsets, dtype=np.int64),
+            np.array(category_ids, dtype=np.uint16),
+            list(lookup),
+        )
+
+    def __len__(self) -> int:
+        return len(self.category_ids)
+
+    def _text(self, doc_id: int, slot: int) -> str:
+        position = 3 * doc_id + slot
+        return str(self.buffer[int(self.offsets[position]):int(self.offsets[position + 1])], ENCODING)
+
+    def field(self, doc_id: int, field: str) -> str:
+        """ค่าของฟิลด์เดียวโดยไม่ต้องสร้างทั้งข้อ"""
+        if field == "category":
+            return self.categories[self.category_ids[doc_id]]
+        return self._text(doc_id, _FIELD_SLOTS[field])
+
+    def record(self, doc_id: int, fields: Optional[Sequence[str]] = None) -> dict:
+        """dict ของข้อกฎหมาย เฉพาะ fields ตามลำดับที่ระบุ (ไม่ระบุคือทุกฟิลด์ตาม RECORD_FIELDS)"""
+        if not -len(self) <= doc_id < len(self):
+            raise IndexError(doc_id)
+        doc_id %= len(self)
+        return {field: self.field(doc_id, field) for field in (fields or RECORD_FIELDS)}
+
+    def __getitem__(self, doc_id: int) -> dict:
+        return self.record(doc_id)
+
+    def __iter__(self) -> Iterator[dict]:
+        for doc_id in range(len(self)):
+            yield self.record(doc_id)
+
+    def records(self) -> List[dict]:
+        """ข้อกฎหมายทั้งหมดเป็น list ของ dict (ใช้ชั่วคราว เช่นตอนแปลงเป็น JSON)"""
+        return list(self)
+
+    def to_arrays(self) -> Tuple[Dict[str, np.ndarray], dict]:
+        """array ของ store และข้อมูลประกอบ สำหรับบันทึกในไฟล์ดัชนีสำเร็จรูป"""
+        arrays = {
+            "store_buffer": np.frombuffer(self.buffer, dtype=np.uint8),
+            "store_offsets": self.offsets,
+            "store_category_ids": self.category_ids,
+        }
+        return arrays, {"categories": self.categories}
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], meta: dict) -> "LawStore":
+        """สร้าง store จากผลของ to_arrays() โดยอ่านข้อความจาก array เดิม (เช่น mmap ของไฟล์) ไม่คัดลอก"""
+        return cls(
+            memoryview(arrays["store_buffer"]),
+            arrays["store_offsets"],
+            arrays["store_category_ids"],
+            meta["categories"],
+        )
+
+    @property
+    def nbytes(self) -> int:
+        """ขนาดหน่วยความจำของ buffer และ array ทั้งหมด (byte)"""
+        return len(self.buffer) + self.offsets.nbytes + self.category_ids.nbytes
@@ -1,23 +1,80 @@
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.responses import FileResponse, JSONResponse, HTMLResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+import asyncio
+import hashlib
+import heapq
 import json
-import pythainlp
+import os
 import logging
-from typing import List, Optional
+import random
+import signal
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple, Union
 import re
+import secrets
+import shutil
+import tempfile
+import threading
+import time
+import unicodedata
 from datetime import datetime
+from cache import LRUCache, SQLiteCache
+from execution import ExecutorSaturated, SearchExecutor
+from keyword_matcher import KeywordMatcher
+from law_index import LawIndex, bits_mask, iter_bits, word_tokenize
+from metrics import METRICS, SIZE_BUCKETS, stage
+from profiling import ProfileStore, folded_stacks, request_id, run_profiled
+from responses import FastJSONResponse, PrecomputedResponse
+from snippets import law_with_snippet, make_snippet
 
 # ตั้งค่า logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    โหลดข้อมูลและดัชนีให้เสร็จก่อนรับคำขอแรก ตั้งการ reload (SIGHUP และตัวตรวจไฟล์ข้อมูล)
+    และการ compact ดัชนีเบื้องหลัง แล้วปิด worker pool เมื่อปิด server
+    """
+    startup()
+    loop = asyncio.get_running_loop()
+    if hasattr(signal, "SIGHUP"):
+        try:
+            loop.add_signal_handler(signal.SIGHUP, schedule_reload)
+        except (NotImplementedError, RuntimeError, ValueError):
+            # ไม่ได้รันใน main thread (เช่น TestClient) หรือระบบไม่รองรับ
+            pass
+    # โหมด process ต้องรวมตัววัดจาก process pool เสมอ ถ้าไม่ได้ตั้ง METRICS_DIR จึงใช้ไดเรกทอรีชั่วคราวของ process นี้
+    private_metrics_dir = None
+    if not METRICS_DIR and SEARCH_EXECUTOR.mode == "process":
+        private_metrics_dir = tempfile.mkdtemp(prefix="thai-ai-lawyer-metrics-")
+    METRICS.configure(METRICS_DIR or private_metrics_dir, METRICS_FLUSH_INTERVAL, [collect_cache_metrics])
+    tasks = []
+    if EVENT_LOOP_LAG_INTERVAL > 0:
+        tasks.append(asyncio.create_task(monitor_event_loop(EVENT_LOOP_LAG_INTERVAL)))
+    if LAW_DATA_WATCH_INTERVAL > 0:
+        tasks.append(asyncio.create_task(watch_data_file(LAW_DATA_WATCH_INTERVAL)))
+    if LAW_COMPACT_INTERVAL > 0:
+        tasks.append(asyncio.create_task(compact_periodically(LAW_COMPACT_INTERVAL)))
+    yield
+    for task in tasks:
+        task.cancel()
+    SEARCH_EXECUTOR.shutdown()
+    METRICS.stop()
+    if private_metrics_dir:
+        shutil.rmtree(private_metrics_dir, ignore_errors=True)
+
 app = FastAPI(
     title="Thai AI Lawyer",
     description="ระบบตอบคำถามกฎหมายไทยอัจฉริยะ",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse,
+    lifespan=lifespan
 )
 
 # เพิ่ม CORS middleware
@@ -29,18 +86,593 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# โหลดข้อมูลกฎหมาย
-try:
-    with open("law_data.json", "r", encoding="utf-8") as f:
-        LAW_DATA = json.load(f)
-    logger.info(f"โหลดข้อมูลกฎหมายสำเร็จ: {len(LAW_DATA)} ข้อ")
-except Exception as e:
-    logger.error(f"ไม่สามารถโหลดข้อมูลกฎหมายได้: {e}")
-    LAW_DATA = []
+# ตัวจัดอันดับผลการค้นหาเริ่มต้น ("legacy" หรือ "bm25") เลือกต่อคำขอได้ด้วยพารามิเตอร์ ranker
+DEFAULT_RANKER = os.getenv("LAW_RANKER", "legacy")
+
+# คะแนนของคำค้นล่าสุด ใช้แบ่งหน้าผลการค้นหาโดยไม่ต้องคำนวณคะแนนใหม่
+# คีย์มี generation ของ snapshot เพราะคะแนนอ้างอิงเลขเอกสาร ซึ่งเปลี่ยนได้แม้ข้อมูลรุ่นเดิม (หลัง compact)
+RANKING_CACHE = LRUCache(int(os.getenv("RANKING_CACHE_SIZE", "256")))
+
+# ผลการตัดคำของคำถามที่ normalize แล้ว (คำถามยอดนิยมไม่ต้องตัดคำซ้ำ)
+TOKEN_CACHE = LRUCache(int(os.getenv("TOKEN_CACHE_SIZE", "4096")))
+
+# ความยาว snippet ของข้อกฎหมายในผลการค้นหา และของเนื้อหามาตราหลักในคำตอบ (ตัวอักษร)
+SNIPPET_LENGTH = int(os.getenv("SNIPPET_LENGTH", "300"))
+ANSWER_TEXT_LENGTH = int(os.getenv("ANSWER_TEXT_LENGTH", "1000"))
+
+# /laws ที่แปลงเป็น JSON แล้วของแต่ละชุดพารามิเตอร์ (แบ่งหน้า/หมวดหมู่/ฟิลด์)
+LAWS_PAGE_CACHE = LRUCache(int(os.getenv("LAWS_PAGE_CACHE_SIZE", "64")))
+
+# cache คำตอบของ /ask: "memory" (ค่าเริ่มต้น, เฉพาะ process) หรือ "sqlite" (ใช้ร่วมกันระหว่าง worker)
+ANSWER_CACHE_BACKEND = os.getenv("ANSWER_CACHE_BACKEND", "memory")
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1024"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))  # วินาที, 0 คือไม่หมดอายุ
+if ANSWER_CACHE_BACKEND == "sqlite":
+    ANSWER_CACHE = SQLiteCache(os.getenv("ANSWER_CACHE_PATH", "answer_cache.sqlite3"), ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL)
+else:
+    ANSWER_CACHE = LRUCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL)
+
+def snapshot_generation() -> Optional[int]:
+    """generation ของ snapshot ที่งานใช้ (ใน worker process คือ snapshot ที่ fork มา)"""
+    snapshot = current_snapshot()
+    return None if snapshot is None else snapshot.generation
+
+# โหมดการรันงานค้นหา: "inline" (ใน event loop), "thread" (ค่าเริ่มต้น) หรือ "process"
+# รับคำขอพร้อมกันได้ไม่เกิน SEARCH_WORKERS + SEARCH_QUEUE_DEPTH ที่เกินจะได้ 503
+SEARCH_EXECUTOR = SearchExecutor(
+    mode=os.getenv("SEARCH_EXECUTION_MODE", "thread"),
+    workers=int(os.getenv("SEARCH_WORKERS", "0")) or None,
+    queue_depth=int(os.getenv("SEARCH_QUEUE_DEPTH", "32")),
+    snapshot_version=snapshot_generation
+)
+
+# โปรไฟล์งานค้นหาของ /ask และ /search ด้วย cProfile: ผู้ดูแลขอเป็นรายคำขอ (?profile=1 หรือ header X-Profile: 1)
+# หรือสุ่มตามสัดส่วน PROFILE_SAMPLE_RATE (0-1) เก็บไฟล์ตามรหัสคำขอใน PROFILE_DIR ไม่เกิน PROFILE_MAX_FILES โปรไฟล์
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILES = ProfileStore(
+    os.getenv("PROFILE_DIR", "profiles"),
+    max_files=int(os.getenv("PROFILE_MAX_FILES", "200")),
+    top=int(os.getenv("PROFILE_TOP_FUNCTIONS", "10"))
+)
+
+# คำสำคัญและคำพ้องความหมายที่ครอบคลุม
+KEYWORD_MAPPINGS = {
+    # อาญา - ความผิดต่อชีวิตและร่างกาย
+    'ฆ่า': ['ฆ่า', 'ฆาตกรรม', 'ประหาร', 'ฆ่าคนตาย', 'ฆาตกร', 'ฆาตร'],
+    'ทำร้ายร่างกาย': ['ทำร้าย', 'ร่างกาย', 'ตบ', 'ตี', 'ทุบ', 'เตะ', 'ต่อย', 'ชก', 'ทำร้ายร่างกาย', 'บาดเจ็บ'],
+    'ชำเรา': ['ชำเรา', 'ข่มขืน', 'อนาจาร', 'ข่มขืนกระทำชำเรา', 'กระทำชำเรา', 'ข่มขืนใจ'],
+    'พรากผู้เยาว์': ['พราก', 'ผู้เยาว์', 'เยาว์', 'เด็ก', 'พรากเด็ก', 'ลักพา', 'พาไป'],
+
+    # อาญา - ความผิดต่อทรัพย์
+    'ลักทรัพย์': ['ลัก', 'ทรัพย์', 'ขโมย', 'ลักขโมย', 'ลักทรัพย์', 'ขโมยของ', 'ลักของ'],
+    'ฉ้อโกง': ['ฉ้อ', 'โกง', 'หลอก', 'ฉ้อโกง', 'หลอกลวง', 'โกงกิน', 'ทุจริต'],
+    'ปล้น': ['ปล้น', 'ชิง', 'โจร', 'ปล้นทรัพย์', 'ชิงทรัพย์', 'โจรกรรม'],
+    'ยักยอก': ['ยักยอก', 'ยักยอกทรัพย์', 'ยักยอกเงิน', 'ยักยอกของ'],
+
+    # อาญา - ความผิดต่อความสงบสุข
+    'ยาเสพติด': ['ยาเสพติด', 'ยา', 'เสพ', 'ติด', 'เฮโรอีน', 'มอร์ฟีน', 'โคเคน', 'กัญชา', 'ยาบ้า', 'ไอซ์', 'แอมเฟตามีน'],
+    'คอร์รัปชัน': ['คอร์รัปชัน', 'ทุจริต', 'รับสินบน', 'สินบน', 'คอร์รัปชั่น', 'ทุจริตคอร์รัปชัน'],
+
+    # อาญา - ความผิดเกี่ยวกับคอมพิวเตอร์
+    'คอมพิวเตอร์': ['คอมพิวเตอร์', 'ระบบ', 'ข้อมูล', 'แฮก', 'ไวรัส', 'สแปม', 'ลามก', 'เท็จ', 'ไซเบอร์', 'อินเทอร์เน็ต'],
+    'แฮก': ['แฮก', 'แฮกเกอร์', 'เข้าถึง', 'เจาะระบบ', 'เจาะข้อมูล'],
+    'ไวรัส': ['ไวรัส', 'มัลแวร์', 'สปายแวร์', 'ทรอยจัน', 'แรนซัมแวร์'],
+
+    # แพ่ง - สัญญาและหนี้
+    'สัญญา': ['สัญญา', 'ข้อตกลง', 'สัญญาซื้อขาย', 'สัญญาเช่า', 'สัญญาจ้าง'],
+    'หนี้': ['หนี้', 'เงินกู้', 'เงินยืม', 'ชำระหนี้', 'ผิดนัด', 'ผิดสัญญา'],
+    'ละเมิด': ['ละเมิด', 'เสียหาย', 'ค่าสินไหม', 'ชดใช้', 'ชดเชย'],
+
+    # แพ่ง - ครอบครัว
+    'สมรส': ['สมรส', 'แต่งงาน', 'จดทะเบียนสมรส', 'คู่สมรส'],
+    'หย่า': ['หย่า', 'หย่าร้าง', 'เลิกสมรส', 'แยกทาง'],
+    'มรดก': ['มรดก', 'พินัยกรรม', 'ทายาท', 'แบ่งมรดก', 'ผู้จัดการมรดก'],
+
+    # แพ่ง - ที่ดินและอสังหาริมทรัพย์
+    'ที่ดิน': ['ที่ดิน', 'โฉนด', 'กรรมสิทธิ์', 'ภาระจำยอม', 'จำนอง', 'ขายฝาก'],
+
+    # ภาษี
+    'ภาษี': ['ภาษี', 'vat', 'มูลค่าเพิ่ม', 'เงินได้', 'ยื่นแบบ', 'เสียภาษี', 'สรรพากร'],
+
+    # ทรัพย์สินทางปัญญา
+    'ลิขสิทธิ์': ['ลิขสิทธิ์', 'ลิขสิทธิ์', 'ละเมิดลิขสิทธิ์'],
+    'สิทธิบัตร': ['สิทธิบัตร', 'สิทธิบัตร', 'ละเมิดสิทธิบัตร'],
+    'เครื่องหมายการค้า': ['เครื่องหมายการค้า', 'แบรนด์', 'โลโก้', 'เครื่องหมายการค้า'],
+
+    # แรงงาน
+    'แรงงาน': ['แรงงาน', 'ลูกจ้าง', 'นายจ้าง', 'ไล่ออก', 'เลิกจ้าง', 'ค่าชดเชย'],
+
+    # รัฐธรรมนูญ
+    'รัฐธรรมนูญ': ['รัฐธรรมนูญ', 'สิทธิ', 'เสรีภาพ', 'รัฐสภา', 'รัฐบาล', 'ศาล'],
+    'สิทธิ': ['สิทธิ', 'เสรีภาพ', 'สิทธิพลเมือง', 'สิทธิพื้นฐาน'],
+
+    # คำถามทั่วไป
+    'โทษ': ['โทษ', 'จำคุก', 'ปรับ', 'ประหาร', 'กักขัง', 'คุมขัง'],
+    'อายุ': ['อายุ', 'ปี', 'ขวบ', 'ผู้เยาว์', 'ผู้ใหญ่', 'เด็ก'],
+    'เงิน': ['เงิน', 'บาท', 'ค่าปรับ', 'ค่าชดเชย', 'ค่าสินไหม', 'เงินกู้', 'เงินยืม']
+}
+
+# คำหยุดที่ไม่ต้องค้นหา
+STOP_WORDS = {'คือ', 'ที่', 'ใน', 'ของ', 'กับ', 'และ', 'หรือ', 'แต่', 'แล้ว', 'จะ', 'ได้', 'ให้', 'มี', 'เป็น', 'อยู่', 'ไป', 'มา', 'ทำ', 'ให้', 'ได้', 'ต้อง', 'ควร', 'จะ', 'อาจ', 'คง', 'น่าจะ', 'คงจะ', 'อาจจะ'}
+
+# คำในคำถามที่บ่งบอกหมวดกฎหมาย (ส่วนของชื่อหมวด, คำในคำถาม)
+CATEGORY_HINTS = [
+    ('อาญา', ['ผิด', 'โทษ', 'อาญา', 'จำคุก', 'ปรับ', 'ประหาร']),
+    ('แพ่ง', ['สัญญา', 'หนี้', 'ละเมิด', 'มรดก', 'ครอบครัว']),
+    ('รัฐธรรมนูญ', ['สิทธิ', 'เสรีภาพ', 'รัฐสภา', 'รัฐบาล']),
+]
+
+# คำในคำถามที่บ่งบอกบริบทพิเศษ
+SEXUAL_OFFENCE_WORDS = ['ท้อง', 'ทำท้อง', 'ชำเรา', 'ข่มขืน', 'เด็ก', 'ผู้เยาว์']
+THEFT_WORDS = ['ลัก', 'ขโมย', 'ทรัพย์']
+ASSAULT_WORDS = ['ทำร้าย', 'ตบ', 'ตี', 'ต่อย']
+HOMICIDE_WORDS = ['ฆ่า', 'ฆาตกรรม']
+
+# ข้อความในข้อกฎหมายที่ใช้ให้คะแนนบริบทพิเศษ
+LAW_CONTEXT_TERMS = {
+    'ชำเรา': ['ชำเรา'],
+    'ผู้เยาว์': ['ผู้เยาว์'],
+    'ลักทรัพย์': ['ลักทรัพย์', 'ขโมย'],
+    'ทำร้าย': ['ทำร้าย'],
+    'ฆ่า': ['ฆ่า'],
+}
+
+# ป้ายกำกับ (bit) ของแต่ละกลุ่มคำ กลุ่มคำพ้องความหมายอยู่บิตล่างสุดและใช้ร่วมกันทั้งฝั่งคำถามและฝั่งข้อกฎหมาย
+LABEL_BITS = {
+    label: 1 << i for i, label in enumerate([
+        *KEYWORD_MAPPINGS,
+        'ctx:sexual_offence', 'ctx:theft', 'ctx:assault', 'ctx:homicide',
+        *(f'hint:{category_part}' for category_part, _ in CATEGORY_HINTS),
+        *(f'law:{term}' for term in LAW_CONTEXT_TERMS),
+    ])
+}
+GROUPS_MASK = (1 << len(KEYWORD_MAPPINGS)) - 1
+
+def _build_matcher(vocabularies: Dict[str, List[str]]) -> KeywordMatcher:
+    """สร้าง automaton จาก {ป้ายกำกับ: [คำ, ...]}"""
+    patterns = {}
+    for label, words in vocabularies.items():
+        for word in words:
+            patterns[word.lower()] = patterns.get(word.lower(), 0) | LABEL_BITS[label]
+    return KeywordMatcher(patterns)
+
+# automaton ฝั่งคำถาม: กลุ่มคำพ้องความหมาย คำบ่งบอกบริบทพิเศษ และคำบ่งบอกหมวดกฎหมาย
+QUERY_MATCHER = _build_matcher({
+    **KEYWORD_MAPPINGS,
+    'ctx:sexual_offence': SEXUAL_OFFENCE_WORDS,
+    'ctx:theft': THEFT_WORDS,
+    'ctx:assault': ASSAULT_WORDS,
+    'ctx:homicide': HOMICIDE_WORDS,
+    **{f'hint:{category_part}': words for category_part, words in CATEGORY_HINTS},
+})
+
+# automaton ฝั่งข้อกฎหมาย: ใช้คำนวณป้ายกำกับของแต่ละข้อครั้งเดียวตอนสร้างดัชนี
+LAW_MATCHER = _build_matcher({
+    **KEYWORD_MAPPINGS,
+    **{f'law:{term}': words for term, words in LAW_CONTEXT_TERMS.items()},
+})
+
+# ไฟล์ข้อมูลกฎหมาย และไฟล์ดัชนีสำเร็จรูปที่สร้างด้วย `python artifact.py` (ค่าว่างคือไม่ใช้ไฟล์ดัชนี)
+LAW_DATA_PATH = os.getenv("LAW_DATA_PATH", "law_data.json")
+LAW_ARTIFACT_PATH = os.getenv("LAW_ARTIFACT_PATH", "law_data.idx")
+# ที่เก็บและค้นหาข้อกฎหมาย: "memory" (ดัชนีในหน่วยความจำจาก LAW_DATA_PATH) หรือ "sqlite"
+# (ฐานข้อมูล SQLite FTS5 ที่ LAW_DB_PATH สร้างด้วย `python sqlite_backend.py` ทุก worker อ่านไฟล์เดียวกัน)
+LAW_BACKEND = os.getenv("LAW_BACKEND", "memory")
+LAW_DB_PATH = os.getenv("LAW_DB_PATH", "law_data.sqlite3")
+LAW_BACKENDS = ("memory", "sqlite")
+# ตรวจไฟล์ข้อมูลทุกกี่วินาทีแล้ว reload เมื่อไฟล์เปลี่ยน (0 คือไม่ตรวจ)
+LAW_DATA_WATCH_INTERVAL = float(os.getenv("LAW_DATA_WATCH_INTERVAL", "0"))
+# token สำหรับ endpoint /admin/* (ส่งใน header X-Admin-Token) ค่าว่างคือไม่ตรวจ
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+# ตรวจทุกกี่วินาทีว่ามีข้อกฎหมายที่ถูกแทนที่/ลบค้างอยู่ในดัชนีหรือไม่ แล้ว compact (0 คือไม่ compact อัตโนมัติ)
+LAW_COMPACT_INTERVAL = float(os.getenv("LAW_COMPACT_INTERVAL", "300"))
+
+# ข้อมูลกฎหมายรุ่นปัจจุบันพร้อมดัชนี (LawBackend ตาม LAW_BACKEND) สร้างใน startup() ที่เรียกจาก lifespan ของแอป
+# การ import โมดูลนี้จึงไม่โหลดข้อมูลหรือตัวตัดคำ เหมาะกับ CLI และการทดสอบ
+# reload สร้าง snapshot ใหม่แล้วสลับ reference ทีเดียว คำขอที่เริ่มก่อนสลับใช้ snapshot เดิมจนจบ
+# การเปลี่ยน snapshot ทุกแบบ (reload, แก้ไขรายข้อ, compact) ทำทีละงานภายใต้ _snapshot_lock
+SNAPSHOT = None
+_snapshot_lock = threading.Lock()
+_request_snapshot: ContextVar = ContextVar("law_snapshot", default=None)
+STARTED_AT: Optional[str] = None
+# เวลาที่ใช้ในแต่ละขั้นของการเริ่มระบบ (วินาที) แสดงใน /ready
+STARTUP_PHASES: Dict[str, float] = {}
+STARTUP_COMPLETE = False
+_startup_lock = threading.Lock()
+# สถานะการ reload ล่าสุด แสดงใน /ready และ /admin/reload
+RELOAD_STATUS: Dict[str, object] = {"state": "idle"}
+_reload_lock = threading.Lock()
+# บันทึกไฟล์ดัชนีสำเร็จรูปหลังแก้ไขรายข้อทีละงาน (ดู save_artifact)
+_artifact_lock = threading.Lock()
+
+def current_snapshot():
+    """snapshot ที่คำขอปัจจุบันใช้ (ตรึงไว้ตอนเริ่มคำขอ) หรือ snapshot ล่าสุดเมื่อเรียกนอกคำขอ"""
+    snapshot = _request_snapshot.get()
+    return SNAPSHOT if snapshot is None else snapshot
+
+class SnapshotMiddleware:
+    """ตรึง snapshot ของข้อมูลไว้ตลอดคำขอ ผลของคำขอหนึ่งจึงมาจากข้อมูลรุ่นเดียวเสมอแม้ระหว่าง reload"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = _request_snapshot.set(SNAPSHOT)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_snapshot.reset(token)
+
+app.add_middleware(SnapshotMiddleware)
+
+# ตัววัดสำหรับ Prometheus (/metrics) ถ้ารันหลาย process (server.py หลาย worker หรือ uvicorn --workers)
+# ให้ตั้ง METRICS_DIR เป็นไดเรกทอรีเดียวกันทุก worker เพื่อรวมค่าของทุก process
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "1"))
+# ระยะห่างของการวัดความหน่วงของ event loop (วินาที) 0 คือไม่วัด
+EVENT_LOOP_LAG_INTERVAL = float(os.getenv("EVENT_LOOP_LAG_INTERVAL", "1"))
+REQUESTS_TOTAL = METRICS.counter(
+    "http_requests_total", "จำนวนคำขอแยกตาม endpoint, method และ status", ("endpoint", "method", "status")
+)
+REQUEST_SECONDS = METRICS.histogram(
+    "http_request_duration_seconds", "เวลาตอบคำขอ (วินาที) แยกตาม endpoint และหมวดหมู่ที่ค้นหา", ("endpoint", "category")
+)
+RESPONSE_BYTES = METRICS.histogram(
+    "http_response_size_bytes", "ขนาด response ที่ส่งจริง (byte หลังบีบอัด)", ("endpoint",), SIZE_BUCKETS
+)
+REQUESTS_IN_FLIGHT = METRICS.gauge("http_requests_in_flight", "จำนวนคำขอที่กำลังทำงาน", mode="sum")
+CACHE_HITS = METRICS.counter("cache_hits_total", "จำนวนครั้งที่พบข้อมูลใน cache", ("cache",))
+CACHE_MISSES = METRICS.counter("cache_misses_total", "จำนวนครั้งที่ไม่พบข้อมูลใน cache", ("cache",))
+CACHE_HIT_RATIO = METRICS.gauge("cache_hit_ratio", "สัดส่วน hit ต่อการค้น cache ทั้งหมด (รวมทุก worker)", ("cache",))
+EVENT_LOOP_LAG = METRICS.histogram("event_loop_lag_seconds", "ความหน่วงของ event loop เทียบกับเวลาที่ตั้งไว้ (วินาที)")
+# label ของคำขอปัจจุบันที่ endpoint กำหนดเพิ่ม (หมวดหมู่) อ่านโดย MetricsMiddleware ตอนจบคำขอ
+_request_labels: ContextVar = ContextVar("metrics_labels", default=None)
+_route_paths: Dict[object, str] = {}
+
+def _endpoint_label(scope) -> str:
+    """path แบบ template ของ route (เช่น /laws/{category}/{code}) ไม่ใช้ path จริงเพื่อให้จำนวน label จำกัด"""
+    if not _route_paths:
+        _route_paths.update({route.endpoint if hasattr(route, "endpoint") else route.app: route.path
+                             for route in app.routes})
+    return _route_paths.get(scope.get("endpoint"), "other")
+
+def label_category(category: Optional[str]):
+    """ระบุหมวดหมู่ของคำขอปัจจุบันใน REQUEST_SECONDS (หมวดที่ไม่มีในข้อมูลรวมเป็น "other")"""
+    labels = _request_labels.get()
+    if labels is not None:
+        if not category:
+            labels["category"] = "all"
+        else:
+            labels["category"] = category if category in current_snapshot().index.category_bits else "other"
+
+class MetricsMiddleware:
+    """นับคำขอ เวลาตอบ และขนาด response ของทุกคำขอ HTTP แยกตาม endpoint"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        labels = {"category": ""}
+        token = _request_labels.set(labels)
+        status = 500
+        size = 0
+
+        async def send_with_metrics(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            elapsed = time.perf_counter() - started
+            REQUESTS_IN_FLIGHT.dec()
+            endpoint = _endpoint_label(scope)
+            REQUESTS_TOTAL.inc(endpoint, scope["method"], str(status))
+            REQUEST_SECONDS.observe(elapsed, endpoint, labels["category"])
+            RESPONSE_BYTES.observe(size, endpoint)
+            _request_labels.reset(token)
+
+app.add_middleware(MetricsMiddleware)
+
+def _caches():
+    return (("answers", ANSWER_CACHE), ("rankings", RANKING_CACHE),
+            ("tokens", TOKEN_CACHE), ("laws_pages", LAWS_PAGE_CACHE))
+
+def collect_cache_metrics():
+    """คัดลอกจำนวน hit/miss ของ cache ใน process นี้มาเป็นตัววัด (เรียกก่อนอ่านค่าตัววัดทุกครั้ง)"""
+    for name, cache in _caches():
+        stats = cache.stats()
+        CACHE_HITS.set_total(stats["hits"], name)
+        CACHE_MISSES.set_total(stats["misses"], name)
+
+def _reset_cache_stats():
+    # process ลูก (process pool หรือ worker ของ server.py --preload) นับ hit/miss ของตัวเองตั้งแต่ศูนย์
+    # ค่าที่เขียนลงไฟล์ตัววัดของแต่ละ process จึงรวมกันได้โดยไม่นับของ process แม่ซ้ำ
+    for _, cache in _caches():
+        cache.reset_stats()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_cache_stats)
+
+async def monitor_event_loop(interval: float):
+    """วัดว่า event loop ตื่นช้ากว่าที่ตั้งไว้เท่าไร (งานที่บล็อก loop ทำให้คำขออื่นรอ)"""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, loop.time() - started - interval))
+
+@contextmanager
+def _startup_phase(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STARTUP_PHASES[name] = round(time.perf_counter() - started, 3)
+        logger.info(f"เริ่มระบบ: {name} ใช้เวลา {STARTUP_PHASES[name]:.3f} วินาที")
+
+def load_backend(previous_version: Optional[str] = None, phase=None):
+    """
+    backend ของข้อมูลรุ่นล่าสุดตาม LAW_BACKEND หรือ None ถ้าเป็นรุ่นเดียวกับ previous_version (ไม่สร้างซ้ำ)
+    - memory: อ่าน LAW_DATA_PATH แล้วโหลดไฟล์ดัชนีสำเร็จรูปหรือสร้างดัชนีจาก JSON
+    - sqlite: เปิดฐานข้อมูล LAW_DB_PATH แบบอ่านอย่างเดียว
+    phase ใช้จับเวลาแต่ละขั้น (ดู _startup_phase)
+    """
+    # โมดูลที่ import ช้า (scipy) ใช้เฉพาะตอนสร้าง backend
+    from snapshot import build_snapshot, read_data
+
+    if LAW_BACKEND not in LAW_BACKENDS:
+        raise ValueError(f"ไม่รู้จัก LAW_BACKEND: {LAW_BACKEND} (เลือกได้: {', '.join(LAW_BACKENDS)})")
+    phase = phase or (lambda name: nullcontext())
+    if LAW_BACKEND == "sqlite":
+        from sqlite_backend import open_database
+
+        with phase("open_database"):
+            # การเชื่อมต่อหนึ่งชุดต่อ thread ค้นหา และอีกชุดสำหรับ endpoint ที่อ่านข้อมูลใน event loop
+            backend = open_database(LAW_DB_PATH, LAW_MATCHER, SEARCH_EXECUTOR.workers + 1)
+        return None if backend.version == previous_version else backend
+
+    with phase("read_data"):
+        raw_data, version = read_data(LAW_DATA_PATH)
+    if version == previous_version:
+        return None
+    return build_snapshot(raw_data, version, LAW_ARTIFACT_PATH, LAW_MATCHER, phase)
+
+def startup():
+    """
+    เริ่มระบบ: อ่านข้อมูลกฎหมาย โหลดไฟล์ดัชนีสำเร็จรูป สร้างดัชนีจาก JSON หรือเปิดฐานข้อมูล (ตาม LAW_BACKEND)
+    แปลง response คงที่ล่วงหน้า และอุ่นตัวตัดคำ จับเวลาแต่ละขั้นไว้ใน STARTUP_PHASES
+    เรียกซ้ำได้ (ทำงานครั้งเดียว) เช่น server โหมด preload เรียกก่อน fork worker
+    """
+    global SNAPSHOT, STARTED_AT, STARTUP_COMPLETE
+    with _startup_lock:
+        if STARTUP_COMPLETE:
+            return
+        from snapshot import LawSnapshot
+
+        try:
+            SNAPSHOT = load_backend(phase=_startup_phase)
+            SNAPSHOT.validate()
+            logger.info(f"โหลดข้อมูลกฎหมายสำเร็จ: {len(SNAPSHOT)} ข้อ (รุ่น {SNAPSHOT.version}, backend {SNAPSHOT.name})")
+        except Exception as e:
+            logger.error(f"ไม่สามารถโหลดข้อมูลกฎหมายได้: {e}")
+            SNAPSHOT = LawSnapshot.empty(LAW_MATCHER)
+        logger.info(f"สร้างดัชนีค้นหาสำเร็จ: {SNAPSHOT.info()['vocabulary']} คำ")
+
+        # import pythainlp และโหลดพจนานุกรมตัดคำก่อนรับคำขอ คำถามแรกจึงไม่ช้ากว่าคำถามอื่น
+        with _startup_phase("warm_tokenizer"):
+            word_tokenize("ทดสอบการตัดคำภาษาไทย")
+
+        STARTED_AT = datetime.now().isoformat()
+        STARTUP_COMPLETE = True
+        logger.info(f"เริ่มระบบเสร็จใน {sum(STARTUP_PHASES.values()):.3f} วินาที")
+
+def swap_snapshot(snapshot):
+    """
+    ใช้ snapshot ใหม่แทนของเดิม (สลับ reference ครั้งเดียว) แล้วล้าง cache ในหน่วยความจำของรุ่นเดิม
+    คีย์ cache ทุกชุดมีรุ่นข้อมูล ผลของคำขอเดิมที่ใส่ cache หลังสลับจึงไม่ถูกใช้กับข้อมูลรุ่นใหม่
+    """
+    global SNAPSHOT
+    SNAPSHOT = snapshot
+    RANKING_CACHE.clear()
+    LAWS_PAGE_CACHE.clear()
+    if isinstance(ANSWER_CACHE, LRUCache):
+        # cache แบบ sqlite ใช้ร่วมกับ worker อื่นที่อาจยังใช้รุ่นเดิม ปล่อยให้รายการเก่าหมดอายุเอง
+        ANSWER_CACHE.clear()
+    # worker process (ถ้ามี) fork ไว้กับข้อมูลรุ่นเดิม ให้สร้าง pool ใหม่สำหรับงานถัดไป
+    SEARCH_EXECUTOR.recycle()
+
+def reload_laws() -> Dict[str, object]:
+    """
+    อ่านไฟล์ข้อมูล (หรือเปิดฐานข้อมูล) ใหม่ สร้างและตรวจสอบดัชนี แล้วสลับ snapshot (ถ้าข้อมูลไม่เปลี่ยนจะไม่สร้างใหม่)
+    ถ้าล้มเหลวจะใช้ข้อมูลเดิมต่อ คืนสถานะการ reload (มี reload อื่นทำงานอยู่จะคืนสถานะของ reload นั้น)
+    """
+    if not _reload_lock.acquire(blocking=False):
+        return dict(RELOAD_STATUS)
+    try:
+        started = time.perf_counter()
+        previous = SNAPSHOT.version if SNAPSHOT is not None else None
+        RELOAD_STATUS.clear()
+        RELOAD_STATUS.update(state="running", started_at=datetime.now().isoformat(), previous_version=previous)
+        try:
+            with _snapshot_lock:
+                previous = SNAPSHOT.version if SNAPSHOT is not None else None
+                snapshot = load_backend(previous)
+                if snapshot is None:
+                    RELOAD_STATUS.update(state="unchanged", version=previous)
+                else:
+                    snapshot.validate()
+                    swap_snapshot(snapshot)
+                    RELOAD_STATUS.update(state="reloaded", version=snapshot.version, laws=len(snapshot),
+                                         source=snapshot.source)
+                    logger.info(f"reload ข้อมูลกฎหมายสำเร็จ: รุ่น {previous} -> {snapshot.version} ({len(snapshot)} ข้อ)")
+        except Exception as e:
+            logger.error(f"reload ข้อมูลกฎหมายไม่สำเร็จ ใช้ข้อมูลเดิมต่อ: {e}")
+            RELOAD_STATUS.update(state="failed", error=str(e))
+        RELOAD_STATUS.update(finished_at=datetime.now().isoformat(), seconds=round(time.perf_counter() - started, 3))
+        return dict(RELOAD_STATUS)
+    finally:
+        _reload_lock.release()
+
+def _write_data(raw_data: bytes):
+    """บันทึกข้อมูลกฎหมายลง LAW_DATA_PATH (เขียนไฟล์ชั่วคราวแล้วแทนที่ทีเดียว)"""
+    temporary_path = f"{LAW_DATA_PATH}.tmp"
+    with open(temporary_path, "wb") as f:
+        f.write(raw_data)
+    os.replace(temporary_path, LAW_DATA_PATH)
+
+def update_laws(category: str, code: str, ordinal: Optional[int] = None,
+                record: Optional[dict] = None) -> Optional[Dict[str, object]]:
+    """
+    แทนที่ด้วย record (หรือลบเมื่อ record เป็น None) ข้อกฎหมายของ (หมวดหมู่, รหัสมาตรา, ordinal) ดู snapshot.target_docs
+    ปรับดัชนีเฉพาะข้อที่เปลี่ยน (ดู snapshot.update_snapshot) บันทึกข้อมูลใหม่ลงไฟล์ข้อมูลแล้วสลับ snapshot
+    คืน None เมื่อไม่มีข้อที่จะลบ หรือระบุ ordinal ที่ไม่มีอยู่ มาตราที่มีหลายข้อแต่ไม่ระบุ ordinal เกิด AmbiguousLaw
+    ข้อเดิมที่ถูกแทนที่หรือลบจะถูกเก็บกวาดภายหลังด้วย compact_laws
+    """
+    from snapshot import target_docs, update_snapshot
+
+    upserts = [] if record is None else [record]
+    with _snapshot_lock:
+        previous = SNAPSHOT
+        removed = target_docs(previous, category, code, ordinal)
+        if not removed and (record is None or ordinal is not None):
+            return None
+        snapshot, raw_data = update_snapshot(previous, upserts, removed, LAW_MATCHER)
+        snapshot.validate()
+        # บันทึกก่อนสลับ ถ้าบันทึกไม่ได้จะไม่ใช้ข้อมูลใหม่ (ข้อมูลในไฟล์และในหน่วยความจำตรงกันเสมอ)
+        # ตัวตรวจไฟล์และ reload จะเห็นว่ารุ่นตรงกับ snapshot ใหม่จึงไม่สร้างดัชนีซ้ำ
+        _write_data(raw_data)
+        swap_snapshot(snapshot)
+    # ไฟล์ดัชนีสำเร็จรูปเดิมสร้างจากข้อมูลรุ่นก่อน บันทึกใหม่เบื้องหลังให้ cold start ครั้งถัดไปไม่ต้องสร้างจาก JSON
+    threading.Thread(target=save_artifact, args=(snapshot,), name="law-artifact", daemon=True).start()
+    return {
+        "previous_version": previous.version,
+        "version": snapshot.version,
+        "removed": len(removed),
+        "added": len(upserts),
+        "laws": len(snapshot),
+        "pending_compaction": snapshot.index.deleted_count,
+        "seconds": snapshot.build_seconds
+    }
+
+def save_artifact(snapshot):
+    """
+    บันทึกไฟล์ดัชนีสำเร็จรูป (LAW_ARTIFACT_PATH) ของ snapshot ที่แก้ไขผ่าน update_laws ให้ตรงกับไฟล์ข้อมูลใหม่
+    ข้อที่ลบค้างอยู่ถูก compact ในสำเนาก่อนบันทึก (snapshot ที่ใช้งานอยู่ไม่เปลี่ยน)
+    ข้ามถ้ามีการแก้ไขที่ใหม่กว่าแล้ว เพราะการแก้ไขนั้นจะบันทึกไฟล์ของตัวเอง
+    """
+    from artifact import build_key, write_artifact
+    from snapshot import compact_snapshot
+
+    if not LAW_ARTIFACT_PATH:
+        return
+    with _artifact_lock:
+        if SNAPSHOT.version != snapshot.version:
+            return
+        try:
+            if snapshot.index.deleted_count:
+                snapshot = compact_snapshot(snapshot)
+            size = write_artifact(LAW_ARTIFACT_PATH, build_key(snapshot.version, LAW_MATCHER),
+                                  snapshot.store, snapshot.index, snapshot.matrix)
+        except Exception as e:
+            logger.error(f"บันทึกไฟล์ดัชนีสำเร็จรูปไม่สำเร็จ (cold start ครั้งถัดไปจะสร้างดัชนีจาก JSON): {e}")
+            return
+    logger.info(f"บันทึกไฟล์ดัชนีสำเร็จรูป {LAW_ARTIFACT_PATH} ของรุ่น {snapshot.version} ({size / 1e6:.1f} MB)")
+
+def compact_laws(blocking: bool = True) -> Optional[Dict[str, object]]:
+    """
+    สร้างดัชนีใหม่ที่ไม่มีข้อที่ถูกแทนที่/ลบค้างอยู่ (ไม่ต้องตัดคำใหม่) แล้วสลับ snapshot
+    คืน None เมื่อไม่มีอะไรต้อง compact หรือ (blocking=False) มีงานอื่นกำลังเปลี่ยน snapshot อยู่
+    """
+    from snapshot import compact_snapshot
+
+    if not _snapshot_lock.acquire(blocking=blocking):
+        return None
+    try:
+        previous = SNAPSHOT
+        deleted = previous.index.deleted_count
+        if not deleted:
+            return None
+        snapshot = compact_snapshot(previous)
+        snapshot.validate()
+        swap_snapshot(snapshot)
+    finally:
+        _snapshot_lock.release()
+    return {"version": snapshot.version, "compacted": deleted, "laws": len(snapshot), "seconds": snapshot.build_seconds}
+
+async def compact_periodically(interval: float):
+    """compact ดัชนีเบื้องหลังทุก interval วินาทีเมื่อมีข้อที่ถูกแทนที่หรือลบค้างอยู่"""
+    while True:
+        await asyncio.sleep(interval)
+        if SNAPSHOT is not None and SNAPSHOT.index.deleted_count:
+            try:
+                await asyncio.to_thread(compact_laws, False)
+            except Exception as e:
+                logger.error(f"compact ดัชนีไม่สำเร็จ: {e}")
+
+def schedule_reload():
+    """เริ่ม reload ใน thread เบื้องหลัง (คำขออื่นทำงานต่อได้ระหว่างสร้างดัชนี)"""
+    threading.Thread(target=reload_laws, name="law-reload", daemon=True).start()
+
+def _file_signature(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+async def watch_data_file(interval: float):
+    """
+    ตรวจเวลาแก้ไขและขนาดของไฟล์ข้อมูล (backend sqlite ตรวจไฟล์ฐานข้อมูล) ทุก interval วินาที
+    แล้ว reload เมื่อไฟล์เปลี่ยน
+    """
+    path = LAW_DB_PATH if LAW_BACKEND == "sqlite" else LAW_DATA_PATH
+    last = _file_signature(path)
+    while True:
+        await asyncio.sleep(interval)
+        signature = _file_signature(path)
+        if signature != last and signature is not None:
+            last = signature
+            schedule_reload()
 
 class Question(BaseModel):
     question: str
     category: Optional[str] = None
+    ranker: Optional[str] = None
+
+# จำนวนคำถามสูงสุดต่อหนึ่งคำขอของ /ask/batch และ /search/batch
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "100"))
+
+class BatchItem(BaseModel):
+    question: str
+    category: Optional[str] = None
+
+class AskBatch(BaseModel):
+    questions: List[BatchItem] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+    ranker: Optional[str] = None
+    full: bool = False
+
+class SearchBatch(BaseModel):
+    questions: List[BatchItem] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+    ranker: Optional[str] = None
+    limit: int = Field(10, ge=1, le=100)
+    full: bool = False
+
+class LawUpdate(BaseModel):
+    title: str
+    text: str = Field(..., min_length=1)
 
 class LawResponse(BaseModel):
     answer: str
@@ -48,6 +680,10 @@ class LawResponse(BaseModel):
     confidence: float
     disclaimer: str
     timestamp: str
+    # จำนวนข้อกฎหมายที่ตรงกับคำถามแยกตามหมวดหมู่ (ก่อนกรองหมวดหมู่)
+    facets: Dict[str, int] = {}
+    # สรุปโปรไฟล์ (เฉพาะคำขอที่ถูกโปรไฟล์)
+    profile: Optional[dict] = None
 
 @app.get("/", response_class=HTMLResponse)
 async def root():
@@ -67,9 +703,140 @@ async def root():
         </html>
         """)
 
-@app.post("/ask", response_model=LawResponse)
-async def ask_law(question: Question):
-    """ถามคำถามกฎหมาย"""
+@app.get("/health")
+async def health():
+    """ตรวจสอบว่า server ทำงานอยู่ (liveness) ไม่มีการคำนวณใด ๆ"""
+    return {"status": "ok"}
+
+@app.get("/ready")
+async def ready():
+    """
+    ตรวจสอบว่าพร้อมรับคำขอ (readiness) พร้อมสถานะข้อมูล ดัชนี cache และ worker pool
+    ตอบ 503 ระหว่างเริ่มระบบ เมื่อไม่มีข้อมูลกฎหมาย หรือ worker และคิวเต็ม
+    """
+    startup_info = {"complete": STARTUP_COMPLETE, "phases": STARTUP_PHASES,
+                    "total_seconds": round(sum(STARTUP_PHASES.values()), 3)}
+    if not STARTUP_COMPLETE:
+        return JSONResponse(status_code=503, content={"status": "starting", "startup": startup_info})
+
+    snapshot = current_snapshot()
+    executor = SEARCH_EXECUTOR.stats()
+    answer_stats = await answer_cache_call(ANSWER_CACHE.stats)
+    is_ready = len(snapshot) > 0 and executor["in_flight"] < executor["capacity"]
+    return JSONResponse(
+        status_code=200 if is_ready else 503,
+        content={
+            "status": "ready" if is_ready else "not_ready",
+            "laws": len(snapshot),
+            "data_version": snapshot.version,
+            "started_at": STARTED_AT,
+            "startup": startup_info,
+            "index": snapshot.info(),
+            "reload": dict(RELOAD_STATUS),
+            "caches": {
+                name: {key: stats[key] for key in ("backend", "size", "maxsize", "hit_rate")}
+                for name, stats in (
+                    ("answers", answer_stats),
+                    ("rankings", RANKING_CACHE.stats()),
+                    ("tokens", TOKEN_CACHE.stats())
+                )
+            },
+            "executor": executor
+        }
+    )
+
+def _check_ranker(ranker: Optional[str]):
+    """ตรวจสอบชื่อตัวจัดอันดับที่ผู้ใช้ระบุ"""
+    if ranker and ranker not in RANKERS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"ไม่รู้จักตัวจัดอันดับ '{ranker}' (เลือกได้: {', '.join(RANKERS)})"
+        )
+
+def _answer_cache_key(text: str, category: Optional[str], ranker: Optional[str], full: bool = False) -> str:
+    """คีย์ cache คำตอบ: hash ของรุ่นข้อมูล ตัวจัดอันดับ หมวดหมู่ รูปแบบเนื้อหา และคำถามที่ normalize แล้ว"""
+    key = json.dumps([current_snapshot().version, ranker or DEFAULT_RANKER, category or "", full, text], ensure_ascii=False)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+async def answer_cache_call(method: Callable, *args):
+    """
+    เรียกเมธอดของ ANSWER_CACHE: backend sqlite อ่าน/เขียนไฟล์และ commit ทุกครั้ง (get ปรับเวลาใช้งานล่าสุดด้วย)
+    และอาจรอ lock ของ worker อื่น จึงรันใน thread แยกไม่ให้ event loop ค้าง ส่วน backend memory เรียกตรง ๆ
+    """
+    if isinstance(ANSWER_CACHE, SQLiteCache):
+        return await asyncio.to_thread(method, *args)
+    return method(*args)
+
+def _get_answers(keys: List[str]) -> List[Optional[dict]]:
+    """คำตอบใน ANSWER_CACHE ของหลายคีย์ (None ถ้าไม่มี) สำหรับเรียกผ่าน answer_cache_call ครั้งเดียว"""
+    return [ANSWER_CACHE.get(key) for key in keys]
+
+def _put_answers(items: List[Tuple[str, dict]]):
+    for key, response in items:
+        ANSWER_CACHE.put(key, response)
+
+def _saturated_error() -> HTTPException:
+    """คำขอเกินกำลังของ worker และคิว"""
+    return HTTPException(
+        status_code=503,
+        detail="ระบบมีคำขอมากเกินไป กรุณาลองใหม่อีกครั้ง",
+        headers={"Retry-After": "1"}
+    )
+
+PROFILE_FLAGS = ("1", "true", "yes", "on")
+# โปรไฟล์ที่ผู้ดูแลขอคำนวณทุกขั้นใหม่ (ไม่ใช้ผลการตัดคำและคะแนนใน cache) เพื่อให้เห็นงานทั้งหมดของคำถามนั้น
+_bypass_caches: ContextVar = ContextVar("bypass_caches", default=False)
+
+def run_uncached(func: Callable, *args):
+    """รัน func(*args) โดยไม่อ่าน TOKEN_CACHE และ RANKING_CACHE (ผลใหม่ยังเก็บลง cache ตามปกติ)"""
+    token = _bypass_caches.set(True)
+    try:
+        return func(*args)
+    finally:
+        _bypass_caches.reset(token)
+
+def _profile_requested(flag: bool, header: Optional[str], token: Optional[str]) -> bool:
+    """ผู้ดูแลขอโปรไฟล์คำขอนี้หรือไม่ (?profile=1 หรือ header X-Profile: 1 ต้องมี X-Admin-Token ที่ตรงกับ ADMIN_TOKEN)"""
+    if flag or (header or "").strip().lower() in PROFILE_FLAGS:
+        _check_admin(token)
+        return True
+    return False
+
+def _profile_sampled() -> bool:
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+async def _run_profiled(profile_id: str, endpoint: str, params: dict, uncached: bool,
+                        func: Callable, *args) -> Tuple[object, Optional[dict]]:
+    """
+    รันงานค้นหาใน SEARCH_EXECUTOR ภายใต้ cProfile แล้วบันทึกโปรไฟล์ คืน (ผลลัพธ์, สรุปโปรไฟล์)
+    uncached คือไม่ใช้ผลใน cache (โปรไฟล์ที่ผู้ดูแลขอ) ส่วนโปรไฟล์ที่สุ่มได้ใช้ cache ตามปกติเหมือนคำขอจริง
+    สรุปเป็น None เมื่อมีการโปรไฟล์อื่นทำงานอยู่ใน worker เดียวกันหรือบันทึกไฟล์ไม่สำเร็จ (ผลลัพธ์ยังถูกต้อง)
+    """
+    if uncached:
+        func, args = run_uncached, (func, *args)
+    result, stats = await SEARCH_EXECUTOR.run(run_profiled, func, *args)
+    if stats is None:
+        return result, None
+    meta = {"endpoint": endpoint, "params": params, "uncached": uncached, "data_version": current_snapshot().version}
+    try:
+        summary = await asyncio.to_thread(PROFILES.save, profile_id, stats, meta)
+    except OSError as e:
+        logger.warning(f"บันทึกโปรไฟล์ {profile_id} ไม่สำเร็จ: {e}")
+        return result, None
+    logger.info(f"บันทึกโปรไฟล์ {profile_id} ของ {endpoint} ({summary['total_seconds']:.4f} วินาที)")
+    return result, {**summary, "url": f"/admin/profiles/{profile_id}"}
+
+@app.post("/ask", response_model=LawResponse, response_model_exclude_none=True)
+async def ask_law(question: Question, full: bool = False, profile: bool = False,
+                  x_profile: Optional[str] = Header(None), x_admin_token: Optional[str] = Header(None),
+                  x_request_id: Optional[str] = Header(None)):
+    """
+    ถามคำถามกฎหมาย (ข้อกฎหมายที่เกี่ยวข้องแสดงเป็น snippet ยกเว้นเมื่อขอ full=1)
+    profile=1 (หรือ header X-Profile: 1) สำหรับผู้ดูแล: คำนวณคำตอบใหม่ภายใต้ cProfile แล้วแสดงสรุปใน profile
+    """
+    _check_ranker(question.ranker)
+    label_category(question.category)
+    profiled = _profile_requested(profile, x_profile, x_admin_token)
     try:
         q = question.question.strip()
         if not q:
@@ -77,247 +844,657 @@ async def ask_law(question: Question):
         
         logger.info(f"ได้รับคำถาม: {q}")
         
-        # ค้นหาข้อกฎหมายที่เกี่ยวข้อง
-        results = search_laws(q, question.category)
+        # คำตอบขึ้นกับคำถาม หมวดหมู่ ตัวจัดอันดับ และรุ่นของข้อมูลเท่านั้น จึงใช้คำตอบเดิมได้ (อัปเดตเฉพาะ timestamp)
+        # คำขอที่ผู้ดูแลขอโปรไฟล์ไม่ใช้คำตอบใน cache ส่วนการสุ่มโปรไฟล์เกิดเฉพาะเมื่อต้องคำนวณคำตอบใหม่
+        cache_key = _answer_cache_key(normalize_question(q), question.category, question.ranker, full)
+        response = None if profiled else await answer_cache_call(ANSWER_CACHE.get, cache_key)
+        profile_summary = None
+        if response is None:
+            # ค้นหาและสร้างคำตอบนอก event loop
+            args = (q, question.category, question.ranker, full)
+            if profiled or _profile_sampled():
+                params = {"question": q, "category": question.category, "ranker": question.ranker, "full": full}
+                response, profile_summary = await _run_profiled(
+                    request_id(x_request_id), "/ask", params, profiled, answer_question, *args
+                )
+            else:
+                response = await SEARCH_EXECUTOR.run(answer_question, *args)
+            await answer_cache_call(ANSWER_CACHE.put, cache_key, response)
         
-        if results:
-            # สร้างคำตอบ
-            answer = create_answer(results, q)
-            confidence = calculate_confidence(results, q)
-        else:
-            answer = "ขออภัย ไม่พบข้อมูลกฎหมายที่เกี่ยวข้องกับคำถามนี้ กรุณาลองใช้คำอื่นหรือปรึกษาทนายความ"
-            confidence = 0.0
-            results = []
-        
-        disclaimer = "ข้อมูลนี้เป็นเพียงข้อมูลเบื้องต้น ไม่ใช่คำปรึกษาทางกฎหมายโดยตรง"
-        
-        return LawResponse(
-            answer=answer,
-            related_laws=results,
-            confidence=confidence,
-            disclaimer=disclaimer,
-            timestamp=datetime.now().isoformat()
-        )
+        return LawResponse(**response, timestamp=datetime.now().isoformat(), profile=profile_summary)
         
+    except HTTPException:
+        raise
+    except ExecutorSaturated:
+        raise _saturated_error()
     except Exception as e:
         logger.error(f"เกิดข้อผิดพลาด: {e}")
         raise HTTPException(status_code=500, detail="เกิดข้อผิดพลาดภายในระบบ")
 
+# ฟิลด์ของข้อกฎหมายที่เลือกได้ใน /laws?fields=
+LAW_FIELDS = ("title", "text", "code", "category")
+# จำนวนข้อกฎหมายต่อหนึ่ง chunk ของ NDJSON
+NDJSON_CHUNK_SIZE = 32
+
+def _parse_fields(fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """แปลง fields=title,code เป็น tuple ของฟิลด์ (None คือทุกฟิลด์)"""
+    if not fields:
+        return None
+    selected = tuple(dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+    unknown = [field for field in selected if field not in LAW_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"ไม่รู้จักฟิลด์ {', '.join(unknown)} (เลือกได้: {', '.join(LAW_FIELDS)})"
+        )
+    return selected or None
+
+def _iter_ndjson(store, doc_ids: List[int], fields: Optional[Tuple[str, ...]]):
+    # เขียนทีละ chunk แทนการสร้าง response ก้อนเดียว (ใช้ store ของ snapshot ตอนเริ่มคำขอจนจบ stream)
+    for start in range(0, len(doc_ids), NDJSON_CHUNK_SIZE):
+        yield "".join(
+            json.dumps(store.record(doc_id, fields), ensure_ascii=False) + "\n"
+            for doc_id in doc_ids[start:start + NDJSON_CHUNK_SIZE]
+        )
+
+def _select_laws(category: Optional[str], offset: int, limit: Optional[int]) -> Tuple[int, List[int]]:
+    """จำนวนข้อกฎหมายทั้งหมดในหมวดหมู่ (หรือทั้งหมด) และเลขเอกสารของหน้าที่ขอ"""
+    snapshot = current_snapshot()
+    if category:
+        doc_ids = list(iter_bits(snapshot.index.category_bits.get(category, 0)))
+    else:
+        doc_ids = snapshot.doc_ids()
+    return len(doc_ids), list(doc_ids[offset:offset + limit if limit else None])
+
 @app.get("/laws")
-async def get_all_laws():
-    """ดูรายการกฎหมายทั้งหมด"""
-    return {
-        "total": len(LAW_DATA),
-        "laws": LAW_DATA
-    }
+async def get_all_laws(request: Request, offset: int = Query(0, ge=0), limit: Optional[int] = Query(None, ge=1),
+                       category: Optional[str] = None, fields: Optional[str] = None,
+                       output: str = Query("json", alias="format", pattern="^(json|ndjson)$")):
+    """
+    ดูรายการกฎหมาย (ค่าเริ่มต้นคือทั้งหมด) แบ่งหน้าด้วย offset/limit กรองตามหมวดหมู่
+    เลือกฟิลด์ด้วย fields=title,code,category และ format=ndjson ส่งทีละบรรทัดแบบ streaming
+    """
+    selected_fields = _parse_fields(fields)
+    snapshot = current_snapshot()
+    label_category(category)
+    
+    if output == "ndjson":
+        total, page = _select_laws(category, offset, limit)
+        return StreamingResponse(
+            _iter_ndjson(snapshot.store, page, selected_fields),
+            media_type="application/x-ndjson",
+            headers={"X-Total-Count": str(total)}
+        )
+    
+    # รายการทั้งหมดแปลงไว้แล้วตอนโหลดข้อมูล ส่วนชุดพารามิเตอร์อื่นแปลงครั้งแรกแล้วเก็บใน cache
+    if (offset, limit, category or None, selected_fields) == (0, None, None, None):
+        return snapshot.laws_response.respond(request)
+    key = (snapshot.version, offset, limit, category or None, selected_fields)
+    precomputed = LAWS_PAGE_CACHE.get(key)
+    if precomputed is None:
+        total, page = _select_laws(category, offset, limit)
+        precomputed = PrecomputedResponse({
+            "total": total,
+            "offset": offset,
+            "limit": limit,
+            "laws": [snapshot.store.record(doc_id, selected_fields) for doc_id in page]
+        }, snapshot.version)
+        LAWS_PAGE_CACHE.put(key, precomputed)
+    return precomputed.respond(request)
+
+@app.get("/laws/{category}/{code}")
+async def get_law_by_code(request: Request, category: str, code: str, fields: Optional[str] = None):
+    """
+    ดูข้อกฎหมายตามหมวดหมู่และเลขมาตราโดยตรงจากดัชนีรหัสมาตรา
+    code เป็นมาตราเดียว (277) ช่วง (276-280) หรือรายการ (80,81) ก็ได้
+    """
+    selected_fields = _parse_fields(fields)
+    label_category(category)
+    codes = parse_section_numbers(code)
+    if not codes:
+        raise HTTPException(status_code=400, detail="กรุณาระบุเลขมาตราเป็นตัวเลข")
+    
+    snapshot = current_snapshot()
+    key = (snapshot.version, "code", category, codes, selected_fields)
+    precomputed = LAWS_PAGE_CACHE.get(key)
+    if precomputed is None:
+        doc_ids = [doc_id for section in codes for doc_id in snapshot.index.lookup(category, section)]
+        if not doc_ids:
+            raise HTTPException(status_code=404, detail=f"ไม่พบ{category} มาตรา {code}")
+        precomputed = PrecomputedResponse({
+            "category": category,
+            "codes": list(codes),
+            "total": len(doc_ids),
+            "laws": [snapshot.store.record(doc_id, selected_fields) for doc_id in doc_ids]
+        }, snapshot.version)
+        LAWS_PAGE_CACHE.put(key, precomputed)
+    return precomputed.respond(request)
 
 @app.get("/search")
-async def search_laws_endpoint(q: str, category: Optional[str] = None):
-    """ค้นหากฎหมาย"""
+async def search_laws_endpoint(q: str, category: Optional[str] = None, ranker: Optional[str] = None,
+                               limit: int = Query(10, ge=1, le=100), offset: int = Query(0, ge=0),
+                               full: bool = False, snippet_length: int = Query(SNIPPET_LENGTH, ge=50, le=5000),
+                               profile: bool = False, x_profile: Optional[str] = Header(None),
+                               x_admin_token: Optional[str] = Header(None), x_request_id: Optional[str] = Header(None)):
+    """
+    ค้นหากฎหมาย (แบ่งหน้าด้วย limit/offset ผลแสดงเป็น snippet ยกเว้นเมื่อขอ full=1)
+    profile=1 (หรือ header X-Profile: 1) สำหรับผู้ดูแล: ค้นหาภายใต้ cProfile แล้วแสดงสรุปใน profile
+    """
+    _check_ranker(ranker)
+    label_category(category)
+    profiled = _profile_requested(profile, x_profile, x_admin_token)
+    args = (q, category, ranker, limit, offset, full, snippet_length)
     try:
-        results = search_laws(q, category)
-        return {
-            "query": q,
-            "results": results,
-            "total": len(results)
-        }
+        if not (profiled or _profile_sampled()):
+            return await SEARCH_EXECUTOR.run(search_page, *args)
+        params = {"q": q, "category": category, "ranker": ranker, "limit": limit, "offset": offset, "full": full}
+        result, profile_summary = await _run_profiled(
+            request_id(x_request_id), "/search", params, profiled, search_page, *args
+        )
+        return {**result, "profile": profile_summary} if profile_summary else result
+    except ExecutorSaturated:
+        raise _saturated_error()
     except Exception as e:
         logger.error(f"เกิดข้อผิดพลาดในการค้นหา: {e}")
         raise HTTPException(status_code=500, detail="เกิดข้อผิดพลาดในการค้นหา")
 
-@app.get("/categories")
-async def get_categories():
-    """ดูหมวดหมูกฎหมาย"""
-    categories = set()
-    for law in LAW_DATA:
-        if "category" in law:
-            categories.add(law["category"])
+@app.post("/ask/batch")
+async def ask_batch(batch: AskBatch):
+    """ถามหลายคำถามในคำขอเดียว ผลเรียงตามลำดับคำถาม คำถามที่ซ้ำกันคำนวณครั้งเดียว"""
+    _check_ranker(batch.ranker)
+    keys: List[Optional[str]] = []
+    questions: Dict[str, Tuple[str, Optional[str]]] = {}
+    for item in batch.questions:
+        text = normalize_question(item.question)
+        key = _answer_cache_key(text, item.category, batch.ranker, batch.full) if text else None
+        keys.append(key)
+        if key is not None and key not in questions:
+            questions[key] = (text, item.category)
+    # อ่าน cache ของทุกคำถามในครั้งเดียว (backend sqlite อ่านใน thread แยก)
+    cached = await answer_cache_call(_get_answers, list(questions))
+    responses: Dict[str, dict] = {key: response for key, response in zip(questions, cached) if response is not None}
+    missing = {key: question for key, question in questions.items() if key not in responses}
+    
+    if missing:
+        try:
+            computed = await SEARCH_EXECUTOR.run(answer_batch, list(missing.values()), batch.ranker, batch.full)
+        except ExecutorSaturated:
+            raise _saturated_error()
+        responses.update(zip(missing, computed))
+        await answer_cache_call(_put_answers, [(key, response) for key, response in zip(missing, computed)
+                                               if "error" not in response])
     
+    timestamp = datetime.now().isoformat()
+    results = []
+    for key in keys:
+        if key is None:
+            results.append({"error": "กรุณากรอกคำถาม"})
+        elif "error" in responses[key]:
+            results.append(responses[key])
+        else:
+            results.append({**responses[key], "timestamp": timestamp})
+    return {"results": results, "total": len(results), "unique": len(responses)}
+
+@app.post("/search/batch")
+async def search_batch_endpoint(batch: SearchBatch):
+    """ค้นหาหลายคำค้นในคำขอเดียว ผลเรียงตามลำดับคำค้น คำค้นที่ซ้ำกันคำนวณครั้งเดียว"""
+    _check_ranker(batch.ranker)
+    items = [(item.question, item.category) for item in batch.questions]
+    try:
+        results = await SEARCH_EXECUTOR.run(search_batch, items, batch.ranker, batch.limit, batch.full)
+    except ExecutorSaturated:
+        raise _saturated_error()
+    return {"results": results, "total": len(results)}
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """ดูสถิติ cache (ขนาด hit/miss และจำนวนรายการที่ถูกลบ)"""
     return {
-        "categories": list(categories),
-        "total": len(categories)
+        "data_version": current_snapshot().version,
+        "answers": await answer_cache_call(ANSWER_CACHE.stats),
+        "rankings": RANKING_CACHE.stats(),
+        "tokens": TOKEN_CACHE.stats(),
+        "laws_pages": LAWS_PAGE_CACHE.stats(),
+        "executor": SEARCH_EXECUTOR.stats()
     }
 
-def search_laws(query: str, category: Optional[str] = None) -> List[dict]:
-    """ค้นหาข้อกฎหมายที่เกี่ยวข้อง - ปรับปรุงให้แม่นยำและครอบคลุมมากขึ้น"""
-    query_words = pythainlp.word_tokenize(query, keep_whitespace=False)
-    results = []
-    
-    # คำสำคัญและคำพ้องความหมายที่ครอบคลุม
-    keyword_mappings = {
-        # อาญา - ความผิดต่อชีวิตและร่างกาย
-        'ฆ่า': ['ฆ่า', 'ฆาตกรรม', 'ประหาร', 'ฆ่าคนตาย', 'ฆาตกร', 'ฆาตร'],
-        'ทำร้ายร่างกาย': ['ทำร้าย', 'ร่างกาย', 'ตบ', 'ตี', 'ทุบ', 'เตะ', 'ต่อย', 'ชก', 'ทำร้ายร่างกาย', 'บาดเจ็บ'],
-        'ชำเรา': ['ชำเรา', 'ข่มขืน', 'อนาจาร', 'ข่มขืนกระทำชำเรา', 'กระทำชำเรา', 'ข่มขืนใจ'],
-        'พรากผู้เยาว์': ['พราก', 'ผู้เยาว์', 'เยาว์', 'เด็ก', 'พรากเด็ก', 'ลักพา', 'พาไป'],
-        
-        # อาญา - ความผิดต่อทรัพย์
-        'ลักทรัพย์': ['ลัก', 'ทรัพย์', 'ขโมย', 'ลักขโมย', 'ลักทรัพย์', 'ขโมยของ', 'ลักของ'],
-        'ฉ้อโกง': ['ฉ้อ', 'โกง', 'หลอก', 'ฉ้อโกง', 'หลอกลวง', 'โกงกิน', 'ทุจริต'],
-        'ปล้น': ['ปล้น', 'ชิง', 'โจร', 'ปล้นทรัพย์', 'ชิงทรัพย์', 'โจรกรรม'],
-        'ยักยอก': ['ยักยอก', 'ยักยอกทรัพย์', 'ยักยอกเงิน', 'ยักยอกของ'],
-        
-        # อาญา - ความผิดต่อความสงบสุข
-        'ยาเสพติด': ['ยาเสพติด', 'ยา', 'เสพ', 'ติด', 'เฮโรอีน', 'มอร์ฟีน', 'โคเคน', 'กัญชา', 'ยาบ้า', 'ไอซ์', 'แอมเฟตามีน'],
-        'คอร์รัปชัน': ['คอร์รัปชัน', 'ทุจริต', 'รับสินบน', 'สินบน', 'คอร์รัปชั่น', 'ทุจริตคอร์รัปชัน'],
-        
-        # อาญา - ความผิดเกี่ยวกับคอมพิวเตอร์
-        'คอมพิวเตอร์': ['คอมพิวเตอร์', 'ระบบ', 'ข้อมูล', 'แฮก', 'ไวรัส', 'สแปม', 'ลามก', 'เท็จ', 'ไซเบอร์', 'อินเทอร์เน็ต'],
-        'แฮก': ['แฮก', 'แฮกเกอร์', 'เข้าถึง', 'เจาะระบบ', 'เจาะข้อมูล'],
-        'ไวรัส': ['ไวรัส', 'มัลแวร์', 'สปายแวร์', 'ทรอยจัน', 'แรนซัมแวร์'],
-        
-        # แพ่ง - สัญญาและหนี้
-        'สัญญา': ['สัญญา', 'ข้อตกลง', 'สัญญาซื้อขาย', 'สัญญาเช่า', 'สัญญาจ้าง'],
-        'หนี้': ['หนี้', 'เงินกู้', 'เงินยืม', 'ชำระหนี้', 'ผิดนัด', 'ผิดสัญญา'],
-        'ละเมิด': ['ละเมิด', 'เสียหาย', 'ค่าสินไหม', 'ชดใช้', 'ชดเชย'],
-        
-        # แพ่ง - ครอบครัว
-        'สมรส': ['สมรส', 'แต่งงาน', 'จดทะเบียนสมรส', 'คู่สมรส'],
-        'หย่า': ['หย่า', 'หย่าร้าง', 'เลิกสมรส', 'แยกทาง'],
-        'มรดก': ['มรดก', 'พินัยกรรม', 'ทายาท', 'แบ่งมรดก', 'ผู้จัดการมรดก'],
-        
-        # แพ่ง - ที่ดินและอสังหาริมทรัพย์
-        'ที่ดิน': ['ที่ดิน', 'โฉนด', 'กรรมสิทธิ์', 'ภาระจำยอม', 'จำนอง', 'ขายฝาก'],
-        
-        # ภาษี
-        'ภาษี': ['ภาษี', 'vat', 'มูลค่าเพิ่ม', 'เงินได้', 'ยื่นแบบ', 'เสียภาษี', 'สรรพากร'],
-        
-        # ทรัพย์สินทางปัญญา
-        'ลิขสิทธิ์': ['ลิขสิทธิ์', 'ลิขสิทธิ์', 'ละเมิดลิขสิทธิ์'],
-        'สิทธิบัตร': ['สิทธิบัตร', 'สิทธิบัตร', 'ละเมิดสิทธิบัตร'],
-        'เครื่องหมายการค้า': ['เครื่องหมายการค้า', 'แบรนด์', 'โลโก้', 'เครื่องหมายการค้า'],
-        
-        # แรงงาน
-        'แรงงาน': ['แรงงาน', 'ลูกจ้าง', 'นายจ้าง', 'ไล่ออก', 'เลิกจ้าง', 'ค่าชดเชย'],
-        
-        # รัฐธรรมนูญ
-        'รัฐธรรมนูญ': ['รัฐธรรมนูญ', 'สิทธิ', 'เสรีภาพ', 'รัฐสภา', 'รัฐบาล', 'ศาล'],
-        'สิทธิ': ['สิทธิ', 'เสรีภาพ', 'สิทธิพลเมือง', 'สิทธิพื้นฐาน'],
-        
-        # คำถามทั่วไป
-        'โทษ': ['โทษ', 'จำคุก', 'ปรับ', 'ประหาร', 'กักขัง', 'คุมขัง'],
-        'อายุ': ['อายุ', 'ปี', 'ขวบ', 'ผู้เยาว์', 'ผู้ใหญ่', 'เด็ก'],
-        'เงิน': ['เงิน', 'บาท', 'ค่าปรับ', 'ค่าชดเชย', 'ค่าสินไหม', 'เงินกู้', 'เงินยืม']
+@app.get("/metrics")
+async def get_metrics():
+    """
+    ตัววัดทั้งหมดใน text format ของ Prometheus รวมทุก worker ที่ใช้ METRICS_DIR เดียวกัน
+    (จำนวนคำขอ เวลาตอบและขนาด response แยกตาม endpoint เวลาแต่ละขั้นของการค้นหา cache และ event loop)
+    """
+    samples = await asyncio.to_thread(METRICS.collect)
+    hits = samples.get(CACHE_HITS.name, {})
+    misses = samples.get(CACHE_MISSES.name, {})
+    samples[CACHE_HIT_RATIO.name] = {
+        labels: round(hits[labels] / (hits[labels] + misses.get(labels, 0)), 4) if hits[labels] else 0.0
+        for labels in hits
     }
-    
-    # คำหยุดที่ไม่ต้องค้นหา
-    stop_words = {'คือ', 'ที่', 'ใน', 'ของ', 'กับ', 'และ', 'หรือ', 'แต่', 'แล้ว', 'จะ', 'ได้', 'ให้', 'มี', 'เป็น', 'อยู่', 'ไป', 'มา', 'ทำ', 'ให้', 'ได้', 'ต้อง', 'ควร', 'จะ', 'อาจ', 'คง', 'น่าจะ', 'คงจะ', 'อาจจะ'}
-    
-    for law in LAW_DATA:
-        # กรองตามหมวดหมู่
-        if category and law.get("category") != category:
-            continue
-            
+    return Response(content=METRICS.render(samples), media_type="text/plain; version=0.0.4")
+
+def _check_admin(token: Optional[str]):
+    """
+    ตรวจ token ของ endpoint ผู้ดูแลระบบ ถ้าไม่ตั้ง ADMIN_TOKEN จะปิด endpoint ผู้ดูแลทั้งหมด (ตอบ 403)
+    เพราะ CORS เปิดทุก origin หน้าเว็บใดก็สั่งงานผ่าน browser ของผู้เข้าชมได้ถ้าไม่ตรวจ
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="ปิด endpoint ผู้ดูแลระบบ: ยังไม่ได้ตั้ง ADMIN_TOKEN")
+    if token is None or not secrets.compare_digest(token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=403, detail="ไม่มีสิทธิ์ใช้งาน endpoint ผู้ดูแลระบบ")
+
+def _check_writable():
+    """backend ที่อ่านอย่างเดียว (sqlite) แก้ไขรายข้อไม่ได้ ต้องสร้างฐานข้อมูลใหม่แล้ว reload"""
+    if current_snapshot().read_only:
+        raise HTTPException(
+            status_code=409,
+            detail=f"backend {current_snapshot().name} อ่านอย่างเดียว: แก้ไขไฟล์ข้อมูลแล้วสร้างฐานข้อมูลใหม่ด้วย python sqlite_backend.py"
+        )
+
+@app.post("/admin/reload")
+async def admin_reload(wait: bool = False, x_admin_token: Optional[str] = Header(None)):
+    """
+    โหลดข้อมูลกฎหมายใหม่จากไฟล์และสลับดัชนีโดยไม่หยุด server (ทำงานเบื้องหลัง ตอบ 202 ทันที)
+    wait=1 รอให้ reload เสร็จแล้วคืนผล ถ้าล้มเหลวจะใช้ข้อมูลเดิมต่อและตอบ 500 พร้อมสาเหตุ
+    """
+    _check_admin(x_admin_token)
+    if not wait:
+        schedule_reload()
+        return JSONResponse(status_code=202, content={"status": "accepted", "reload": dict(RELOAD_STATUS)})
+    status = await asyncio.to_thread(reload_laws)
+    return JSONResponse(status_code=500 if status.get("state") == "failed" else 200, content={"reload": status})
+
+def _ambiguous_error(e) -> HTTPException:
+    """มาตราที่แก้ไขมีหลายข้อแต่ไม่ได้ระบุ ordinal"""
+    return HTTPException(
+        status_code=409,
+        detail=f"{e} ระบุ ordinal (0-{e.count - 1}) ตามลำดับใน GET /laws/{{category}}/{{code}} เพื่อเลือกข้อที่จะแก้ไข"
+    )
+
+@app.put("/admin/laws/{category}/{code}")
+async def admin_upsert_law(category: str, code: str, law: LawUpdate, ordinal: Optional[int] = Query(None, ge=0),
+                           x_admin_token: Optional[str] = Header(None)):
+    """
+    เพิ่มหรือแก้ไขมาตรา: แทนที่ข้อที่มีหมวดหมู่และรหัสมาตรานี้ด้วยข้อใหม่ (ข้อใหม่ต่อท้ายข้อมูล)
+    มาตราที่มีหลายข้อต้องระบุ ordinal (ไม่ระบุตอบ 409) ปรับดัชนีเฉพาะข้อที่เปลี่ยนและบันทึกลงไฟล์ข้อมูล
+    """
+    from snapshot import AmbiguousLaw
+
+    _check_admin(x_admin_token)
+    _check_writable()
+    record = {"title": law.title, "text": law.text, "code": code, "category": category}
+    try:
+        result = await asyncio.to_thread(update_laws, category, code, ordinal, record)
+    except AmbiguousLaw as e:
+        raise _ambiguous_error(e)
+    except Exception as e:
+        logger.error(f"แก้ไขข้อกฎหมายไม่สำเร็จ: {e}")
+        raise HTTPException(status_code=500, detail=f"แก้ไขข้อกฎหมายไม่สำเร็จ: {e}")
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"ไม่พบ{category} มาตรา {code} ลำดับที่ {ordinal}")
+    return {"status": "updated" if result["removed"] else "created", **result}
+
+@app.delete("/admin/laws/{category}/{code}")
+async def admin_delete_law(category: str, code: str, ordinal: Optional[int] = Query(None, ge=0),
+                           x_admin_token: Optional[str] = Header(None)):
+    """ลบข้อที่มีหมวดหมู่และรหัสมาตรานี้ (มาตราที่มีหลายข้อต้องระบุ ordinal) ปรับดัชนีเฉพาะข้อที่ลบและบันทึกลงไฟล์ข้อมูล"""
+    from snapshot import AmbiguousLaw
+
+    _check_admin(x_admin_token)
+    _check_writable()
+    try:
+        result = await asyncio.to_thread(update_laws, category, code, ordinal)
+    except AmbiguousLaw as e:
+        raise _ambiguous_error(e)
+    except Exception as e:
+        logger.error(f"ลบข้อกฎหมายไม่สำเร็จ: {e}")
+        raise HTTPException(status_code=500, detail=f"ลบข้อกฎหมายไม่สำเร็จ: {e}")
+    if result is None:
+        position = "" if ordinal is None else f" ลำดับที่ {ordinal}"
+        raise HTTPException(status_code=404, detail=f"ไม่พบ{category} มาตรา {code}{position}")
+    return {"status": "deleted", **result}
+
+@app.post("/admin/compact")
+async def admin_compact(x_admin_token: Optional[str] = Header(None)):
+    """compact ดัชนีทันที (ปกติทำเบื้องหลังทุก LAW_COMPACT_INTERVAL วินาที)"""
+    _check_admin(x_admin_token)
+    result = await asyncio.to_thread(compact_laws)
+    return {"status": "compacted" if result else "clean", **(result or {})}
+
+@app.get("/admin/profiles")
+async def admin_list_profiles(limit: int = Query(50, ge=1, le=1000), x_admin_token: Optional[str] = Header(None)):
+    """โปรไฟล์ล่าสุด (รหัส endpoint พารามิเตอร์ และเวลารวม)"""
+    _check_admin(x_admin_token)
+    profiles = await asyncio.to_thread(PROFILES.list, limit)
+    return {"profiles": profiles, "total": len(profiles)}
+
+@app.get("/admin/profiles/{profile_id}")
+async def admin_get_profile(profile_id: str, output: str = Query("json", alias="format", pattern="^(json|prof|text|folded)$"),
+                            x_admin_token: Optional[str] = Header(None)):
+    """
+    โปรไฟล์ของคำขอ profile_id: json (สรุป), prof (ไฟล์ pstats สำหรับ snakeviz/gprof2dot),
+    text (รายงานของ pstats) หรือ folded (stack สำหรับ flamegraph.pl/speedscope)
+    """
+    _check_admin(x_admin_token)
+    meta = await asyncio.to_thread(PROFILES.meta, profile_id)
+    if meta is None:
+        raise HTTPException(status_code=404, detail=f"ไม่พบโปรไฟล์ {profile_id}")
+    if output == "prof":
+        return FileResponse(PROFILES.path(profile_id), media_type="application/octet-stream",
+                            filename=f"{profile_id}.prof")
+    if output == "text":
+        return PlainTextResponse(await asyncio.to_thread(PROFILES.report, profile_id))
+    if output == "folded":
+        stats = await asyncio.to_thread(PROFILES.stats, profile_id)
+        return PlainTextResponse("\n".join(folded_stacks(stats)) + "\n")
+    return meta
+
+@app.get("/categories")
+async def get_categories(request: Request):
+    """ดูหมวดหมูกฎหมาย"""
+    return current_snapshot().categories_response.respond(request)
+
+# อักขระความกว้างศูนย์ที่มักติดมากับข้อความภาษาไทยที่คัดลอกมา
+ZERO_WIDTH_CHARS = dict.fromkeys(map(ord, '\u200b\u200c\u200d\u2060\ufeff'))
+
+def normalize_question(text: str) -> str:
+    """ปรับรูปคำถามให้เป็นมาตรฐาน (Unicode NFC, ลบอักขระความกว้างศูนย์, ตัดช่องว่างหัวท้าย, ยุบช่องว่างซ้ำ)"""
+    return ' '.join(unicodedata.normalize('NFC', text).translate(ZERO_WIDTH_CHARS).split())
+
+# เลขมาตราในคำถาม: มาตราเดียว ช่วง (276-280, 276 ถึง 280) หรือรายการ (80 หรือ 81, 80, 81 และ 82)
+SECTION_PATTERN = re.compile(r'มาตรา\s*(\d+(?:\s*(?:-|–|ถึง|หรือ|และ|,)\s*\d+)*)')
+SECTION_PART_PATTERN = re.compile(r'(\d+)(?:\s*(?:-|–|ถึง)\s*(\d+))?')
+# ช่วงมาตรากว้างสุดที่ขยายเป็นรายการ (กันช่วงที่ใหญ่เกินไป)
+MAX_SECTION_RANGE = 200
+
+def parse_section_numbers(spec: str) -> Tuple[str, ...]:
+    """แปลง "276-280", "80 หรือ 81" หรือ "80,81" เป็นรหัสมาตรา ("276", "277", ...) ตามลำดับ ไม่ซ้ำ"""
+    codes: Dict[str, None] = {}
+    for part in SECTION_PART_PATTERN.finditer(spec):
+        start = int(part.group(1))
+        end = int(part.group(2)) if part.group(2) else start
+        if start <= end <= start + MAX_SECTION_RANGE:
+            numbers = range(start, end + 1)
+        else:
+            numbers = (start, end)
+        codes.update(dict.fromkeys(str(number) for number in numbers))
+    return tuple(codes)
+
+def tokenize_question(text: str) -> Tuple[str, ...]:
+    """ตัดคำคำถาม (ที่ normalize แล้ว) โดยใช้ผลจาก cache ถ้าเคยตัดแล้ว"""
+    with stage("tokenize"):
+        tokens = None if _bypass_caches.get() else TOKEN_CACHE.get(text)
+        if tokens is None:
+            tokens = tuple(word_tokenize(text))
+            TOKEN_CACHE.put(text, tokens)
+    return tokens
+
+class QueryAnalysis:
+    """
+    ผลวิเคราะห์คำถามหนึ่งคำถาม: ตัดคำ แปลงตัวพิมพ์เล็ก กรองคำหยุด และแบ่งวลีเพียงครั้งเดียว
+    ใช้ร่วมกันใน search_laws, create_answer, analyze_case และ calculate_confidence
+    """
+
+    def __init__(self, question: str):
+        self.text = normalize_question(question)
+        self.lower = self.text.lower()
+        self.words = tokenize_question(self.text)
+
+        # เลขมาตราในคำถาม (ทุกครั้งที่กล่าวถึง "มาตรา ...")
+        self.section_numbers: Tuple[str, ...] = tuple(dict.fromkeys(
+            code for match in SECTION_PATTERN.finditer(self.lower) for code in parse_section_numbers(match.group(1))
+        ))
+
+        # กลุ่มคำพ้องความหมาย บริบทพิเศษ และหมวดกฎหมายที่คำถามกล่าวถึง (อ่านคำถามรอบเดียว)
+        self.labels = QUERY_MATCHER.match(self.lower)
+
+        # คำทั่วไป (ยกเว้นคำหยุด) ตัวพิมพ์เล็ก
+        self.search_words = [word.lower() for word in self.words
+                             if word.lower() not in STOP_WORDS and len(word.lower()) > 1]
+
+        # แบ่งคำถามเป็นวลี 2-3 คำ
+        self.phrases = []
+        for i in range(len(self.words) - 1):
+            phrase = ' '.join(self.words[i:i+2])
+            if len(phrase) > 3:
+                self.phrases.append(phrase.lower())
+
+def _candidate_docs(index: LawIndex, query_labels: int, word_postings: Dict[str, Tuple[Dict[int, int], int, int]],
+                    hint_docs: int) -> int:
+    """เลือกเฉพาะข้อกฎหมายที่อาจได้คะแนนจากเกณฑ์ใดเกณฑ์หนึ่งใน search_laws โดยใช้ดัชนี (ผลเป็น bitset)"""
+    candidates = hint_docs
+
+    candidates |= index.docs_with_labels(query_labels & GROUPS_MASK)
+
+    # ข้อที่มีคำหรือวลีในคำถาม
+    for _, word_docs, _ in word_postings.values():
+        candidates |= word_docs
+
+    if query_labels & LABEL_BITS['ctx:sexual_offence']:
+        candidates |= index.docs_with_codes(['277'])
+        candidates |= index.docs_with_labels(LABEL_BITS['law:ชำเรา'] | LABEL_BITS['law:ผู้เยาว์'])
+    if query_labels & LABEL_BITS['ctx:theft']:
+        candidates |= index.docs_with_labels(LABEL_BITS['law:ลักทรัพย์'])
+    if query_labels & LABEL_BITS['ctx:assault']:
+        candidates |= index.docs_with_labels(LABEL_BITS['law:ทำร้าย'])
+    if query_labels & LABEL_BITS['ctx:homicide']:
+        candidates |= index.docs_with_labels(LABEL_BITS['law:ฆ่า'])
+
+    return candidates
+
+def _section_docs(index: LawIndex, query: QueryAnalysis, category: Optional[str]) -> int:
+    """
+    ข้อกฎหมายที่รหัสตรงกับเลขมาตราในคำถาม เฉพาะในหมวดหมู่ category (ทุกหมวดถ้าไม่ระบุ)
+    ถ้าไม่มีมาตรานั้นในหมวดที่เลือก ผลเป็น 0 และตัวจัดอันดับใช้เกณฑ์อื่นแทน
+    """
+    section_docs = index.docs_with_codes(query.section_numbers)
+    if section_docs and category:
+        section_docs &= index.category_bits.get(category, 0)
+    return section_docs
+
+def _rank_legacy(query: QueryAnalysis, category: Optional[str]) -> List[Tuple[int, float]]:
+    """จัดอันดับแบบเดิม: รวมคะแนนจากเกณฑ์ต่าง ๆ (เลขมาตรา คำพ้องความหมาย ชื่อมาตรา วลี ฯลฯ)"""
+    scores = []
+    index = current_snapshot().index
+
+    # ส่วนที่ขึ้นกับคำถามอย่างเดียว คำนวณไว้แล้วใน QueryAnalysis
+    query_labels = query.labels
+    query_groups = query_labels & GROUPS_MASK
+    search_words = query.search_words
+    query_phrases = query.phrases
+
+    # ข้อกฎหมายในหมวดที่คำถามบ่งบอก
+    hint_docs = 0
+    for category_part, _ in CATEGORY_HINTS:
+        if query_labels & LABEL_BITS[f'hint:{category_part}']:
+            hint_docs |= index.docs_in_categories(category_part)
+
+    is_sexual_offence = query_labels & LABEL_BITS['ctx:sexual_offence']
+    is_theft = query_labels & LABEL_BITS['ctx:theft']
+    is_assault = query_labels & LABEL_BITS['ctx:assault']
+    is_homicide = query_labels & LABEL_BITS['ctx:homicide']
+
+    # คำถามที่ระบุเลขมาตราที่มีอยู่จริงในหมวดหมู่ที่เลือก ให้คะแนนเฉพาะมาตรานั้น ๆ จากดัชนีรหัสมาตรา
+    # ไม่เช่นนั้นให้คะแนนเฉพาะข้อกฎหมายที่ดัชนีเลือกมา แทนการวนทุกข้อ
+    section_docs = _section_docs(index, query, category)
+    sexual_offence_docs = index.docs_with_codes(['277']) if is_sexual_offence else 0
+    # จำนวนครั้งที่พบคำและวลีในคำถามในแต่ละข้อ และข้อที่ชื่อมาตรามีคำนั้น จาก postings ของดัชนี (ไม่ต้องอ่านข้อความ)
+    word_postings = index.word_postings_batch(search_words + query_phrases)
+    candidates = section_docs or _candidate_docs(index, query_labels, word_postings, hint_docs)
+
+    for doc_id in index.filter_category(candidates, category):
         # คำนวณคะแนนความเกี่ยวข้อง
         score = 0
-        law_text = f"{law.get('title', '')} {law.get('text', '')}".lower()
-        query_lower = query.lower()
+        text_labels = index.text_labels[doc_id]
         
         # 1. ค้นหาตามเลขมาตรา (ให้คะแนนสูงสุด)
-        section_match = re.search(r'มาตรา\s*(\d+)', query_lower)
-        if section_match:
-            section_number = section_match.group(1)
-            if section_number in law.get('code', '') or section_number in law.get('title', ''):
-                score += 1000  # คะแนนสูงสุดสำหรับการค้นหาตามเลขมาตรา
+        if section_docs >> doc_id & 1:
+            score += 1000  # คะแนนสูงสุดสำหรับการค้นหาตามเลขมาตรา
         
-        # 2. ค้นหาตามคำสำคัญและคำพ้องความหมาย
-        for keyword_group, synonyms in keyword_mappings.items():
-            if any(synonym in query_lower for synonym in synonyms):
-                if any(synonym in law_text for synonym in synonyms):
-                    score += 50  # คะแนนสูงสำหรับคำสำคัญ
-                    
-                    # ให้คะแนนเพิ่มถ้าคำสำคัญอยู่ในชื่อมาตรา
-                    if any(synonym in law.get('title', '').lower() for synonym in synonyms):
-                        score += 30
+        # 2. ค้นหาตามคำสำคัญและคำพ้องความหมาย (ใช้ป้ายกำกับที่คำนวณไว้ตอนโหลด)
+        score += 50 * bin(text_labels & query_groups).count('1')  # คะแนนสูงสำหรับคำสำคัญ
+        # ให้คะแนนเพิ่มถ้าคำสำคัญอยู่ในชื่อมาตรา
+        score += 30 * bin(index.title_labels[doc_id] & query_groups).count('1')
         
-        # 3. ค้นหาตามคำทั่วไป (ยกเว้นคำหยุด)
-        for word in query_words:
-            word_lower = word.lower()
-            if word_lower not in stop_words and len(word_lower) > 1:
-                if word_lower in law_text:
-                    score += 2
-                    
-                    # ให้คะแนนเพิ่มถ้าคำอยู่ในชื่อมาตรา
-                    if word_lower in law.get('title', '').lower():
-                        score += 5
+        for word_lower in search_words:
+            # 3. ค้นหาตามคำทั่วไป (ยกเว้นคำหยุด)
+            word_counts, _, title_docs = word_postings[word_lower]
+            word_count = word_counts.get(doc_id, 0)
+            if word_count > 0:
+                score += 2
+                
+                # ให้คะแนนเพิ่มถ้าคำอยู่ในชื่อมาตรา
+                if title_docs >> doc_id & 1:
+                    score += 5
+                
+                # 7. ค้นหาตามความถี่ของคำ
+                score += min(word_count, 10)  # จำกัดคะแนนสูงสุดที่ 10
+                
+                # 8. ค้นหาตามความยาวของคำที่ตรงกัน
+                if len(word_lower) > 2:
+                    score += len(word_lower)  # ยิ่งคำยาวยิ่งให้คะแนนสูง
         
         # 4. ค้นหาตามวลีหรือประโยคที่เกี่ยวข้อง
-        # แบ่งคำถามเป็นวลี 2-3 คำ
-        query_phrases = []
-        for i in range(len(query_words) - 1):
-            phrase = ' '.join(query_words[i:i+2])
-            if len(phrase) > 3:
-                query_phrases.append(phrase)
-        
         for phrase in query_phrases:
-            if phrase.lower() in law_text:
+            if word_postings[phrase][1] >> doc_id & 1:
                 score += 10
         
         # 5. ค้นหาตามหมวดกฎหมายที่เกี่ยวข้อง
-        law_category = law.get('category', '').lower()
-        if 'อาญา' in law_category and any(word in query_lower for word in ['ผิด', 'โทษ', 'อาญา', 'จำคุก', 'ปรับ', 'ประหาร']):
-            score += 15
-        elif 'แพ่ง' in law_category and any(word in query_lower for word in ['สัญญา', 'หนี้', 'ละเมิด', 'มรดก', 'ครอบครัว']):
-            score += 15
-        elif 'รัฐธรรมนูญ' in law_category and any(word in query_lower for word in ['สิทธิ', 'เสรีภาพ', 'รัฐสภา', 'รัฐบาล']):
+        if hint_docs >> doc_id & 1:
             score += 15
         
         # 6. ค้นหาตามบริบทพิเศษ
         # กรณีชำเราผู้เยาว์
-        if any(word in query_lower for word in ['ท้อง', 'ทำท้อง', 'ชำเรา', 'ข่มขืน', 'เด็ก', 'ผู้เยาว์']):
-            if '277' in law.get('title', '') or '277' in law.get('code', ''):
+        if is_sexual_offence:
+            if sexual_offence_docs >> doc_id & 1:
                 score += 200
-            elif 'ชำเรา' in law_text:
+            elif text_labels & LABEL_BITS['law:ชำเรา']:
                 score += 150
-            elif 'ผู้เยาว์' in law_text:
+            elif text_labels & LABEL_BITS['law:ผู้เยาว์']:
                 score += 100
         
         # กรณีลักทรัพย์
-        if any(word in query_lower for word in ['ลัก', 'ขโมย', 'ทรัพย์']):
-            if 'ลักทรัพย์' in law_text or 'ขโมย' in law_text:
-                score += 100
+        if is_theft and text_labels & LABEL_BITS['law:ลักทรัพย์']:
+            score += 100
         
         # กรณีทำร้ายร่างกาย
-        if any(word in query_lower for word in ['ทำร้าย', 'ตบ', 'ตี', 'ต่อย']):
-            if 'ทำร้าย' in law_text:
-                score += 100
+        if is_assault and text_labels & LABEL_BITS['law:ทำร้าย']:
+            score += 100
         
         # กรณีฆ่า
-        if any(word in query_lower for word in ['ฆ่า', 'ฆาตกรรม']):
-            if 'ฆ่า' in law_text:
-                score += 100
-        
-        # 7. ค้นหาตามความถี่ของคำ
-        for word in query_words:
-            word_lower = word.lower()
-            if word_lower not in stop_words and len(word_lower) > 1:
-                word_count = law_text.count(word_lower)
-                if word_count > 0:
-                    score += min(word_count, 10)  # จำกัดคะแนนสูงสุดที่ 10
-        
-        # 8. ค้นหาตามความยาวของคำที่ตรงกัน
-        for word in query_words:
-            word_lower = word.lower()
-            if word_lower not in stop_words and len(word_lower) > 2:
-                if word_lower in law_text:
-                    score += len(word_lower)  # ยิ่งคำยาวยิ่งให้คะแนนสูง
+        if is_homicide and text_labels & LABEL_BITS['law:ฆ่า']:
+            score += 100
         
         if score > 0:
-            results.append({
-                **law,
-                "relevance_score": score
-            })
+            scores.append((doc_id, score))
     
-    # เรียงตามคะแนนความเกี่ยวข้อง
-    results.sort(key=lambda x: x["relevance_score"], reverse=True)
-    return results[:10]  # เพิ่มผลลัพธ์เป็น 10 อันดับแรก
+    return scores
+
+def _rank_bm25(query: QueryAnalysis, category: Optional[str]) -> List[Tuple[int, float]]:
+    """จัดอันดับแบบ BM25F (title/text/category) จากสถิติที่คำนวณไว้ในดัชนี"""
+    index = current_snapshot().index
+    scores = index.bm25_scores(query.search_words)
+    allowed = index.category_bits.get(category, 0) if category else index.all_bits
+    # คำถามที่ระบุเลขมาตราที่มีอยู่จริงในหมวดหมู่ที่เลือก คืนเฉพาะมาตรานั้น ๆ เรียงตามคะแนน BM25F
+    section_docs = _section_docs(index, query, category)
+    if section_docs:
+        return [(doc_id, round(1000 + scores.get(doc_id, 0.0), 4)) for doc_id in iter_bits(section_docs)]
+    return [(doc_id, round(score, 4)) for doc_id, score in scores.items() if allowed >> doc_id & 1]
+
+# ตัวจัดอันดับที่เลือกใช้ได้ ("legacy" คือคะแนนแบบเดิม)
+RANKERS: Dict[str, Callable[[QueryAnalysis, Optional[str]], List[Tuple[int, float]]]] = {
+    "legacy": _rank_legacy,
+    "bm25": _rank_bm25,
+}
+
+def _rank_key(item: Tuple[int, float]) -> Tuple[float, int]:
+    """เรียงตามคะแนนมากไปน้อย คะแนนเท่ากันเรียงตามลำดับในฐานข้อมูล"""
+    return -item[1], item[0]
+
+def _ranking_key(snapshot, query: QueryAnalysis, ranker: str,
+                 category: Optional[str]) -> Tuple[int, str, str, Optional[str]]:
+    """
+    key ของคะแนนใน RANKING_CACHE: คำถามทั่วไปใช้ชุดเดียวทุกหมวดหมู่ (หมวดหมู่เป็น None)
+    คำถามที่ระบุเลขมาตราแยกตามหมวดหมู่ เพราะถ้าหมวดที่เลือกไม่มีมาตรานั้น ตัวจัดอันดับใช้เกณฑ์อื่นแทน
+    """
+    return snapshot.generation, query.text, ranker, (category or None) if query.section_numbers else None
+
+def rank_laws(query: Union[str, QueryAnalysis], category: Optional[str] = None,
+              ranker: Optional[str] = None) -> List[Tuple[int, float]]:
+    """
+    คะแนนของทุกข้อกฎหมายที่เกี่ยวข้องเป็น [(เลขเอกสาร, คะแนน), ...] (ยังไม่เรียง)
+    เก็บไว้ใน cache เพื่อให้การขอผลหน้าถัดไปไม่ต้องคำนวณคะแนนใหม่
+
+    หมวดหมู่ใช้กรองผลเท่านั้น ไม่มีผลต่อคะแนน จึงเก็บคะแนนของทุกหมวดหมู่ไว้ชุดเดียว
+    แล้วกรองตามหมวดหมู่ภายหลัง (ใช้ชุดเดียวกันนับ facet ได้ด้วย)
+    ยกเว้นคำถามที่ระบุเลขมาตรา ซึ่งผลขึ้นกับว่ามีมาตรานั้นในหมวดที่เลือกหรือไม่ (ดู _ranking_key)
+    """
+    ranker = ranker or DEFAULT_RANKER
+    rank = RANKERS.get(ranker)
+    if rank is None:
+        raise ValueError(f"ไม่รู้จักตัวจัดอันดับ: {ranker}")
+
+    if not isinstance(query, QueryAnalysis):
+        query = QueryAnalysis(query)
+    snapshot = current_snapshot()
+    key = _ranking_key(snapshot, query, ranker, category)
+    scores = None if _bypass_caches.get() else RANKING_CACHE.get(key)
+    if scores is None:
+        with stage("score"):
+            scores = rank(query, key[3])
+        RANKING_CACHE.put(key, scores)
+    if category:
+        allowed = snapshot.index.category_bits.get(category, 0)
+        scores = [(doc_id, score) for doc_id, score in scores if allowed >> doc_id & 1]
+    return scores
+
+def query_facets(query: Union[str, QueryAnalysis], ranker: Optional[str] = None) -> Dict[str, int]:
+    """จำนวนข้อกฎหมายที่ตรงกับคำถามแยกตามหมวดหมู่ (จากคะแนนใน cache ของ rank_laws)"""
+    scores = rank_laws(query, None, ranker)
+    with stage("facets"):
+        return current_snapshot().index.facet_counts(doc_id for doc_id, _ in scores)
+
+def top_laws(scores: List[Tuple[int, float]], limit: int = 10, offset: int = 0) -> List[dict]:
+    """เลือกผลอันดับ offset ถึง offset + limit ด้วย heap แล้วสร้าง dict เฉพาะผลที่ต้องส่งกลับ"""
+    with stage("select"):
+        top = heapq.nsmallest(offset + limit, scores, key=_rank_key)[offset:]
+        store = current_snapshot().store
+        return [{**store[doc_id], "relevance_score": score} for doc_id, score in top]
+
+def search_laws(query: Union[str, QueryAnalysis], category: Optional[str] = None, ranker: Optional[str] = None,
+                limit: int = 10, offset: int = 0) -> List[dict]:
+    """ค้นหาข้อกฎหมายที่เกี่ยวข้อง - ปรับปรุงให้แม่นยำและครอบคลุมมากขึ้น"""
+    return top_laws(rank_laws(query, category, ranker), limit, offset)
 
-def analyze_case(question: str, main_law: dict) -> tuple[str, str, str]:
+def search_laws_batch(queries: List[str], category: Optional[str] = None, limit: int = 10) -> List[List[dict]]:
+    """
+    ค้นหาหลายคำถามพร้อมกันด้วยตัวจัดอันดับ bm25 ผลเท่ากับ search_laws(query, category, "bm25", limit) ทีละคำถาม
+    คำนวณคะแนนด้วยการคูณเมทริกซ์ sparse ครั้งเดียวต่อชุดและเลือก limit อันดับแรกด้วย argpartition
+    เหมาะกับการรันคำถามจำนวนมาก เช่น ประเมินผลจาก log หรืออุ่น cache
+    คำถามที่ระบุเลขมาตรา และ backend ที่ไม่มีเมทริกซ์ (sqlite) ค้นหาทีละคำถาม
+    """
+    snapshot = current_snapshot()
+    analyses = [QueryAnalysis(query) for query in queries]
+    results: List[Optional[List[dict]]] = [None] * len(analyses)
+    batch = [position for position, query in enumerate(analyses)
+             if snapshot.matrix is not None and not _section_docs(snapshot.index, query, category)]
+    if batch:
+        allowed = snapshot.index.category_bits.get(category, 0) if category else snapshot.index.all_bits
+        with stage("score_batch"):
+            top = snapshot.matrix.top_k([analyses[position].search_words for position in batch], limit,
+                                        bits_mask(allowed, len(snapshot.index)))
+        with stage("select"):
+            for position, scores in zip(batch, top):
+                results[position] = [{**snapshot.store[doc_id], "relevance_score": score} for doc_id, score in scores]
+    return [result if result is not None else search_laws(query, category, "bm25", limit)
+            for query, result in zip(analyses, results)]
+
+def analyze_case(query: QueryAnalysis, main_law: dict) -> tuple[str, str, str]:
     """
     วิเคราะห์ข้อเท็จจริงและให้คำแนะนำเชิงปฏิบัติแบบ rule-based ครอบคลุมทุกหมวดกฎหมาย
     ปรับปรุงให้ฉลาดขึ้นสำหรับกรณี 'ทำผู้หญิงท้อง' โดยแยกแยะอายุ ความยินยอม ข่มขืน และแสดงข้อกฎหมายที่เกี่ยวข้องเสมอ
     """
-    q = question.lower()
+    q = query.lower
     verdict = ""
     analysis = []
     advice = []
@@ -404,12 +1581,15 @@ def analyze_case(question: str, main_law: dict) -> tuple[str, str, str]:
 
     return verdict, '\n'.join(analysis), '\n'.join(advice)
 
-def create_answer(results: List[dict], question: str) -> str:
-    """สร้างคำตอบจากผลการค้นหา พร้อมวิเคราะห์และคำแนะนำ (template มาตรฐาน)"""
+def create_answer(results: List[dict], query: QueryAnalysis, full: bool = False) -> str:
+    """
+    สร้างคำตอบจากผลการค้นหา พร้อมวิเคราะห์และคำแนะนำ (template มาตรฐาน)
+    เนื้อหาข้อกฎหมายในคำตอบเป็น snippet รอบคำค้น ยกเว้นเมื่อขอ full
+    """
     if not results:
         return "ไม่พบข้อมูลที่เกี่ยวข้อง"
 
-    q = question.lower()
+    q = query.lower
     main_law = results[0]
     # เลือก main_law ให้ตรงกับคำถามมากที่สุด
     if any(word in q for word in ['พราก']):
@@ -434,9 +1614,12 @@ def create_answer(results: List[dict], question: str) -> str:
                 break
 
     # วิเคราะห์ข้อเท็จจริงและคำแนะนำ
-    verdict, analysis, advice = analyze_case(question, main_law)
+    with stage("analyze_case"):
+        verdict, analysis, advice = analyze_case(query, main_law)
 
     law_text = main_law.get('text', '')
+    if not full:
+        law_text = make_snippet(law_text, query.search_words, ANSWER_TEXT_LENGTH)["snippet"]
 
     answer = f"""
 ## 🎯 **คำตัดสิน**
@@ -460,18 +1643,20 @@ def create_answer(results: List[dict], question: str) -> str:
         answer += "\n## 📚 **ข้อมูลเพิ่มเติม**\n"
         for i, law in enumerate(results[1:3], 1):
             clean_text = law.get('text', '')
+            if not full:
+                clean_text = make_snippet(clean_text, query.search_words, SNIPPET_LENGTH)["snippet"]
             answer += f"**{i}. {law.get('title', 'ไม่ระบุชื่อกฎหมาย')}**\n{clean_text}\n\n"
 
     return answer.strip()
 
-def calculate_confidence(results: List[dict], question: str) -> float:
+def calculate_confidence(results: List[dict], query: QueryAnalysis) -> float:
     """คำนวณความเชื่อมั่นของคำตอบ"""
     if not results:
         return 0.0
     
     # คำนวณจากคะแนนความเกี่ยวข้อง
     max_score = max(result["relevance_score"] for result in results)
-    total_words = len(pythainlp.word_tokenize(question, keep_whitespace=False))
+    total_words = len(query.words)
     
     if total_words == 0:
         return 0.0
@@ -479,6 +1664,123 @@ def calculate_confidence(results: List[dict], question: str) -> float:
     confidence = min(max_score / total_words, 1.0)
     return round(confidence, 2)
 
+def answer_question(question: Union[str, QueryAnalysis], category: Optional[str] = None,
+                    ranker: Optional[str] = None, full: bool = False) -> dict:
+    """ค้นหาและสร้างคำตอบของ /ask (ยังไม่มี timestamp) รันใน SEARCH_EXECUTOR ได้ทุกโหมด"""
+    # วิเคราะห์คำถามครั้งเดียว ใช้ร่วมกันทุกขั้นตอน
+    query = question if isinstance(question, QueryAnalysis) else QueryAnalysis(question)
+    
+    # ค้นหาข้อกฎหมายที่เกี่ยวข้อง
+    results = search_laws(query, category, ranker)
+    
+    if results:
+        # สร้างคำตอบ
+        with stage("create_answer"):
+            answer = create_answer(results, query, full)
+        confidence = calculate_confidence(results, query)
+        if not full:
+            with stage("snippets"):
+                results = [law_with_snippet(law, query.search_words, SNIPPET_LENGTH) for law in results]
+    else:
+        answer = "ขออภัย ไม่พบข้อมูลกฎหมายที่เกี่ยวข้องกับคำถามนี้ กรุณาลองใช้คำอื่นหรือปรึกษาทนายความ"
+        confidence = 0.0
+        results = []
+    
+    disclaimer = "ข้อมูลนี้เป็นเพียงข้อมูลเบื้องต้น ไม่ใช่คำปรึกษาทางกฎหมายโดยตรง"
+    
+    return {
+        "answer": answer,
+        "related_laws": results,
+        "confidence": confidence,
+        "disclaimer": disclaimer,
+        "facets": query_facets(query, ranker)
+    }
+
+def search_page(q: Union[str, QueryAnalysis], category: Optional[str] = None, ranker: Optional[str] = None,
+                limit: int = 10, offset: int = 0, full: bool = False, snippet_length: int = SNIPPET_LENGTH) -> dict:
+    """ผลการค้นหาหนึ่งหน้าของ /search รันใน SEARCH_EXECUTOR ได้ทุกโหมด"""
+    query = q if isinstance(q, QueryAnalysis) else QueryAnalysis(q)
+    scores = rank_laws(query, category, ranker)
+    results = top_laws(scores, limit, offset)
+    if not full:
+        with stage("snippets"):
+            results = [law_with_snippet(law, query.search_words, snippet_length) for law in results]
+    return {
+        "query": q if isinstance(q, str) else query.text,
+        "results": results,
+        "total": len(results),
+        "total_matches": len(scores),
+        "offset": offset,
+        "limit": limit,
+        "facets": query_facets(query, ranker)
+    }
+
+def warm_rankings(queries: List[QueryAnalysis], ranker: Optional[str] = None):
+    """
+    คำนวณคะแนนของหลายคำถามพร้อมกันแล้วเก็บใน RANKING_CACHE ให้ rank_laws ใช้ต่อ
+    ตัวจัดอันดับ bm25 ใช้การคูณเมทริกซ์ sparse ครั้งเดียวต่อชุด (backend ที่ไม่มีเมทริกซ์คำนวณทีละคำถามตามปกติ)
+    ตัวจัดอันดับ legacy สร้าง postings ของคำและวลีของทุกคำถามในรอบเดียว (อ่านข้อความของแต่ละข้อครั้งเดียวต่อชุด)
+    แล้วจัดอันดับแต่ละคำถามจาก bitset และ postings นั้น
+    """
+    ranker = ranker or DEFAULT_RANKER
+    snapshot = current_snapshot()
+    if ranker not in RANKERS or (ranker == "bm25" and snapshot.matrix is None):
+        return
+    # คำถามที่ระบุเลขมาตราใช้ดัชนีรหัสมาตราอยู่แล้ว และผลขึ้นกับหมวดหมู่ที่เลือก จึงจัดอันดับตอนค้นตามปกติ
+    pending = [query for query in queries
+               if not query.section_numbers and RANKING_CACHE.get(_ranking_key(snapshot, query, ranker, None)) is None]
+    if not pending:
+        return
+    with stage("score_batch"):
+        if ranker == "bm25":
+            batch_scores = [[(doc_id, round(score, 4)) for doc_id, score in scores]
+                            for scores in snapshot.matrix.nonzero_scores([query.search_words for query in pending])]
+        else:
+            snapshot.index.word_postings_batch(word for query in pending for word in query.search_words + query.phrases)
+            batch_scores = [_rank_legacy(query, None) for query in pending]
+    for query, scores in zip(pending, batch_scores):
+        RANKING_CACHE.put(_ranking_key(snapshot, query, ranker, None), scores)
+
+def search_batch(items: List[Tuple[str, Optional[str]]], ranker: Optional[str] = None, limit: int = 10,
+                 full: bool = False) -> List[dict]:
+    """
+    ผลการค้นหาของหลายคำค้น (/search/batch) ตามลำดับที่ส่งมา คำค้นที่ซ้ำกันคำนวณครั้งเดียว
+    คำค้นที่ผิดพลาดได้ {"error": ...} แทนผล โดยไม่กระทบคำค้นอื่น
+    """
+    keys = [(normalize_question(q), category or None) for q, category in items]
+    queries = {text: QueryAnalysis(text) for text, _ in keys if text}
+    warm_rankings(list(queries.values()), ranker)
+    
+    results: Dict[Tuple[str, Optional[str]], dict] = {}
+    for key in dict.fromkeys(keys):
+        text, category = key
+        if not text:
+            results[key] = {"error": "กรุณากรอกคำค้นหา"}
+            continue
+        try:
+            results[key] = search_page(queries[text], category, ranker, limit, full=full)
+        except Exception as e:
+            logger.error(f"เกิดข้อผิดพลาดในการค้นหา: {e}")
+            results[key] = {"error": "เกิดข้อผิดพลาดในการค้นหา"}
+    return [results[key] for key in keys]
+
+def answer_batch(items: List[Tuple[str, Optional[str]]], ranker: Optional[str] = None,
+                 full: bool = False) -> List[dict]:
+    """
+    คำตอบของหลายคำถามที่ไม่ซ้ำกัน (/ask/batch) ตามลำดับที่ส่งมา คำถามที่ผิดพลาดได้ {"error": ...}
+    วิเคราะห์แต่ละคำถาม (ที่ normalize แล้ว) ครั้งเดียว ใช้ร่วมกันทั้งตอนจัดอันดับล่วงหน้าและตอนสร้างคำตอบ
+    """
+    queries = {question: QueryAnalysis(question) for question, _ in items}
+    warm_rankings(list(queries.values()), ranker)
+    responses = []
+    for question, category in items:
+        try:
+            responses.append(answer_question(queries[question], category, ranker, full))
+        except Exception as e:
+            logger.error(f"เกิดข้อผิดพลาด: {e}")
+            responses.append({"error": "เกิดข้อผิดพลาดภายในระบบ"})
+    return responses
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     """จัดการข้อผิดพลาดทั่วไป"""
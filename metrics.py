@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Thai AI Lawyer - Metrics
+ตัววัดแบบ Prometheus (counter, gauge, histogram) ในหน่วยความจำของแต่ละ process
+แสดงผลเป็น text format ของ Prometheus และรวมค่าจากหลาย process (worker ของ server.py
+และ process pool ของการค้นหา) ผ่านไฟล์ในไดเรกทอรีที่ใช้ร่วมกัน
+"""
+
+import bisect
+import glob
+import json
+import logging
+import math
+import multiprocessing.util
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("thai_ai_lawyer.metrics")
+
+# ขอบบนของช่วงเวลา (วินาที) ที่ใช้เป็นค่าเริ่มต้นของ histogram
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# ขอบบนของขนาด response (byte)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+# ไฟล์ค่าตัววัดของแต่ละ process ในไดเรกทอรีที่ใช้ร่วมกัน
+FILE_PREFIX = "metrics-"
+
+Labels = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + "}"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class Metric:
+    """ตัววัดหนึ่งชื่อ แยกค่าตามชุดของ label (ลำดับเดียวกับ labelnames)"""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Sequence[str]) -> Labels:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} ต้องมี label {self.labelnames} แต่ได้ {tuple(labels)}")
+        return tuple(str(label) for label in labels)
+
+    def reset(self):
+        """ล้างค่าทั้งหมด (ใช้ใน process ลูกหลัง fork ซึ่งได้ค่าของ process แม่ติดมาด้วย)"""
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def samples(self) -> Dict[Labels, object]:
+        """สำเนาค่าปัจจุบันของทุกชุด label"""
+        with self._lock:
+            return {labels: self._copy(value) for labels, value in self._values.items()}
+
+    @staticmethod
+    def _copy(value):
+        return value
+
+    def merge(self, total: Dict[Labels, object], samples: Dict[Labels, object]):
+        """รวม samples ของอีก process เข้ากับ total"""
+        for labels, value in samples.items():
+            total[labels] = total.get(labels, 0) + value
+
+    def render(self, samples: Dict[Labels, object]) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in sorted(samples.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    """ค่าสะสมที่เพิ่มขึ้นอย่างเดียว รวมข้าม process ด้วยการบวก (รวม process ที่หยุดไปแล้ว)"""
+
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_total(self, value: float, *labels: str):
+        """ตั้งค่าสะสมจากตัวนับภายนอก (เช่น hit/miss ของ cache) เรียกจาก collector ก่อนอ่านค่า"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Gauge(Metric):
+    """
+    ค่า ณ ขณะนั้น รวมข้าม process ตาม mode เฉพาะ process ที่ยังทำงานอยู่
+    - "max": ค่ามากที่สุด (เช่น ความหน่วงของ event loop)
+    - "sum": ผลรวม (เช่น จำนวนคำขอที่กำลังทำงาน)
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), mode: str = "max"):
+        super().__init__(name, documentation, labelnames)
+        if mode not in ("max", "sum"):
+            raise ValueError(f"ไม่รู้จักวิธีรวมค่า gauge: {mode}")
+        self.mode = mode
+
+    def set(self, value: float, *labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+    def merge(self, total: Dict[Labels, object], samples: Dict[Labels, object]):
+        for labels, value in samples.items():
+            if labels not in total:
+                total[labels] = value
+            elif self.mode == "max":
+                total[labels] = max(total[labels], value)
+            else:
+                total[labels] += value
+
+
+class _Timer:
+    """context manager จับเวลาแล้วบันทึกลง histogram เมื่อออกจาก block"""
+
+    __slots__ = ("_histogram", "_labels", "_started")
+
+    def __init__(self, histogram: "Histogram", labels: Sequence[str]):
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._histogram.observe(time.perf_counter() - self._started, *self._labels)
+        return False
+
+
+class Histogram(Metric):
+    """
+    การกระจายของค่า (เช่น เวลาและขนาด) นับตามช่วง buckets พร้อมผลรวมและจำนวน
+    เก็บเป็น [จำนวนในแต่ละช่วง (ไม่สะสม) ..., ช่วงเกินขอบบนสุด, ผลรวม, จำนวน] รวมข้าม process ด้วยการบวก
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str):
+        key = self._key(labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(self.buckets) + 3)
+            counts[slot] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def time(self, *labels: str) -> _Timer:
+        """ใช้กับ with เพื่อบันทึกเวลาที่ block ใช้ (วินาที)"""
+        return _Timer(self, labels)
+
+    @staticmethod
+    def _copy(value):
+        return list(value)
+
+    def merge(self, total: Dict[Labels, object], samples: Dict[Labels, object]):
+        for labels, counts in samples.items():
+            if len(counts) != len(self.buckets) + 3:
+                continue
+            current = total.get(labels)
+            total[labels] = list(counts) if current is None else [a + b for a, b in zip(current, counts)]
+
+    def render(self, samples: Dict[Labels, object]) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        names = self.labelnames + ("le",)
+        for labels, counts in sorted(samples.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(names, labels + (_format_value(bound),))} {cumulative}")
+            suffix = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{suffix} {_format_value(counts[-2])}")
+            lines.append(f"{self.name}_count{suffix} {counts[-1]}")
+        return lines
+
+
+Samples = Dict[str, Dict[Labels, object]]
+
+
+class MetricsRegistry:
+    """
+    ชุดตัววัดของแอป
+    เมื่อตั้ง directory แล้ว แต่ละ process เขียนค่าของตัวเองเป็นไฟล์ metrics-<pid>.json ทุก interval วินาที
+    (และทุกครั้งที่มีผู้อ่าน /metrics) collect() อ่านทุกไฟล์มารวมกัน ผลจึงเหมือนกันไม่ว่าคำขอจะไปถึง worker ใดก็ตาม
+    process ลูกที่ fork มา (เช่น process pool ของการค้นหา) เริ่มนับใหม่และเขียนไฟล์ของตัวเอง
+    """
+
+    def __init__(self, prefix: str = ""):
+        self.prefix = prefix
+        self.metrics: Dict[str, Metric] = {}
+        self.directory: Optional[str] = None
+        self.interval = 5.0
+        self._collectors: List[Callable[[], None]] = []
+        self._flusher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._write_lock = threading.Lock()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _add(self, metric: Metric) -> Metric:
+        metric.name = self.prefix + metric.name
+        if metric.name in self.metrics:
+            raise ValueError(f"มีตัววัดชื่อ {metric.name} แล้ว")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (), mode: str = "max") -> Gauge:
+        return self._add(Gauge(name, documentation, labelnames, mode))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def _after_fork(self):
+        # ค่าที่ติดมาจาก process แม่จะถูกนับซ้ำเมื่อรวมไฟล์ จึงเริ่มนับใหม่
+        # collector ยังใช้ต่อใน process ลูก (แหล่งสถิติที่ collector อ่านต้องเริ่มนับใหม่ตอน fork เช่นกัน)
+        for metric in self.metrics.values():
+            metric.reset()
+        self._write_lock = threading.Lock()
+        self._flusher = None
+        self._stop = threading.Event()
+        if self.directory:
+            self._start_flusher()
+            # process ของ multiprocessing ไม่เรียก atexit ตอนจบ จึงเขียนค่าสุดท้ายผ่าน finalizer ของ multiprocessing
+            multiprocessing.util.Finalize(None, self.stop, exitpriority=0)
+
+    def configure(self, directory: Optional[str], interval: float = 5.0,
+                  collectors: Iterable[Callable[[], None]] = ()):
+        """
+        ตั้งไดเรกทอรีที่ใช้รวมค่าระหว่าง process (None คือใช้ค่าของ process นี้อย่างเดียว)
+        และ collectors: ฟังก์ชันที่เรียกก่อนอ่านค่าทุกครั้ง ใช้คัดลอกสถิติจากส่วนอื่น (เช่น cache) มาเป็นตัววัด
+        (process ลูกที่ fork ไปเรียกด้วย สถิติที่อ่านจึงต้องเริ่มนับใหม่ใน process ลูก)
+        """
+        self.stop()
+        self.directory = directory or None
+        self.interval = interval
+        self._collectors = list(collectors)
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            self._start_flusher()
+
+    def _start_flusher(self):
+        if self.interval <= 0:
+            return
+        self._flusher = threading.Thread(target=self._flush_periodically, args=(self._stop,),
+                                         name="metrics-flush", daemon=True)
+        self._flusher.start()
+
+    def _flush_periodically(self, stop: threading.Event):
+        while not stop.wait(self.interval):
+            try:
+                self.flush()
+            except OSError as e:
+                logger.warning("บันทึกไฟล์ตัววัดไม่สำเร็จ: %s", e)
+
+    def stop(self):
+        """หยุดการเขียนไฟล์เป็นระยะ แล้วเขียนค่าล่าสุดครั้งสุดท้าย"""
+        if self._flusher is not None:
+            self._stop.set()
+            self._flusher.join()
+            self._flusher = None
+            self._stop = threading.Event()
+        if self.directory:
+            try:
+                self.flush()
+            except OSError as e:
+                logger.warning("บันทึกไฟล์ตัววัดไม่สำเร็จ: %s", e)
+
+    def samples(self) -> Samples:
+        """ค่าปัจจุบันของ process นี้"""
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.warning("อ่านค่าตัววัดไม่สำเร็จ: %s", e)
+        return {name: metric.samples() for name, metric in self.metrics.items()}
+
+    def flush(self):
+        """เขียนค่าของ process นี้ลงไฟล์ในไดเรกทอรี (เขียนไฟล์ชั่วคราวแล้วแทนที่ ผู้อ่านจึงไม่เห็นไฟล์ครึ่ง ๆ)"""
+        if not self.directory:
+            return
+        payload = {
+            "pid": os.getpid(),
+            "metrics": {name: [[list(labels), value] for labels, value in samples.items()]
+                        for name, samples in self.samples().items() if samples},
+        }
+        path = os.path.join(self.directory, f"{FILE_PREFIX}{os.getpid()}.json")
+        with self._write_lock:
+            temporary_path = f"{path}.tmp"
+            with open(temporary_path, "w", encoding="utf-8") as f:
+                json.dump(payload, f, ensure_ascii=False)
+            os.replace(temporary_path, path)
+
+    def _read_files(self) -> Iterable[Tuple[int, Samples]]:
+        for path in glob.glob(os.path.join(self.directory, f"{FILE_PREFIX}*.json")):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    payload = json.load(f)
+                pid = int(payload["pid"])
+                samples = {name: {tuple(labels): value for labels, value in values}
+                           for name, values in payload["metrics"].items()}
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                logger.warning("อ่านไฟล์ตัววัด %s ไม่ได้: %s", path, e)
+                continue
+            yield pid, samples
+
+    def collect(self) -> Samples:
+        """
+        ค่ารวมของทุก process: counter และ histogram บวกกันทุกไฟล์ (รวม process ที่หยุดแล้ว ค่าสะสมจึงไม่ลดลง)
+        gauge ใช้เฉพาะ process ที่ยังทำงานอยู่
+        """
+        if not self.directory:
+            return self.samples()
+        self.flush()
+        total: Samples = {name: {} for name in self.metrics}
+        for pid, samples in self._read_files():
+            alive = pid == os.getpid() or _pid_alive(pid)
+            for name, values in samples.items():
+                metric = self.metrics.get(name)
+                if metric is None or (isinstance(metric, Gauge) and not alive):
+                    continue
+                metric.merge(total[name], values)
+        return total
+
+    def render(self, samples: Optional[Samples] = None) -> str:
+        """ค่าตัววัดใน text format ของ Prometheus (version 0.0.4)"""
+        samples = self.collect() if samples is None else samples
+        lines: List[str] = []
+        for name, metric in self.metrics.items():
+            lines.extend(metric.render(samples.get(name, {})))
+        return "\n".join(lines) + "\n"
+
+
+# ตัววัดของแอป ใช้ร่วมกันทุกโมดูล
+METRICS = MetricsRegistry("thai_ai_lawyer_")
+STAGE_SECONDS = METRICS.histogram(
+    "stage_duration_seconds", "เวลาที่ใช้ในแต่ละขั้นของการค้นหาและตอบคำถาม (วินาที)", ("stage",)
+)
+
+
+def stage(name: str) -> _Timer:
+    """จับเวลาขั้นตอน name ของการประมวลผล (ใช้กับ with) บันทึกใน STAGE_SECONDS"""
+    return STAGE_SECONDS.time(name)
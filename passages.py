@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Thai AI Lawyer - Passages
+แบ่งข้อกฎหมายที่ยาวมากเป็นช่วงข้อความ (passage) ขนาดใกล้เคียงกัน สำหรับทำดัชนีและจัดอันดับ
+"""
+
+import re
+from typing import List, Tuple
+
+# ความยาวสูงสุดของหนึ่ง passage (ตัวอักษร) ข้อกฎหมายส่วนใหญ่สั้นกว่านี้จึงเป็น passage เดียว
+PASSAGE_LENGTH = 2000
+
+# จุดตัดที่ดีที่สุดคือก่อนหัวข้อ "มาตรา n" / "ข้อ n" รองลงมาคือขึ้นบรรทัดใหม่ และช่องว่าง
+SECTION_BREAK = re.compile(r'\s(?=(?:มาตรา|ข้อ)\s*\d)')
+LINE_BREAK = re.compile(r'\n')
+SPACE_BREAK = re.compile(r'\s')
+
+
+def _last_break(pattern: "re.Pattern[str]", text: str, start: int, end: int) -> int:
+    last = -1
+    for match in pattern.finditer(text, start, end):
+        last = match.start()
+    return last
+
+
+def split_passages(text: str, max_length: int = PASSAGE_LENGTH) -> List[Tuple[int, int]]:
+    """
+    ช่วง (เริ่ม, จบ) ของแต่ละ passage ใน text ต่อกันครบทั้งข้อความ
+    ตัดที่ช่องว่างในครึ่งหลังของแต่ละช่วงเท่านั้น (ไม่ตัดกลางคำ) ถ้าไม่มีช่องว่างจึงตัดที่ max_length
+    """
+    if len(text) <= max_length:
+        return [(0, len(text))]
+
+    spans = []
+    start = 0
+    while len(text) - start > max_length:
+        low = start + max_length // 2
+        high = start + max_length
+        cut = -1
+        for pattern in (SECTION_BREAK, LINE_BREAK, SPACE_BREAK):
+            cut = _last_break(pattern, text, low, high)
+            if cut != -1:
+                break
+        if cut == -1:
+            cut = high
+        spans.append((start, cut))
+        start = cut
+    spans.append((start, len(text)))
+    return spans
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Thai AI Lawyer - Request Profiling
+รันงานค้นหาของคำขอเดียวภายใต้ cProfile แล้วเก็บผลเป็นไฟล์ตามรหัสคำขอ
+ไฟล์ .prof เปิดได้ด้วย pstats, snakeviz หรือ gprof2dot และแปลงเป็น flamegraph (folded stacks) ได้
+"""
+
+import cProfile
+import io
+import json
+import marshal
+import os
+import pstats
+import re
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# สถิติของ cProfile: (ไฟล์, บรรทัด, ชื่อฟังก์ชัน) -> (จำนวนครั้งไม่นับ recursion, จำนวนครั้ง, เวลาในตัวเอง, เวลารวม, ผู้เรียก)
+ProfileStats = Dict[Tuple[str, int, str], tuple]
+
+# รหัสคำขอที่ใช้เป็นชื่อไฟล์ได้ (รหัสจาก header X-Request-ID ที่ไม่ตรงรูปแบบจะสร้างใหม่)
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+# ความลึกสูงสุดของ stack ใน folded stacks (กันการวนของฟังก์ชันที่เรียกกันไปมา)
+MAX_STACK_DEPTH = 64
+
+# cProfile ทำงานได้ทีละตัวต่อ process ใน Python รุ่นใหม่ คำขอที่มาพร้อมกันจึงรันแบบไม่โปรไฟล์
+_profile_lock = threading.Lock()
+
+
+def request_id(candidate: Optional[str] = None) -> str:
+    """รหัสคำขอจาก candidate (เช่น header X-Request-ID) ถ้าใช้เป็นชื่อไฟล์ได้ ไม่เช่นนั้นสร้างใหม่"""
+    if candidate and REQUEST_ID_PATTERN.match(candidate):
+        return candidate
+    return uuid.uuid4().hex
+
+
+def run_profiled(func: Callable[..., Any], *args: Any) -> Tuple[Any, Optional[ProfileStats]]:
+    """
+    รัน func(*args) ภายใต้ cProfile คืน (ผลลัพธ์, สถิติ) เป็นฟังก์ชันระดับโมดูลจึงรันใน process pool ได้
+    สถิติเป็น None เมื่อมีการโปรไฟล์อื่นทำงานอยู่ใน process เดียวกัน (ผลลัพธ์ยังถูกต้องตามปกติ)
+    """
+    if not _profile_lock.acquire(blocking=False):
+        return func(*args), None
+    try:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            result = func(*args)
+        finally:
+            profiler.disable()
+        profiler.create_stats()
+        return result, profiler.stats
+    finally:
+        _profile_lock.release()
+
+
+def _function_name(function: Tuple[str, int, str]) -> str:
+    filename, line, name = function
+    if filename == "~" and line == 0:
+        # ฟังก์ชัน built-in เช่น <built-in method builtins.sorted>
+        return name
+    return f"{os.path.basename(filename)}:{line}({name})"
+
+
+def top_functions(stats: ProfileStats, limit: int = 10) -> List[Dict[str, Any]]:
+    """ฟังก์ชันที่ใช้เวลาในตัวเองมากที่สุด limit อันดับ (เวลาในตัวเองไม่รวมฟังก์ชันที่เรียกต่อ)"""
+    ranked = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)[:limit]
+    return [
+        {
+            "function": _function_name(function),
+            "calls": calls,
+            "self_seconds": round(self_time, 6),
+            "cumulative_seconds": round(cumulative_time, 6),
+        }
+        for function, (_, calls, self_time, cumulative_time, _) in ranked
+    ]
+
+
+def total_seconds(stats: ProfileStats) -> float:
+    """เวลารวมของงานที่โปรไฟล์ (ผลรวมเวลาในตัวเองของทุกฟังก์ชัน)"""
+    return sum(entry[2] for entry in stats.values())
+
+
+def folded_stacks(stats: ProfileStats) -> List[str]:
+    """
+    stack ในรูปแบบ folded ("ราก;ผู้เรียก;ฟังก์ชัน เวลาไมโครวินาที") สำหรับ flamegraph.pl หรือ speedscope
+    cProfile เก็บเฉพาะคู่ผู้เรียก-ผู้ถูกเรียก จึงแบ่งเวลาของฟังก์ชันให้แต่ละเส้นทางตามสัดส่วนเวลาที่ผู้เรียกแต่ละรายใช้
+    (ฟังก์ชันที่ถูกเรียกจากหลายที่จึงเป็นค่าประมาณ)
+    """
+    callees: Dict[tuple, List[Tuple[tuple, float]]] = {}
+    for function, (_, _, _, _, callers) in stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((function, edge[3]))
+    roots = [function for function, entry in stats.items() if not entry[4]]
+
+    totals: Dict[str, float] = {}
+
+    def visit(function: tuple, path: Tuple[str, ...], cumulative: float, seen: frozenset):
+        _, _, self_time, function_cumulative, _ = stats[function]
+        share = cumulative / function_cumulative if function_cumulative else 0.0
+        path = path + (_function_name(function),)
+        key = ";".join(path)
+        totals[key] = totals.get(key, 0.0) + self_time * share
+        if len(path) >= MAX_STACK_DEPTH:
+            return
+        for callee, edge_cumulative in callees.get(function, ()):
+            if callee not in seen and callee in stats:
+                visit(callee, path, edge_cumulative * share, seen | {callee})
+
+    for root in roots:
+        visit(root, (), stats[root][3], frozenset((root,)))
+    return [f"{stack} {round(seconds * 1e6)}" for stack, seconds in totals.items() if round(seconds * 1e6) > 0]
+
+
+def _write_file(path: str, data: bytes):
+    # เขียนไฟล์ชั่วคราวแล้วแทนที่ worker อื่นจึงไม่อ่านเจอไฟล์ที่เขียนไม่เสร็จ
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as f:
+        f.write(data)
+    os.replace(temporary_path, path)
+
+
+class ProfileStore:
+    """
+    ไฟล์โปรไฟล์ในไดเรกทอรี directory: <รหัสคำขอ>.prof (รูปแบบเดียวกับ cProfile.dump_stats)
+    และ <รหัสคำขอ>.json (endpoint, พารามิเตอร์ เวลา และฟังก์ชันที่ใช้เวลามากที่สุด)
+    เก็บไว้ไม่เกิน max_files โปรไฟล์ ไฟล์ที่เก่าที่สุดถูกลบก่อน ทุก worker ที่ใช้ไดเรกทอรีเดียวกันอ่านโปรไฟล์ของกันและกันได้
+    """
+
+    def __init__(self, directory: str, max_files: int = 200, top: int = 10):
+        self.directory = directory
+        self.max_files = max_files
+        self.top = top
+
+    def path(self, profile_id: str, extension: str = "prof") -> Optional[str]:
+        """path ของไฟล์โปรไฟล์ หรือ None ถ้ารหัสไม่ถูกต้องหรือไม่มีไฟล์"""
+        if not REQUEST_ID_PATTERN.match(profile_id):
+            return None
+        path = os.path.join(self.directory, f"{profile_id}.{extension}")
+        return path if os.path.exists(path) else None
+
+    def save(self, profile_id: str, stats: ProfileStats, meta: Dict[str, Any]) -> Dict[str, Any]:
+        """บันทึกโปรไฟล์แล้วคืนสรุป (รหัส เวลารวม และฟังก์ชันที่ใช้เวลามากที่สุด) สำหรับใส่ใน response"""
+        os.makedirs(self.directory, exist_ok=True)
+        summary = {
+            "id": profile_id,
+            "total_seconds": round(total_seconds(stats), 6),
+            "top_functions": top_functions(stats, self.top),
+        }
+        base = os.path.join(self.directory, profile_id)
+        # เขียน .prof ก่อน .json เพราะรายการโปรไฟล์อ่านจาก .json
+        _write_file(f"{base}.prof", marshal.dumps(stats))
+        meta = {**meta, **summary, "created": time.time()}
+        _write_file(f"{base}.json", json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+        self._prune()
+        return summary
+
+    def _prune(self):
+        entries = self._entries()
+        for entry in entries[self.max_files:]:
+            for extension in ("prof", "json"):
+                try:
+                    os.remove(os.path.join(self.directory, f"{entry['id']}.{extension}"))
+                except FileNotFoundError:
+                    pass
+
+    def _entries(self) -> List[Dict[str, Any]]:
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return entries
+        for name in names:
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), encoding="utf-8") as f:
+                    entries.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        entries.sort(key=lambda entry: entry.get("created", 0), reverse=True)
+        return entries
+
+    def list(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """โปรไฟล์ล่าสุด limit รายการ (ไม่รวมรายชื่อฟังก์ชัน)"""
+        return [{key: value for key, value in entry.items() if key != "top_functions"}
+                for entry in self._entries()[:limit]]
+
+    def meta(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        path = self.path(profile_id, "json")
+        if path is None:
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def stats(self, profile_id: str) -> Optional[ProfileStats]:
+        path = self.path(profile_id)
+        if path is None:
+            return None
+        with open(path, "rb") as f:
+            return marshal.load(f)
+
+    def report(self, profile_id: str, limit: int = 50) -> Optional[str]:
+        """รายงานแบบข้อความของ pstats เรียงตามเวลาในตัวเอง limit อันดับแรก"""
+        path = self.path(profile_id)
+        if path is None:
+            return None
+        stream = io.StringIO()
+        pstats.Stats(path, stream=stream).sort_stats("tottime").print_stats(limit)
+        return stream.getvalue()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Thai AI Lawyer - Responses
+แปลง JSON ด้วย orjson (ถ้ามี) และ response ที่แปลงไว้ล่วงหน้าพร้อม gzip/brotli และ ETag
+"""
+
+import gzip
+import hashlib
+import json
+import threading
+from typing import Any, Dict, Optional
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+
+from metrics import stage
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 6
+
+
+def dumps(content: Any) -> bytes:
+    """แปลงเป็น JSON (UTF-8) ด้วย orjson ถ้าติดตั้งไว้ ไม่เช่นนั้นใช้ json มาตรฐาน"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse ที่ใช้ dumps() ใช้เป็น response เริ่มต้นของทุก endpoint"""
+
+    def render(self, content: Any) -> bytes:
+        with stage("serialize"):
+            return dumps(content)
+
+
+def _accepted_encodings(request: Request) -> Dict[str, float]:
+    encodings: Dict[str, float] = {}
+    for part in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        encodings[name.strip().lower()] = quality
+    return encodings
+
+
+class PrecomputedResponse:
+    """
+    เนื้อหา JSON ที่แปลงเป็น bytes ครั้งเดียว แล้วใช้ตอบซ้ำได้ทุกคำขอ
+    บีบอัด gzip/brotli ครั้งแรกที่มีผู้ขอแล้วเก็บไว้ใช้ต่อ
+    ETag แบบ strong สร้างจากรุ่นข้อมูลกับ hash ของเนื้อหา (แต่ละ encoding ต่อท้ายชื่อ encoding)
+    และตอบ 304 เมื่อ If-None-Match ตรงกับ ETag
+    """
+
+    media_type = "application/json"
+
+    def __init__(self, content: Any, version: str, cache_control: str = "no-cache"):
+        with stage("serialize"):
+            self.body = dumps(content)
+        self.etag = f"{version}-{hashlib.sha256(self.body).hexdigest()[:16]}"
+        self.cache_control = cache_control
+        self._encoded: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.body)
+
+    def encoded(self, encoding: str) -> bytes:
+        """เนื้อหาที่บีบอัดด้วย encoding ("gzip" หรือ "br")"""
+        body = self._encoded.get(encoding)
+        if body is None:
+            with self._lock:
+                body = self._encoded.get(encoding)
+                if body is None:
+                    if encoding == "br":
+                        body = brotli.compress(self.body, quality=BROTLI_QUALITY)
+                    else:
+                        body = gzip.compress(self.body, GZIP_LEVEL, mtime=0)
+                    self._encoded[encoding] = body
+        return body
+
+    def _choose_encoding(self, request: Request) -> Optional[str]:
+        accepted = _accepted_encodings(request)
+        if brotli is not None and accepted.get("br", 0) > 0:
+            return "br"
+        if accepted.get("gzip", 0) > 0:
+            return "gzip"
+        return None
+
+    def _not_modified(self, request: Request) -> bool:
+        header = request.headers.get("if-none-match")
+        if not header:
+            return False
+        for tag in header.split(","):
+            tag = tag.strip()
+            if tag == "*":
+                return True
+            if tag.startswith("W/"):
+                tag = tag[2:]
+            # ยอมรับ ETag ของทุก encoding เพราะเป็นเนื้อหาเดียวกัน
+            if tag.strip('"').split("+")[0] == self.etag:
+                return True
+        return False
+
+    def respond(self, request: Request, headers: Optional[Dict[str, str]] = None) -> Response:
+        encoding = self._choose_encoding(request)
+        etag = self.etag if encoding is None else f"{self.etag}+{encoding}"
+        response_headers = {
+            "ETag": f'"{etag}"',
+            "Cache-Control": self.cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        if headers:
+            response_headers.update(headers)
+
+        if self._not_modified(request):
+            return Response(status_code=304, headers=response_headers)
+
+        if encoding is None:
+            return Response(self.body, media_type=self.media_type, headers=response_headers)
+        response_headers["Content-Encoding"] = encoding
+        return Response(self.encoded(encoding), media_type=self.media_type, headers=response_headers)
+
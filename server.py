@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Thai AI Lawyer - Production Server
+รัน FastAPI หลาย worker process ที่รับคำขอจาก socket เดียวกัน
+โหมด preload โหลดข้อมูลและสร้างดัชนีครั้งเดียวก่อน fork ให้ทุก worker ใช้ร่วมกันแบบ copy-on-write
+"""
+
+import argparse
+import glob
+import importlib
+import logging
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import time
+from typing import Any, Dict, Optional
+
+import uvicorn
+
+logger = logging.getLogger("thai_ai_lawyer.server")
+
+DEFAULT_APP = "main:app"
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8003
+# เวลาที่รอให้คำขอที่กำลังทำงานเสร็จก่อนปิด worker (วินาที)
+GRACEFUL_TIMEOUT = 30
+
+
+def load_app(app_path: str) -> Any:
+    """import แอปจากรูปแบบ "module:attribute" เช่น "main:app" """
+    module_name, _, attribute = app_path.partition(":")
+    return getattr(importlib.import_module(module_name), attribute or "app")
+
+
+def preload_app(app_path: str) -> Any:
+    """import แอปแล้วเรียก startup() ของโมดูล (ถ้ามี) เพื่อโหลดข้อมูลและดัชนีก่อน fork"""
+    app = load_app(app_path)
+    startup = getattr(importlib.import_module(app_path.partition(":")[0]), "startup", None)
+    if callable(startup):
+        startup()
+    return app
+
+
+def _prepare_metrics_dir() -> Optional[str]:
+    """
+    ไดเรกทอรีที่ทุก worker เขียนค่าตัววัด (/metrics รวมค่าจากทุกไฟล์) ลบไฟล์ของการรันครั้งก่อนออก
+    ถ้าไม่ได้ตั้ง METRICS_DIR จะสร้างไดเรกทอรีชั่วคราว คืน path นั้นเพื่อให้ลบทิ้งตอนปิด server
+    """
+    directory = os.getenv("METRICS_DIR")
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        for path in glob.glob(os.path.join(directory, "metrics-*.json")):
+            os.remove(path)
+        return None
+    directory = tempfile.mkdtemp(prefix="thai-ai-lawyer-metrics-")
+    os.environ["METRICS_DIR"] = directory
+    return directory
+
+
+def _bind_socket(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(app: Any, sock: socket.socket, graceful_timeout: int):
+    # uvicorn จัดการ SIGTERM/SIGINT เอง: หยุดรับคำขอใหม่และรอคำขอที่ค้างอยู่ให้เสร็จ
+    config = uvicorn.Config(app, timeout_graceful_shutdown=graceful_timeout)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _spawn_worker(app_path: str, app: Optional[Any], sock: socket.socket, graceful_timeout: int) -> int:
+    pid = os.fork()
+    if pid:
+        return pid
+    # process ลูก: คืน signal handler ให้ uvicorn ติดตั้งของตัวเอง
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    if hasattr(signal, "SIGHUP"):
+        # แอปติดตั้งตัวจัดการ SIGHUP (reload) เองตอนเริ่ม ก่อนหน้านั้นไม่ให้ SIGHUP ปิด worker
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    exit_code = 0
+    try:
+        _run_worker(app if app is not None else load_app(app_path), sock, graceful_timeout)
+    except BaseException:
+        logger.exception("worker %s หยุดทำงานผิดปกติ", os.getpid())
+        exit_code = 1
+    finally:
+        os._exit(exit_code)
+
+
+def _reload_workers(app_path: str, app: Optional[Any], children: Dict[int, float]):
+    for pid in children:
+        try:
+            os.kill(pid, signal.SIGHUP)
+        except ProcessLookupError:
+            pass
+    if app is not None:
+        reload_laws = getattr(importlib.import_module(app_path.partition(":")[0]), "reload_laws", None)
+        if callable(reload_laws):
+            logger.info("reload ข้อมูลใน process หลัก: %s", reload_laws().get("state"))
+
+
+def serve(app_path: str = DEFAULT_APP, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+          workers: Optional[int] = None, preload: bool = False, graceful_timeout: int = GRACEFUL_TIMEOUT):
+    """
+    รัน server แบบ prefork: process หลักเปิด socket แล้ว fork worker ตามจำนวนที่กำหนด
+    worker ที่หยุดผิดปกติจะถูกเริ่มใหม่ เมื่อได้รับ SIGINT/SIGTERM จะส่ง SIGTERM ให้ทุก worker
+    แล้วรอให้คำขอที่ค้างอยู่เสร็จ (ไม่เกิน graceful_timeout) ก่อนปิด
+    เมื่อได้รับ SIGHUP จะส่งต่อให้ทุก worker reload ข้อมูลกฎหมาย (โหมด preload จะ reload ใน process หลักด้วย
+    worker ที่เริ่มใหม่ภายหลังจึงได้ข้อมูลรุ่นใหม่)
+    ทุก worker เขียนค่าตัววัดลง METRICS_DIR (หรือไดเรกทอรีชั่วคราว) /metrics ของ worker ใดก็ได้จึงเป็นค่ารวม
+    """
+    workers = workers or os.cpu_count() or 1
+
+    if not hasattr(os, "fork"):
+        # ระบบที่ fork ไม่ได้ (เช่น Windows) ใช้ตัวจัดการหลาย worker ของ uvicorn แทน (ไม่มี preload)
+        uvicorn.run(app_path, host=host, port=port, workers=workers,
+                    timeout_graceful_shutdown=graceful_timeout)
+        return
+
+    # ต้องตั้งก่อน import แอป (โหมด preload) เพราะแอปอ่าน METRICS_DIR ตอน import
+    temporary_metrics_dir = _prepare_metrics_dir()
+
+    app = None
+    if preload:
+        started = time.perf_counter()
+        app = preload_app(app_path)
+        logger.info("โหลดแอปและดัชนีล่วงหน้าเสร็จใน %.2f วินาที", time.perf_counter() - started)
+
+    sock = _bind_socket(host, port)
+    logger.info("เริ่ม %d worker ที่ http://%s:%d", workers, host, port)
+
+    stopping = False
+    reload_requested = False
+
+    def request_stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    def request_reload(signum, frame):
+        nonlocal reload_requested
+        reload_requested = True
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, request_reload)
+
+    children: Dict[int, float] = {}
+    for _ in range(workers):
+        children[_spawn_worker(app_path, app, sock, graceful_timeout)] = time.monotonic()
+
+    while not stopping:
+        if reload_requested:
+            reload_requested = False
+            _reload_workers(app_path, app, children)
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if not pid:
+            time.sleep(0.2)
+            continue
+        started = children.pop(pid, None)
+        if started is None or stopping:
+            continue
+        logger.warning("worker %d หยุดทำงาน (status %d) กำลังเริ่มใหม่", pid, status)
+        # worker ที่ล้มทันทีหลังเริ่ม ไม่ต้องเริ่มใหม่ถี่เกินไป
+        if time.monotonic() - started < 1:
+            time.sleep(1)
+        children[_spawn_worker(app_path, app, sock, graceful_timeout)] = time.monotonic()
+
+    logger.info("กำลังปิด server รอคำขอที่ค้างอยู่ไม่เกิน %d วินาที", graceful_timeout)
+    for pid in children:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    deadline = time.monotonic() + graceful_timeout + 5
+    while children and time.monotonic() < deadline:
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid:
+            children.pop(pid, None)
+        else:
+            time.sleep(0.1)
+
+    for pid in children:
+        logger.warning("worker %d ไม่หยุดภายในเวลาที่กำหนด บังคับปิด", pid)
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    sock.close()
+    if temporary_metrics_dir:
+        shutil.rmtree(temporary_metrics_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Thai AI Lawyer production server")
+    parser.add_argument("--app", default=DEFAULT_APP, help="แอปในรูปแบบ module:attribute")
+    parser.add_argument("--host", default=os.getenv("HOST", DEFAULT_HOST))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", str(DEFAULT_PORT))))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "0")) or None,
+                        help="จำนวน worker process (ค่าเริ่มต้นคือจำนวน CPU)")
+    parser.add_argument("--preload", action="store_true",
+                        help="โหลดข้อมูลและสร้างดัชนีครั้งเดียวก่อน fork worker")
+    parser.add_argument("--graceful-timeout", type=int, default=GRACEFUL_TIMEOUT,
+                        help="เวลาที่รอคำขอที่ค้างอยู่ก่อนปิด worker (วินาที)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    serve(args.app, args.host, args.port, args.workers, args.preload, args.graceful_timeout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Thai AI Lawyer - Law Snapshot
+ข้อมูลกฎหมายหนึ่งรุ่นพร้อมดัชนีทั้งหมด (store, LawIndex, TermMatrix และ response ที่แปลงไว้ล่วงหน้า)
+และส่วนที่ทุก backend ใช้ร่วมกัน (LawBackend) snapshot ไม่ถูกแก้ไขหลังสร้างเสร็จ
+การ reload และการแก้ไขรายข้อจึงสร้าง snapshot ใหม่ให้ครบแล้วสลับทีเดียว
+"""
+
+import hashlib
+import itertools
+import json
+import logging
+import time
+from contextlib import nullcontext
+from datetime import datetime
+from functools import cached_property
+from typing import Any, Callable, ContextManager, Iterable, List, Optional, Sequence, Tuple
+
+from artifact import build_key, load_artifact
+from keyword_matcher import KeywordMatcher
+from law_index import LawIndex, iter_bits
+from law_store import RECORD_FIELDS, LawStore
+from responses import PrecomputedResponse
+from term_matrix import TermMatrix
+
+logger = logging.getLogger("thai_ai_lawyer.snapshot")
+
+PhaseTimer = Callable[[str], ContextManager[Any]]
+
+# เลขลำดับของ snapshot ในโปรเซส (ไม่ซ้ำกันแม้ข้อมูลรุ่นเดียวกัน เช่นก่อนและหลัง compact)
+_generations = itertools.count(1)
+
+
+def _no_phase(name: str) -> ContextManager[Any]:
+    return nullcontext()
+
+
+class LawBackend:
+    """
+    ข้อมูลกฎหมายหนึ่งรุ่นที่ search_laws และ endpoint ข้อมูลกฎหมายใช้ มีสองแบบ: LawSnapshot (ทุกอย่างอยู่ในหน่วยความจำ)
+    และ SQLiteBackend (ฐานข้อมูล SQLite FTS5 บนดิสก์ ดู sqlite_backend.py) ส่วนที่ main.py ใช้มีเท่านี้
+    - store: ข้อกฎหมายตามเลขเอกสาร (len, store[doc_id], store.record(doc_id, fields))
+    - index: ชุดเอกสารแบบ bitset และคะแนนที่ตัวจัดอันดับใช้ (เมธอดของ LawIndex ที่ main.py เรียก)
+    - matrix: TermMatrix สำหรับคำนวณคะแนน BM25F หลายคำถามพร้อมกัน หรือ None (คำนวณทีละคำถามแทน)
+    backend ไม่ถูกแก้ไขหลังสร้างเสร็จ และเลขเอกสาร (doc_id) ใช้ได้เฉพาะกับ backend เดียวกัน (generation)
+    """
+
+    # ชื่อ backend (ค่าของ LAW_BACKEND) และแก้ไขรายข้อด้วย update_snapshot ได้หรือไม่
+    name = "memory"
+    read_only = False
+
+    def __init__(self, version: str, store, index, matrix: Optional[TermMatrix], source: str,
+                 build_seconds: float = 0.0):
+        self.version = version
+        self.store = store
+        self.index = index
+        self.matrix = matrix
+        self.source = source
+        self.build_seconds = build_seconds
+        self.generation = next(_generations)
+        self.loaded_at = datetime.now().isoformat()
+
+    @cached_property
+    def laws_response(self) -> PrecomputedResponse:
+        """response ของ /laws (ทุกข้อ) แปลงเป็น JSON ครั้งเดียวต่อ backend"""
+        return PrecomputedResponse(
+            {"total": len(self), "offset": 0, "limit": None, "laws": self.records()}, self.version
+        )
+
+    @cached_property
+    def categories_response(self) -> PrecomputedResponse:
+        """response ของ /categories แปลงเป็น JSON ครั้งเดียวต่อ backend"""
+        summary = self.index.category_summary
+        return PrecomputedResponse({
+            "categories": [category["category"] for category in summary],
+            "total": len(summary),
+            "details": summary
+        }, self.version)
+
+    def __len__(self) -> int:
+        return len(self.store) - self.index.deleted_count
+
+    def doc_ids(self) -> Sequence[int]:
+        """เลขเอกสารของข้อที่ยังอยู่ตามลำดับ"""
+        if not self.index.deleted_count:
+            return range(len(self.store))
+        return list(iter_bits(self.index.all_bits))
+
+    def records(self) -> List[dict]:
+        """ข้อกฎหมายที่ยังอยู่ทั้งหมดตามลำดับ (รูปแบบเดียวกับไฟล์ข้อมูล)"""
+        return [self.store.record(doc_id) for doc_id in self.doc_ids()]
+
+    def validate(self):
+        """ตรวจว่าดัชนีสร้างครบและตรงกับข้อมูล ถ้าไม่ครบ raise ValueError (ไม่ใช้ backend นี้)"""
+        if not len(self):
+            raise ValueError("ไม่มีข้อกฎหมายในข้อมูล")
+
+    def info(self) -> dict:
+        """ข้อมูลสรุปของ backend สำหรับ /ready"""
+        return {
+            "backend": self.name,
+            "source": self.source,
+            "build_seconds": self.build_seconds,
+            "loaded_at": self.loaded_at
+        }
+
+
+class LawSnapshot(LawBackend):
+    """
+    backend ในหน่วยความจำ: ข้อมูลกฎหมายรุ่นเดียว (version คือ hash ของไฟล์ข้อมูล) พร้อมดัชนีที่สร้างจากข้อมูลนั้น
+    และ response ของ /laws กับ /categories ที่แปลงเป็น JSON ตั้งแต่ตอนสร้าง
+    store อาจมีข้อที่ลบแล้วค้างอยู่ (ดู LawIndex.updated) ข้อที่ยังอยู่คือ bit ใน index.all_bits
+    len(snapshot) คือจำนวนข้อที่ยังอยู่
+    """
+
+    def __init__(self, version: str, store: LawStore, index: LawIndex, matrix: TermMatrix,
+                 source: str, build_seconds: float = 0.0):
+        # ที่มาของดัชนี: "artifact" (ไฟล์ดัชนีสำเร็จรูป), "json", "update" (แก้ไขรายข้อ), "compact" หรือ "empty"
+        super().__init__(version, store, index, matrix, source, build_seconds)
+        # response ที่ไม่เปลี่ยนตามคำขอ แปลงเป็น JSON ครั้งเดียวตอนสร้าง snapshot
+        self.laws_response
+        self.categories_response
+
+    @classmethod
+    def empty(cls, matcher: Optional[KeywordMatcher] = None) -> "LawSnapshot":
+        """snapshot ที่ไม่มีข้อมูล ใช้เมื่ออ่านข้อมูลกฎหมายไม่ได้ตอนเริ่มระบบ"""
+        store = LawStore.from_records([])
+        index = LawIndex(store, matcher)
+        return cls("empty", store, index, TermMatrix(index), "empty")
+
+    def validate(self):
+        super().validate()
+        if len(self.index) != len(self.store) or self.matrix.num_docs != len(self.store):
+            raise ValueError("ดัชนีไม่ตรงกับจำนวนข้อกฎหมาย")
+        if len(self.index.doc_passages) != len(self.store) + 1 or not self.index.vocabulary:
+            raise ValueError("ดัชนีคำไม่สมบูรณ์")
+
+    def info(self) -> dict:
+        return {
+            **super().info(),
+            "vocabulary": len(self.index.vocabulary),
+            "passages": self.index.live_passages,
+            "deleted": self.index.deleted_count,
+            "store_bytes": self.store.nbytes
+        }
+
+
+def read_data(path: str) -> Tuple[bytes, str]:
+    """อ่านไฟล์ข้อมูลกฎหมาย คืน (เนื้อหา, รุ่นข้อมูล) โดยรุ่นคือ hash ของไฟล์"""
+    with open(path, "rb") as f:
+        raw_data = f.read()
+    return raw_data, data_version(raw_data)
+
+
+def data_version(raw_data: bytes) -> str:
+    """รุ่นของข้อมูล: hash ของเนื้อหาไฟล์ข้อมูล"""
+    return hashlib.sha256(raw_data).hexdigest()[:16]
+
+
+def serialize_records(records: List[dict]) -> bytes:
+    """แปลงข้อกฎหมายเป็น JSON ในรูปแบบของไฟล์ข้อมูล"""
+    return json.dumps(records, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def parse_records(raw_data: bytes) -> List[dict]:
+    """แปลง JSON เป็นรายการข้อกฎหมาย และตรวจว่าทุกข้อเป็น object ที่ทุกฟิลด์เป็นข้อความ"""
+    records = json.loads(raw_data.decode("utf-8"))
+    if not isinstance(records, list):
+        raise ValueError("ข้อมูลกฎหมายต้องเป็น list ของข้อกฎหมาย")
+    for position, record in enumerate(records):
+        if not isinstance(record, dict):
+            raise ValueError(f"ข้อกฎหมายลำดับที่ {position} ไม่ใช่ object")
+        for field in RECORD_FIELDS:
+            if not isinstance(record.get(field, ""), str):
+                raise ValueError(f"ฟิลด์ {field} ของข้อกฎหมายลำดับที่ {position} ไม่ใช่ข้อความ")
+    return records
+
+
+def build_snapshot(raw_data: bytes, version: str, artifact_path: str, matcher: KeywordMatcher,
+                   phase: PhaseTimer = _no_phase) -> LawSnapshot:
+    """
+    สร้าง snapshot จากข้อมูลที่อ่านแล้ว: ใช้ไฟล์ดัชนีสำเร็จรูป (mmap) ถ้าสร้างจากข้อมูลรุ่นเดียวกัน
+    ไม่เช่นนั้นแปลง JSON แล้วสร้างดัชนีใหม่ phase ใช้จับเวลาแต่ละขั้น
+    """
+    started = time.perf_counter()
+    loaded = None
+    if artifact_path:
+        with phase("load_artifact"):
+            loaded = load_artifact(artifact_path, build_key(version, matcher))
+
+    if loaded is not None:
+        store, index, matrix = loaded
+        source = "artifact"
+    else:
+        with phase("parse_json"):
+            # เก็บแบบคอลัมน์ (buffer ข้อความก้อนเดียว) แทน list ของ dict
+            store = LawStore.from_records(parse_records(raw_data))
+        with phase("build_index"):
+            index = LawIndex(store, matcher)
+        # เมทริกซ์ BM25F สำหรับค้นหาหลายคำถามพร้อมกัน
+        with phase("build_matrix"):
+            matrix = TermMatrix(index)
+        source = "json"
+    build_seconds = round(time.perf_counter() - started, 3)
+
+    with phase("precompute_responses"):
+        snapshot = LawSnapshot(version, store, index, matrix, source, build_seconds)
+    logger.info("สร้าง snapshot รุ่น %s จาก %s: %d ข้อ %d คำ", version, source, len(store), len(index.vocabulary))
+    return snapshot
+
+
+class AmbiguousLaw(Exception):
+    """(หมวดหมู่, รหัสมาตรา) ตรงกับหลายข้อแต่ไม่ได้ระบุว่าเป็นข้อใด"""
+
+    def __init__(self, category: str, code: str, count: int):
+        super().__init__(f"{category} มาตรา {code} มี {count} ข้อ")
+        self.count = count
+
+
+def target_docs(snapshot: LawSnapshot, category: str, code: str, ordinal: Optional[int] = None) -> List[int]:
+    """
+    เลขเอกสารที่การแก้ไขรายข้อของ (หมวดหมู่, รหัสมาตรา) อ้างถึง (ว่างถ้าไม่มี)
+    ordinal คือลำดับ (เริ่มที่ 0) ในข้อที่มีรหัสมาตรานี้ ตามลำดับใน GET /laws/{category}/{code}
+    ไม่ระบุ ordinal ได้เฉพาะเมื่อมีไม่เกินหนึ่งข้อ ถ้ามีหลายข้อจะเกิด AmbiguousLaw (ไม่แก้ไขทุกข้อพร้อมกัน)
+    """
+    doc_ids = snapshot.index.lookup(category, code)
+    if ordinal is None:
+        if len(doc_ids) > 1:
+            raise AmbiguousLaw(category, code, len(doc_ids))
+        return list(doc_ids)
+    return [doc_ids[ordinal]] if 0 <= ordinal < len(doc_ids) else []
+
+
+def update_snapshot(snapshot: LawSnapshot, upserts: Sequence[dict], removed: Iterable[int],
+                    matcher: KeywordMatcher) -> Tuple[LawSnapshot, bytes]:
+    """
+    snapshot ใหม่ที่ลบเอกสาร removed แล้วเพิ่ม upserts คืน (snapshot, ข้อมูลใหม่ในรูปแบบไฟล์)
+    - upserts: ข้อกฎหมายใหม่ (ต่อท้ายข้อมูล) ข้อเดิมที่ถูกแทนที่ต้องอยู่ใน removed ด้วย
+    - removed: เลขเอกสารที่จะลบ (รหัสมาตราเดียวกันอาจมีหลายข้อ ผู้เรียกจึงระบุเป็นรายเอกสาร)
+    ตัดคำเฉพาะข้อที่เปลี่ยน ข้อเดิมถูกลบแบบ tombstone จนกว่าจะ compact_snapshot
+    เมทริกซ์ BM25F อ่าน postings ใหม่เฉพาะคำที่เปลี่ยน (ดู TermMatrix.updated)
+    """
+    started = time.perf_counter()
+    removed = sorted(set(removed))
+
+    store = snapshot.store.extended(upserts)
+    index = snapshot.index.updated(store, removed, matcher)
+    matrix = snapshot.matrix.updated(index, index.changed_terms)
+    live_records = [store.record(doc_id) for doc_id in iter_bits(index.all_bits)]
+    raw_data = serialize_records(live_records)
+    updated = LawSnapshot(data_version(raw_data), store, index, matrix, "update",
+                          round(time.perf_counter() - started, 3))
+    logger.info("แก้ไขข้อมูลรุ่น %s -> %s: ลบ %d ข้อ เพิ่ม %d ข้อ", snapshot.version, updated.version,
+                len(removed), len(upserts))
+    return updated, raw_data
+
+
+def compact_snapshot(snapshot: LawSnapshot) -> LawSnapshot:
+    """snapshot ของข้อมูลรุ่นเดิมที่ไม่มีข้อที่ลบแล้วค้างอยู่ (เรียงเลขเอกสารใหม่โดยไม่ต้องตัดคำใหม่)"""
+    started = time.perf_counter()
+    store = LawStore.from_records(snapshot.records())
+    index = snapshot.index.compacted(store)
+    matrix = TermMatrix(index)
+    compacted = LawSnapshot(snapshot.version, store, index, matrix, "compact",
+                            round(time.perf_counter() - started, 3))
+    logger.info("compact ข้อมูลรุ่น %s: ลบ %d ข้อที่ค้างอยู่", snapshot.version, snapshot.index.deleted_count)
+    return compacted
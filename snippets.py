@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Thai AI Lawyer - Snippets
+ตัดข้อความสั้น (snippet) ของข้อกฎหมายรอบคำค้น พร้อมตำแหน่งที่ต้องไฮไลต์
+"""
+
+import bisect
+import unicodedata
+from typing import Dict, Iterable, List, Tuple
+
+# ความยาว snippet เริ่มต้น (ตัวอักษร) และจำนวนช่วงข้อความสูงสุดต่อ snippet
+DEFAULT_SNIPPET_LENGTH = 300
+MAX_FRAGMENTS = 2
+# จำนวนตำแหน่งสูงสุดที่เก็บต่อคำ (กันข้อความยาวมากที่มีคำซ้ำหลายพันครั้ง)
+MAX_MATCHES_PER_TERM = 16
+ELLIPSIS = "…"
+
+
+def find_matches(text: str, terms: Iterable[str]) -> List[Tuple[int, int, str]]:
+    """ตำแหน่ง (เริ่ม, จบ, คำ) ของทุกคำใน terms ที่พบใน text (ตัวพิมพ์เล็กแล้ว) เรียงตามตำแหน่ง"""
+    matches = []
+    for term in dict.fromkeys(terms):
+        if not term:
+            continue
+        start = text.find(term)
+        found = 0
+        while start != -1 and found < MAX_MATCHES_PER_TERM:
+            matches.append((start, start + len(term), term))
+            found += 1
+            start = text.find(term, start + len(term))
+    matches.sort()
+    return matches
+
+
+def _is_mark(char: str) -> bool:
+    # สระบน/ล่างและวรรณยุกต์ไทยเป็น combining mark ห้ามแยกออกจากพยัญชนะ
+    return unicodedata.category(char) in ("Mn", "Mc")
+
+
+def _adjust(text: str, start: int, end: int) -> Tuple[int, int]:
+    """ขยับขอบช่วงไม่ให้ตัดกลางตัวอักษรที่มีสระหรือวรรณยุกต์ และชิดช่องว่างที่อยู่ใกล้ถ้ามี"""
+    start = max(start, 0)
+    end = min(end, len(text))
+    space = text.rfind(" ", max(start - 20, 0), start + 1)
+    if space != -1 and start > 0:
+        start = space + 1
+    while 0 < start < len(text) and _is_mark(text[start]):
+        start -= 1
+    while end < len(text) and _is_mark(text[end]):
+        end += 1
+    return start, end
+
+
+def _select_windows(text: str, matches: List[Tuple[int, int, str]], window: int,
+                    fragments: int) -> List[Tuple[int, int]]:
+    """เลือกช่วงข้อความยาว window ที่ครอบคลุมคำค้นต่างกันมากที่สุด (แล้วจำนวนคำที่พบ) แบบ greedy"""
+    starts = [match[0] for match in matches]
+    windows: List[Tuple[int, int]] = []
+    covered: set = set()
+    while len(windows) < fragments:
+        best = None
+        best_key = None
+        for anchor in starts:
+            if any(w_start <= anchor < w_end for w_start, w_end in windows):
+                continue
+            start = max(0, anchor - window // 4)
+            end = start + window
+            inside = matches[bisect.bisect_left(starts, start):bisect.bisect_right(starts, end)]
+            terms = {term for match_start, match_end, term in inside if match_end <= end}
+            key = (len(terms - covered), len(terms), len(inside), -start)
+            if best_key is None or key > best_key:
+                best, best_key = (start, end, terms), key
+        # หยุดเมื่อไม่มีคำค้นเหลือนอกช่วงที่เลือกแล้ว หรือช่วงถัดไปไม่มีคำค้นใหม่
+        if best is None or (windows and best_key[0] == 0):
+            break
+        start, end, terms = best
+        windows.append(_adjust(text, start, end))
+        covered |= terms
+
+    # รวมช่วงที่ซ้อนหรือชิดกัน
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(windows):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def make_snippet(text: str, terms: Iterable[str], max_length: int = DEFAULT_SNIPPET_LENGTH,
+                 fragments: int = MAX_FRAGMENTS) -> Dict[str, object]:
+    """
+    snippet ของ text ยาวไม่เกินประมาณ max_length ตัวอักษร ประกอบจากช่วงข้อความที่มีคำค้นมากที่สุด
+    ไม่เกิน fragments ช่วง (ต่อกันด้วย …) และ highlights คือ [เริ่ม, จบ] ของคำค้นในตัว snippet
+    ข้อความที่ไม่มีคำค้นใช้ส่วนต้นของข้อความแทน
+    """
+    terms = [term.lower() for term in terms]
+    matches = find_matches(text.lower(), terms)
+    if len(text) <= max_length:
+        windows = [(0, len(text))]
+    elif matches:
+        windows = _select_windows(text, matches, max(max_length // fragments, 1), fragments)
+        if len(windows) < fragments:
+            # คำค้นอยู่รวมกันในช่วงน้อยกว่าที่กำหนด ใช้ความยาวทั้งหมดกับช่วงที่มี
+            windows = _select_windows(text, matches, max_length // len(windows), len(windows))
+    else:
+        windows = [_adjust(text, 0, max_length)]
+
+    parts: List[str] = []
+    for index, (start, end) in enumerate(windows):
+        if index:
+            parts.append(f" {ELLIPSIS} ")
+        elif start > 0:
+            parts.append(ELLIPSIS)
+        parts.append(text[start:end])
+    if windows[-1][1] < len(text):
+        parts.append(ELLIPSIS)
+    snippet = "".join(parts)
+
+    # ตำแหน่งคำค้นใน snippet (ไม่ซ้อนกัน)
+    highlights: List[List[int]] = []
+    for match_start, match_end, _ in find_matches(snippet.lower(), terms):
+        if not highlights or match_start >= highlights[-1][1]:
+            highlights.append([match_start, match_end])
+
+    return {
+        "snippet": snippet,
+        "highlights": highlights,
+        "truncated": windows != [(0, len(text))],
+    }
+
+
+def law_with_snippet(law: dict, terms: Iterable[str], max_length: int = DEFAULT_SNIPPET_LENGTH) -> dict:
+    """ข้อกฎหมายที่แทน text ด้วย snippet และ highlights (ดูเนื้อหาเต็มได้จาก /laws/{category}/{code})"""
+    text = law.get("text", "")
+    result = {key: value for key, value in law.items() if key != "text"}
+    result.update(make_snippet(text, terms, max_length))
+    result["text_length"] = len(text)
+    return result
@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Thai AI Lawyer - SQLite Backend
+backend ที่ค้นหาจากฐานข้อมูล SQLite FTS5 บนดิสก์แทนดัชนีในหน่วยความจำ (LAW_BACKEND=sqlite)
+นำเข้าข้อมูลจาก law_data.json ครั้งเดียว โดยตัดคำด้วย pythainlp ไว้ล่วงหน้า (คำคั่นด้วยช่องว่าง)
+ทุก worker เปิดไฟล์เดียวกันแบบอ่านอย่างเดียว จึงใช้หน่วยความจำตามหน้าที่อ่านจริงผ่าน page cache
+
+สร้างฐานข้อมูลด้วย:  python sqlite_backend.py [--data law_data.json] [--output law_data.sqlite3]
+"""
+
+import argparse
+import hashlib
+import importlib
+import importlib.metadata
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import urllib.parse
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from cache import LRUCache
+from keyword_matcher import KeywordMatcher
+from law_index import BM25_FIELD_WEIGHTS, FIELDS, bits_from_ids, iter_bits, summarize_categories, tokenize_passages
+from law_store import RECORD_FIELDS
+from passages import PASSAGE_LENGTH
+from snapshot import LawBackend, parse_records, read_data
+
+logger = logging.getLogger("thai_ai_lawyer.sqlite_backend")
+
+DEFAULT_DATABASE = "law_data.sqlite3"
+FORMAT_VERSION = 1
+# จำนวนแถวของข้อกฎหมายที่เก็บไว้ในหน่วยความจำต่อ backend (ข้อความตัวพิมพ์เล็กและป้ายกำกับสำหรับให้คะแนน)
+ROW_CACHE_SIZE = 2048
+# จำนวนคำในคำถามที่เก็บ postings ระดับ substring ไว้ต่อ backend (ดู SQLiteIndex.word_postings)
+WORD_POSTINGS_CACHE_SIZE = 4096
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+-- id คือเลขเอกสาร (ลำดับในไฟล์ข้อมูล เริ่มที่ 0) search_text คือ (title + ' ' + text) ตัวพิมพ์เล็ก
+-- ป้ายกำกับเป็น bitmask ฐานสิบหก (จำนวนป้ายกำกับอาจเกิน 64 bit)
+CREATE TABLE laws (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    text TEXT NOT NULL,
+    code TEXT NOT NULL,
+    category TEXT NOT NULL,
+    search_text TEXT NOT NULL,
+    title_lower TEXT NOT NULL,
+    text_labels TEXT NOT NULL,
+    title_labels TEXT NOT NULL
+);
+CREATE INDEX laws_code ON laws (code);
+CREATE INDEX laws_category_code ON laws (category, code);
+CREATE TABLE law_labels (label INTEGER NOT NULL, id INTEGER NOT NULL, PRIMARY KEY (label, id)) WITHOUT ROWID;
+-- bitset ของเอกสารในแต่ละหมวดหมู่ (little-endian) ตามลำดับที่พบในข้อมูล
+CREATE TABLE categories (position INTEGER PRIMARY KEY, category TEXT NOT NULL, bits BLOB NOT NULL);
+-- คำที่ตัดแล้วของแต่ละ passage (ตัวตัดคำ ascii แยกคำที่ช่องว่างและเครื่องหมาย ไม่แยกอักษรไทย)
+CREATE VIRTUAL TABLE passages USING fts5(doc UNINDEXED, title, text, category, tokenize='ascii');
+-- ดัชนี trigram ของ search_text สำหรับหาเอกสารที่มีข้อความใด ๆ เป็น substring (ไม่เก็บข้อความซ้ำ)
+CREATE VIRTUAL TABLE substrings USING fts5(search_text, content='laws', content_rowid='id', tokenize='trigram');
+"""
+
+
+def build_key(matcher: Optional[KeywordMatcher]) -> str:
+    """ค่าที่ฐานข้อมูลต้องตรงจึงจะใช้ได้: รุ่นรูปแบบ รุ่นตัวตัดคำ ขนาด passage และคำสำคัญของ matcher"""
+    parts = {
+        "format": FORMAT_VERSION,
+        "pythainlp": importlib.metadata.version("pythainlp"),
+        "passage_length": PASSAGE_LENGTH,
+        "matcher": matcher.fingerprint if matcher else None,
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def _match_expression(terms: Iterable[str]) -> str:
+    """คำค้นของ FTS5: ทุกคำเป็น phrase ในเครื่องหมายคำพูด เชื่อมด้วย OR"""
+    return " OR ".join('"{}"'.format(term.replace('"', '""')) for term in dict.fromkeys(terms) if term.strip())
+
+
+def build_database(path: str, records: Sequence[dict], version: str, matcher: Optional[KeywordMatcher]) -> int:
+    """
+    นำเข้าข้อกฎหมายเป็นฐานข้อมูล SQLite FTS5 คืนขนาดไฟล์ (byte)
+    ตัดคำและคำนวณป้ายกำกับทุกข้อที่นี่ครั้งเดียว server จึงไม่ต้องตัดคำข้อมูลตอนเริ่มระบบ
+    เขียนไฟล์ชั่วคราวแล้วแทนที่ทีเดียว worker ที่เปิดไฟล์เดิมอยู่จึงยังอ่านไฟล์เดิมได้จน reload
+    """
+    temporary_path = f"{path}.tmp"
+    if os.path.exists(temporary_path):
+        os.remove(temporary_path)
+    conn = sqlite3.connect(temporary_path)
+    try:
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.executescript(SCHEMA)
+
+        category_bits: Dict[str, int] = defaultdict(int)
+        code_keys: List[Tuple[str, str]] = []
+        passage_count = 0
+        for doc_id, law in enumerate(records):
+            title = law.get("title", "")
+            category = law.get("category", "")
+            code = law.get("code", "")
+            search_text = f"{title} {law.get('text', '')}".lower()
+            text_labels = matcher.match(search_text) if matcher else 0
+            title_labels = matcher.match(title.lower()) if matcher else 0
+            conn.execute(
+                "INSERT INTO laws VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (doc_id, title, law.get("text", ""), code, category, search_text, title.lower(),
+                 format(text_labels, "x"), format(title_labels, "x"))
+            )
+            conn.executemany("INSERT INTO law_labels VALUES (?, ?)",
+                             [(label, doc_id) for label in iter_bits(text_labels)])
+            passages = [(doc_id, *(" ".join(tokens) for tokens in field_tokens))
+                        for _, _, field_tokens in tokenize_passages(law, PASSAGE_LENGTH)]
+            conn.executemany("INSERT INTO passages (doc, title, text, category) VALUES (?, ?, ?, ?)", passages)
+            passage_count += len(passages)
+            category_bits[category] |= 1 << doc_id
+            code_keys.append((category, code))
+
+        conn.executemany(
+            "INSERT INTO categories VALUES (?, ?, ?)",
+            [(position, category, bits.to_bytes((len(records) + 7) // 8, "little"))
+             for position, (category, bits) in enumerate(category_bits.items())]
+        )
+        conn.execute("INSERT INTO substrings (substrings) VALUES ('rebuild')")
+        conn.execute("INSERT INTO passages (passages) VALUES ('optimize')")
+        conn.execute("CREATE VIRTUAL TABLE passage_terms USING fts5vocab(passages, 'row')")
+        vocabulary = conn.execute("SELECT count(*) FROM passage_terms").fetchone()[0]
+        meta = {
+            "format": FORMAT_VERSION,
+            "key": build_key(matcher),
+            "version": version,
+            "laws": len(records),
+            "passages": passage_count,
+            "vocabulary": vocabulary,
+            "category_summary": summarize_categories(dict(category_bits), code_keys),
+        }
+        conn.executemany("INSERT INTO meta VALUES (?, ?)",
+                         [(key, json.dumps(value, ensure_ascii=False)) for key, value in meta.items()])
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(temporary_path, path)
+    return os.path.getsize(path)
+
+
+class ConnectionPool:
+    """
+    การเชื่อมต่อแบบอ่านอย่างเดียวกับไฟล์ฐานข้อมูลจำนวน size ชุด เปิดครบตั้งแต่สร้าง pool แล้วให้ thread ยืมทีละคำสั่ง
+    ทุกการเชื่อมต่อจึงอ่านไฟล์รุ่นเดียวกัน (version) แม้ไฟล์ถูกแทนที่ด้วยรุ่นใหม่แล้ว จนกว่าจะ reload
+    การเชื่อมต่อใช้ข้าม fork ไม่ได้ จึงจำ pid ไว้และเชื่อมต่อใหม่ใน process ลูก
+    ถ้าตอนนั้นไฟล์เป็นรุ่นอื่นแล้วจะ raise จนกว่าจะ reload
+    """
+
+    def __init__(self, path: str, size: int = 4):
+        self.path = path
+        self.size = max(size, 1)
+        self.version: Optional[str] = None
+        self._uri = f"file:{urllib.parse.quote(os.path.abspath(path))}?mode=ro"
+        self._lock = threading.Lock()
+        self._connect()
+
+    def _connect(self):
+        self._pid = os.getpid()
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        for _ in range(self.size):
+            conn = sqlite3.connect(self._uri, uri=True, check_same_thread=False)
+            conn.execute("PRAGMA query_only=1")
+            # อ่านผ่าน mmap ทุก worker จึงใช้หน้าของไฟล์ใน page cache ชุดเดียวกัน
+            conn.execute(f"PRAGMA mmap_size={os.path.getsize(self.path)}")
+            row = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            version = json.loads(row[0]) if row else None
+            if self.version is None:
+                self.version = version
+            elif version != self.version:
+                conn.close()
+                raise sqlite3.DatabaseError(f"ฐานข้อมูล {self.path} ถูกแทนที่ด้วยรุ่นอื่นแล้ว ต้อง reload")
+            self._idle.put(conn)
+
+    def execute(self, sql: str, parameters: Sequence = ()) -> List[tuple]:
+        """รันคำสั่งด้วยการเชื่อมต่อที่ว่าง (รอถ้าทุกชุดถูกใช้อยู่) แล้วคืนทุกแถว"""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._connect()
+        conn = self._idle.get()
+        try:
+            return conn.execute(sql, parameters).fetchall()
+        finally:
+            self._idle.put(conn)
+
+
+class SQLiteStore:
+    """ข้อกฎหมายในตาราง laws ใช้แทน LawStore ได้ (len, [doc_id], record, for)"""
+
+    def __init__(self, pool: ConnectionPool, size: int):
+        self.pool = pool
+        self._size = size
+
+    def __len__(self) -> int:
+        return self._size
+
+    def record(self, doc_id: int, fields: Optional[Sequence[str]] = None) -> dict:
+        """dict ของข้อกฎหมาย เฉพาะ fields ตามลำดับที่ระบุ (ไม่ระบุคือทุกฟิลด์ตาม RECORD_FIELDS)"""
+        if not -len(self) <= doc_id < len(self):
+            raise IndexError(doc_id)
+        fields = fields or RECORD_FIELDS
+        rows = self.pool.execute(f"SELECT {', '.join(fields)} FROM laws WHERE id = ?", (doc_id % len(self),))
+        return dict(zip(fields, rows[0]))
+
+    def field(self, doc_id: int, field: str) -> str:
+        """ค่าของฟิลด์เดียวโดยไม่ต้องสร้างทั้งข้อ"""
+        return self.record(doc_id, (field,))[field]
+
+    def __getitem__(self, doc_id: int) -> dict:
+        return self.record(doc_id)
+
+    def __iter__(self) -> Iterator[dict]:
+        for row in self.pool.execute(f"SELECT {', '.join(RECORD_FIELDS)} FROM laws ORDER BY id"):
+            yield dict(zip(RECORD_FIELDS, row))
+
+    def records(self) -> List[dict]:
+        """ข้อกฎหมายทั้งหมดเป็น list ของ dict"""
+        return list(self)
+
+
+class _RowColumn:
+    """คอลัมน์หนึ่งของแถวที่ใช้ให้คะแนน (index.search_texts[doc_id] ฯลฯ) อ่านผ่าน cache ของ SQLiteIndex"""
+
+    def __init__(self, index: "SQLiteIndex", position: int):
+        self._index = index
+        self._position = position
+
+    def __getitem__(self, doc_id: int):
+        return self._index.scoring_row(doc_id)[self._position]
+
+    def __len__(self) -> int:
+        return self._index.size
+
+
+class SQLiteIndex:
+    """
+    ดัชนีบนฐานข้อมูลที่มีเมธอดเดียวกับ LawIndex ที่ตัวจัดอันดับใช้ ผลเป็น bitset ของเลขเอกสารเหมือนกัน
+    ตัวจัดอันดับ legacy จึงให้ผลเท่าดัชนีในหน่วยความจำทุกประการ ส่วน bm25_scores ใช้ bm25() ของ FTS5
+    (BM25 แยกคอลัมน์ถ่วงน้ำหนักตาม BM25_FIELD_WEIGHTS คะแนนสูงสุดของ passage ในข้อ) ไม่ใช่ BM25F
+    เก็บในหน่วยความจำเฉพาะ bitset ของหมวดหมู่และแถวที่ใช้ล่าสุด
+    """
+
+    deleted_count = 0
+
+    def __init__(self, pool: ConnectionPool, meta: dict):
+        self.pool = pool
+        self.size = meta["laws"]
+        self.live_passages = meta["passages"]
+        self.vocabulary_size = meta["vocabulary"]
+        self.category_summary = meta["category_summary"]
+        self.all_bits = (1 << self.size) - 1
+        self.category_bits = {
+            category: int.from_bytes(bits, "little")
+            for category, bits in pool.execute("SELECT category, bits FROM categories ORDER BY position")
+        }
+        self._rows = LRUCache(ROW_CACHE_SIZE)
+        self._word_postings = LRUCache(WORD_POSTINGS_CACHE_SIZE)
+        self.search_texts = _RowColumn(self, 0)
+        self.titles = _RowColumn(self, 1)
+        self.text_labels = _RowColumn(self, 2)
+        self.title_labels = _RowColumn(self, 3)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def scoring_row(self, doc_id: int) -> Tuple[str, str, int, int]:
+        """(search_text, title ตัวพิมพ์เล็ก, ป้ายกำกับทั้งข้อ, ป้ายกำกับชื่อมาตรา) ของเอกสาร doc_id"""
+        row = self._rows.get(doc_id)
+        if row is None:
+            (search_text, title, text_labels, title_labels), = self.pool.execute(
+                "SELECT search_text, title_lower, text_labels, title_labels FROM laws WHERE id = ?", (doc_id,)
+            )
+            row = (search_text, title, int(text_labels, 16), int(title_labels, 16))
+            self._rows.put(doc_id, row)
+        return row
+
+    def _bits(self, sql: str, parameters: Sequence = ()) -> int:
+        return bits_from_ids((doc_id for doc_id, in self.pool.execute(sql, parameters)), self.size)
+
+    def bm25_scores(self, terms: Iterable[str]) -> Dict[int, float]:
+        """คะแนน bm25() ของ FTS5 ของเอกสารที่มีคำใน terms อย่างน้อยหนึ่งคำ (คะแนนสูงสุดของ passage ในเอกสาร)"""
+        expression = _match_expression(terms)
+        if not expression:
+            return {}
+        weights = ", ".join(str(BM25_FIELD_WEIGHTS[field]) for field in FIELDS)
+        # bm25() ใช้ใน aggregate โดยตรงไม่ได้ จึงคำนวณต่อ passage ใน CTE แล้วเลือกค่าสูงสุดของแต่ละข้อ
+        rows = self.pool.execute(
+            f"WITH scored AS MATERIALIZED (SELECT doc, -bm25(passages, 0, {weights}) AS score "
+            "FROM passages WHERE passages MATCH ?) SELECT doc, max(score) FROM scored GROUP BY doc",
+            (expression,)
+        )
+        return {doc_id: score for doc_id, score in rows if score > 0}
+
+    def docs_containing(self, text: str) -> int:
+        """เอกสารที่มี text เป็น substring ของ title + text (ตัวพิมพ์เล็ก)"""
+        text = text.lower()
+        if len(text) < 2:
+            return self.all_bits
+        if len(text) < 3:
+            # ดัชนี trigram ค้นข้อความสั้นกว่า 3 ตัวอักษรไม่ได้ จึงไล่ตรวจทุกข้อ
+            return self._bits("SELECT id FROM laws WHERE instr(search_text, ?) > 0", (text,))
+        return self._bits("SELECT rowid FROM substrings WHERE substrings MATCH ?", (_match_expression([text]),))
+
+    def word_postings(self, word: str) -> Tuple[Dict[int, int], int, int]:
+        """
+        ({เลขเอกสาร: จำนวนครั้งที่พบ word ใน title + text}, bitset ของเอกสารที่พบ, bitset ของเอกสารที่ชื่อมาตรามี word)
+        นับแบบ substring เหมือน LawIndex.word_postings โดยให้ SQLite นับเฉพาะแถวที่ดัชนี trigram เลือก
+        """
+        postings = self._word_postings.get(word)
+        if postings is None:
+            if len(word) < 3:
+                where, parameters = "instr(search_text, ?) > 0", (word,)
+            else:
+                where, parameters = "id IN (SELECT rowid FROM substrings WHERE substrings MATCH ?)", (_match_expression([word]),)
+            rows = self.pool.execute(
+                "SELECT id, (length(search_text) - length(replace(search_text, ?, ''))) / length(?), "
+                f"instr(title_lower, ?) > 0 FROM laws WHERE {where}",
+                (word, word, word, *parameters)
+            )
+            counts = {doc_id: count for doc_id, count, _ in rows if count}
+            postings = (counts, bits_from_ids(counts, self.size),
+                        bits_from_ids((doc_id for doc_id, count, in_title in rows if count and in_title), self.size))
+            self._word_postings.put(word, postings)
+        return postings
+
+    def word_postings_batch(self, words: Iterable[str]) -> Dict[str, Tuple[Dict[int, int], int, int]]:
+        """word_postings ของหลายคำ (SQLite นับทีละคำ)"""
+        return {word: self.word_postings(word) for word in dict.fromkeys(words)}
+
+    def docs_with_labels(self, labels: int) -> int:
+        """เอกสารที่มีคำสำคัญของป้ายกำกับใดป้ายกำกับหนึ่งใน labels"""
+        label_ids = list(iter_bits(labels))
+        if not label_ids:
+            return 0
+        return self._bits("SELECT DISTINCT id FROM law_labels WHERE label IN (SELECT value FROM json_each(?))",
+                          (json.dumps(label_ids),))
+
+    def docs_in_categories(self, category_part: str) -> int:
+        """เอกสารทั้งหมดในหมวดหมู่ที่ชื่อมี category_part"""
+        bits = 0
+        for category, category_bits in self.category_bits.items():
+            if category_part in category.lower():
+                bits |= category_bits
+        return bits
+
+    def docs_with_codes(self, codes: Iterable[str]) -> int:
+        """เอกสารที่รหัสมาตราตรงกับรหัสใดรหัสหนึ่งใน codes ทุกตัวอักษร (ทุกหมวดหมู่)"""
+        codes = list(codes)
+        if not codes:
+            return 0
+        return self._bits("SELECT id FROM laws WHERE code IN (SELECT value FROM json_each(?))",
+                          (json.dumps(codes, ensure_ascii=False),))
+
+    def lookup(self, category: str, code: str) -> List[int]:
+        """เลขเอกสารของมาตรา code ในหมวดหมู่ category (ว่างถ้าไม่มี)"""
+        rows = self.pool.execute("SELECT id FROM laws WHERE category = ? AND code = ? ORDER BY id", (category, code))
+        return [doc_id for doc_id, in rows]
+
+    def facet_counts(self, doc_ids: Iterable[int]) -> Dict[str, int]:
+        """จำนวนเอกสารใน doc_ids แยกตามหมวดหมู่ (เรียงจากมากไปน้อย)"""
+        bits = bits_from_ids(doc_ids, self.size)
+        counts = {category: bin(bits & category_bits).count("1") for category, category_bits in self.category_bits.items()}
+        return {category: count for category, count in sorted(counts.items(), key=lambda item: -item[1]) if count}
+
+    def filter_category(self, bits: int, category: Optional[str]) -> Iterator[int]:
+        """กรองเอกสารตามหมวดหมู่ แล้วไล่ตามลำดับในฐานข้อมูล"""
+        if category:
+            bits &= self.category_bits.get(category, 0)
+        return iter_bits(bits)
+
+
+class SQLiteBackend(LawBackend):
+    """
+    backend บนฐานข้อมูล SQLite FTS5 (อ่านอย่างเดียว) ไม่มี TermMatrix จึงคำนวณคะแนน bm25 ทีละคำถาม
+    แก้ไขรายข้อไม่ได้ ให้แก้ไฟล์ข้อมูลแล้วสร้างฐานข้อมูลใหม่และ reload แทน
+    """
+
+    name = "sqlite"
+    read_only = True
+
+    def __init__(self, path: str, pool: ConnectionPool, meta: dict, build_seconds: float = 0.0):
+        self.path = path
+        self.pool = pool
+        index = SQLiteIndex(pool, meta)
+        super().__init__(meta["version"], SQLiteStore(pool, index.size), index, None, "sqlite", build_seconds)
+
+    def validate(self):
+        super().validate()
+        (count,), = self.pool.execute("SELECT count(*) FROM laws")
+        if count != len(self.store) or not self.index.live_passages:
+            raise ValueError("ฐานข้อมูลไม่ตรงกับจำนวนข้อกฎหมาย")
+
+    def info(self) -> dict:
+        return {
+            **super().info(),
+            "path": self.path,
+            "vocabulary": self.index.vocabulary_size,
+            "passages": self.index.live_passages,
+            "deleted": 0,
+            "store_bytes": os.path.getsize(self.path),
+            "connections": self.pool.size
+        }
+
+
+def open_database(path: str, matcher: Optional[KeywordMatcher], connections: int = 4) -> SQLiteBackend:
+    """
+    เปิดฐานข้อมูลที่สร้างด้วย build_database แบบอ่านอย่างเดียว (pool ขนาด connections)
+    raise ValueError เมื่อไม่มีไฟล์ หรือสร้างด้วยค่าตั้งต้นรุ่นอื่น (ต้องสร้างใหม่ด้วย python sqlite_backend.py)
+    """
+    started = time.perf_counter()
+    if not os.path.exists(path):
+        raise ValueError(f"ไม่พบฐานข้อมูล {path} (สร้างด้วย python sqlite_backend.py)")
+    try:
+        pool = ConnectionPool(path, connections)
+        meta = {key: json.loads(value) for key, value in pool.execute("SELECT key, value FROM meta")}
+    except sqlite3.DatabaseError as e:
+        raise ValueError(f"อ่านฐานข้อมูล {path} ไม่ได้: {e}")
+    if meta.get("format") != FORMAT_VERSION or meta.get("key") != build_key(matcher):
+        raise ValueError(f"ฐานข้อมูล {path} สร้างด้วยค่าตั้งต้นรุ่นอื่น ต้องสร้างใหม่ด้วย python sqlite_backend.py")
+    backend = SQLiteBackend(path, pool, meta, round(time.perf_counter() - started, 3))
+    logger.info("เปิดฐานข้อมูล %s รุ่น %s: %d ข้อ %d คำ", path, backend.version, len(backend), meta["vocabulary"])
+    return backend
+
+
+def main():
+    parser = argparse.ArgumentParser(description="นำเข้า law_data.json เป็นฐานข้อมูล SQLite FTS5")
+    parser.add_argument("--data", default=os.getenv("LAW_DATA_PATH", "law_data.json"), help="ไฟล์ข้อมูลกฎหมาย (JSON)")
+    parser.add_argument("--output", default=os.getenv("LAW_DB_PATH") or DEFAULT_DATABASE,
+                        help="ไฟล์ฐานข้อมูลที่จะสร้าง")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    started = time.perf_counter()
+    raw_data, version = read_data(args.data)
+    records = parse_records(raw_data)
+    if not records:
+        raise SystemExit(f"ไม่มีข้อมูลกฎหมายใน {args.data}")
+    # ป้ายกำกับต้องคำนวณด้วย matcher ชุดเดียวกับ server
+    matcher = importlib.import_module("main").LAW_MATCHER
+    size = build_database(args.output, records, version, matcher)
+    logger.info("สร้าง %s สำเร็จ (%d ข้อ, %.1f MB) ใน %.2f วินาที",
+                args.output, len(records), size / 1e6, time.perf_counter() - started)
+
+if __name__ == "__main__":
+    main()
@@ -5,20 +5,28 @@ Thai AI Lawyer - Server Starter
 เริ่มต้นเซิร์ฟเวอร์และเปิดหน้าเว็บอัตโนมัติ
 """
 
+import argparse
 import subprocess
 import sys
 import time
+import urllib.error
+import urllib.request
 import webbrowser
 import os
 from pathlib import Path
 
+# เวลาสูงสุดที่รอให้ server โหลดข้อมูลและสร้างดัชนีเสร็จ (วินาที)
+READY_TIMEOUT = 120
+
 def check_dependencies():
     """ตรวจสอบ dependencies ที่จำเป็น"""
     required_packages = [
         'fastapi',
         'uvicorn',
         'pydantic',
-        'pythainlp'
+        'pythainlp',
+        'numpy',
+        'scipy'
     ]
     
     missing_packages = []
@@ -40,50 +48,95 @@ def check_dependencies():
     print("✅ Dependencies ทั้งหมดพร้อมใช้งาน")
     return True
 
-def start_server():
-    """เริ่มต้น FastAPI server"""
+def wait_until_ready(server_process, url, timeout=READY_TIMEOUT):
+    """รอจน /ready ตอบ 200 (โหลดข้อมูลและดัชนีเสร็จแล้ว) หรือ server หยุดทำงาน หรือครบเวลา"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server_process.poll() is not None:
+            return False
+        try:
+            with urllib.request.urlopen(f"{url}/ready", timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except (urllib.error.URLError, OSError):
+            # /ready ตอบ 503 (HTTPError) ระหว่างเริ่มระบบ
+            pass
+        time.sleep(0.2)
+    return False
+
+def start_server(args, url):
+    """เริ่มต้น FastAPI server (หลาย worker ผ่าน server.py)"""
     print("🚀 กำลังเริ่มต้น Thai AI Lawyer Server...")
     
+    command = [
+        sys.executable, "server.py",
+        "--host", args.host,
+        "--port", str(args.port),
+        "--workers", str(args.workers),
+        "--graceful-timeout", str(args.graceful_timeout)
+    ]
+    if args.preload:
+        command.append("--preload")
+    
     try:
-        # เริ่มต้น server ใน background
-        server_process = subprocess.Popen([
-            sys.executable, "main.py"
-        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        # เริ่มต้น server ใน background (log แสดงที่หน้าจอเดียวกัน)
+        server_process = subprocess.Popen(command)
         
-        # รอให้ server เริ่มต้น
-        print("⏳ รอสักครู่...")
-        time.sleep(3)
-        
-        # ตรวจสอบว่า server ทำงานหรือไม่
-        if server_process.poll() is None:
-            print("✅ Server เริ่มต้นสำเร็จที่ http://127.0.0.1:8003")
+        # รอให้ server พร้อมรับคำขอ
+        print(f"⏳ รอให้ server พร้อม ({args.workers} worker)...")
+        if wait_until_ready(server_process, url):
+            print(f"✅ Server เริ่มต้นสำเร็จที่ {url}")
             return server_process
-        else:
-            stdout, stderr = server_process.communicate()
-            print("❌ ไม่สามารถเริ่มต้น server ได้")
-            print("Error:", stderr.decode())
-            return None
+        
+        print("❌ ไม่สามารถเริ่มต้น server ได้")
+        stop_server(server_process, args.graceful_timeout)
+        return None
             
     except Exception as e:
         print(f"❌ เกิดข้อผิดพลาด: {e}")
         return None
 
-def open_browser():
+def stop_server(server_process, graceful_timeout):
+    """หยุด server โดยรอคำขอที่ค้างอยู่ให้เสร็จก่อน"""
+    if server_process.poll() is None:
+        server_process.terminate()
+    try:
+        server_process.wait(timeout=graceful_timeout + 10)
+    except subprocess.TimeoutExpired:
+        server_process.kill()
+        server_process.wait()
+
+def open_browser(url):
     """เปิดเบราว์เซอร์ไปยังหน้าเว็บ"""
     try:
-        # รอสักครู่ให้ server พร้อม
-        time.sleep(2)
-        
         # เปิดหน้าเว็บ
-        webbrowser.open('http://127.0.0.1:8003')
+        webbrowser.open(url)
         print("🌐 เปิดเบราว์เซอร์ไปยังหน้าเว็บแล้ว")
         
     except Exception as e:
         print(f"❌ ไม่สามารถเปิดเบราว์เซอร์ได้: {e}")
-        print("กรุณาเปิดเบราว์เซอร์และไปที่: http://127.0.0.1:8003")
+        print(f"กรุณาเปิดเบราว์เซอร์และไปที่: {url}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Thai AI Lawyer - Server Starter")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8003)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="จำนวน worker process (ค่าเริ่มต้นคือจำนวน CPU)")
+    parser.add_argument("--preload", action="store_true",
+                        help="โหลดข้อมูลและสร้างดัชนีครั้งเดียวก่อน fork worker")
+    parser.add_argument("--graceful-timeout", type=int, default=30,
+                        help="เวลาที่รอคำขอที่ค้างอยู่ก่อนปิด server (วินาที)")
+    parser.add_argument("--no-browser", action="store_true", help="ไม่ต้องเปิดเบราว์เซอร์")
+    return parser.parse_args()
 
 def main():
     """ฟังก์ชันหลัก"""
+    args = parse_args()
+    # 0.0.0.0 / :: รับทุก interface แต่ต้องเรียกผ่าน localhost
+    host = "127.0.0.1" if args.host in ("0.0.0.0", "::") else args.host
+    url = f"http://{host}:{args.port}"
+    
     print("=" * 50)
     print("🎯 Thai AI Lawyer - Server Starter")
     print("=" * 50)
@@ -93,7 +146,7 @@ def main():
         return
     
     # ตรวจสอบไฟล์ที่จำเป็น
-    required_files = ['main.py', 'law_data.json', 'index.html']
+    required_files = ['main.py', 'server.py', 'law_data.json', 'index.html']
     missing_files = []
     
     for file in required_files:
@@ -107,18 +160,19 @@ def main():
     print("✅ ไฟล์ทั้งหมดพร้อมใช้งาน")
     
     # เริ่มต้น server
-    server_process = start_server()
+    server_process = start_server(args, url)
     if not server_process:
         return
     
     # เปิดเบราว์เซอร์
-    open_browser()
+    if not args.no_browser:
+        open_browser(url)
     
     print("\n" + "=" * 50)
     print("🎉 Thai AI Lawyer พร้อมใช้งานแล้ว!")
     print("=" * 50)
-    print("📱 หน้าเว็บ: http://127.0.0.1:8003")
-    print("📚 API Docs: http://127.0.0.1:8003/docs")
+    print(f"📱 หน้าเว็บ: {url}")
+    print(f"📚 API Docs: {url}/docs")
     print("🔧 API Endpoints:")
     print("   - POST /ask - ถามคำถามกฎหมาย")
     print("   - GET /laws - ดูรายการกฎหมายทั้งหมด")
@@ -132,8 +186,7 @@ def main():
         server_process.wait()
     except KeyboardInterrupt:
         print("\n🛑 กำลังหยุด server...")
-        server_process.terminate()
-        server_process.wait()
+        stop_server(server_process, args.graceful_timeout)
         print("✅ หยุด server แล้ว")
 
 if __name__ == "__main__":
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Thai AI Lawyer - Term-Document Matrix
+เมทริกซ์ sparse (CSR) ของน้ำหนัก BM25F สำหรับให้คะแนนหลายคำถามพร้อมกันด้วย NumPy/SciPy
+"""
+
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from law_index import BM25_B, BM25_FIELD_WEIGHTS, BM25_K1, FIELDS, LawIndex
+
+# จำนวนคำถามที่คูณเมทริกซ์ต่อรอบ (จำกัดขนาดเมทริกซ์คะแนนแบบ dense ในหน่วยความจำ)
+BATCH_SIZE = 256
+
+# ช่องของเมทริกซ์ก่อนถ่วงน้ำหนัก: (เลข passage, เลขคำ, ความถี่ในแต่ละฟิลด์)
+Entries = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def _postings_entries(index: LawIndex, term_ids: Dict[str, int]) -> Entries:
+    """ช่องของเมทริกซ์จาก postings ของคำใน term_ids"""
+    rows: List[int] = []
+    counts: List[int] = []
+    frequencies: List[List[int]] = []
+    for term in term_ids:
+        postings = index.postings[term]
+        rows += postings.keys()
+        frequencies += postings.values()
+        counts.append(len(postings))
+    return (
+        np.array(rows, dtype=np.int32),
+        np.repeat(np.array(list(term_ids.values()), dtype=np.int32), counts),
+        np.array(frequencies, dtype=np.int32).reshape(-1, len(FIELDS)),
+    )
+
+
+class TermMatrix:
+    """
+    เมทริกซ์ passage x คำ ที่แต่ละช่องเป็น idf * tf / (k1 + tf) ของ BM25F
+    คะแนนของ passage คือผลคูณเมทริกซ์กับเวกเตอร์จำนวนคำในคำถาม และคะแนนของเอกสารคือค่าสูงสุด
+    ของ passage ในเอกสารนั้น จึงเท่ากับ LawIndex.bm25_scores
+
+    เก็บความถี่ก่อนถ่วงน้ำหนักไว้ด้วย updated() จึงอ่าน postings ใหม่เฉพาะคำที่เปลี่ยน
+    """
+
+    def __init__(self, index: LawIndex, k1: float = BM25_K1, b: float = BM25_B,
+                 field_weights: Optional[Dict[str, float]] = None):
+        self._init_layout(index)
+        self._set_entries(index, _postings_entries(index, self.term_ids), k1, b, field_weights or BM25_FIELD_WEIGHTS)
+
+    def _set_entries(self, index: LawIndex, entries: Entries, k1: float, b: float, field_weights: Dict[str, float]):
+        """ถ่วงน้ำหนัก BM25F ของทุกช่องตามสถิติของดัชนี แล้วสร้างเมทริกซ์ CSR"""
+        self._entries = entries
+        self._params = (k1, b, field_weights)
+        rows, cols, frequencies = entries
+        num_passages = len(index.passages)
+
+        # ตัวหารปรับความยาวของแต่ละฟิลด์ต่อ passage (ฟิลด์ x passage)
+        weights = np.array([field_weights.get(field, 0.0) for field in FIELDS])
+        lengths = np.array([index.field_lengths[field] for field in FIELDS], dtype=np.float64).reshape(len(FIELDS), num_passages)
+        averages = np.array([index.avg_field_lengths[field] for field in FIELDS]).reshape(-1, 1)
+        norms = 1 - b + b * lengths / averages
+
+        tf = (frequencies.astype(np.float64) * weights / norms[:, rows].T).sum(axis=1)
+        idf = np.array([index.idf(term) for term in self.term_ids])
+        data = idf[cols] * tf / (k1 + tf)
+
+        self.matrix = sparse.csr_matrix((data, (rows, cols)), shape=(num_passages, len(self.term_ids)))
+        self.matrix.eliminate_zeros()
+
+    def updated(self, index: LawIndex, changed_terms: Iterable[str]) -> "TermMatrix":
+        """
+        เมทริกซ์ของดัชนีที่ได้จาก LawIndex.updated() (เลข passage เดิมไม่เปลี่ยน) อ่าน postings ใหม่เฉพาะคำใน
+        changed_terms ส่วนคำอื่นใช้ความถี่เดิม แล้วถ่วงน้ำหนักใหม่ทั้งเมทริกซ์ (idf และความยาวเฉลี่ยเปลี่ยนทุกช่อง)
+        """
+        matrix = self.__class__.__new__(self.__class__)
+        matrix._init_layout(index)
+        changed_terms = set(changed_terms)
+        rows, cols, frequencies = self._entries
+        keep = ~np.isin(cols, [term_id for term, term_id in self.term_ids.items() if term in changed_terms])
+        # เลขคำเดิม -> เลขคำใหม่ (คำที่ไม่เปลี่ยนยังอยู่ใน vocabulary เสมอ)
+        column_map = np.array([matrix.term_ids.get(term, -1) for term in self.term_ids], dtype=np.int32)
+        new_rows, new_cols, new_frequencies = _postings_entries(
+            index, {term: matrix.term_ids[term] for term in changed_terms if term in matrix.term_ids}
+        )
+        entries = (
+            np.concatenate([rows[keep], new_rows]),
+            np.concatenate([column_map[cols[keep]], new_cols]),
+            np.concatenate([frequencies[keep], new_frequencies]),
+        )
+        matrix._set_entries(index, entries, *self._params)
+        return matrix
+
+    def _init_layout(self, index: LawIndex):
+        self.term_ids = dict(zip(index.vocabulary, range(len(index.vocabulary))))
+        # แถวแรกของแต่ละเอกสาร (passage ของเอกสารเดียวกันอยู่ติดกันเสมอ)
+        self.doc_starts = np.array(index.doc_passages[:-1], dtype=np.int64)
+        self.num_docs = len(index)
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """array ของเมทริกซ์ CSR สำหรับบันทึกในไฟล์ดัชนีสำเร็จรูป"""
+        return {
+            'matrix_data': self.matrix.data,
+            'matrix_indices': self.matrix.indices,
+            'matrix_indptr': self.matrix.indptr,
+        }
+
+    @classmethod
+    def from_arrays(cls, index: LawIndex, arrays: Dict[str, np.ndarray]) -> "TermMatrix":
+        """สร้างเมทริกซ์จากผลของ to_arrays() โดยใช้ array เดิม (เช่น mmap ของไฟล์) ไม่คัดลอก"""
+        term_matrix = cls.__new__(cls)
+        term_matrix._init_layout(index)
+        # ความถี่ก่อนถ่วงน้ำหนักอ่านจาก postings ในไฟล์เดียวกัน (ใช้เมื่อแก้ไขข้อมูลรายข้อ)
+        indptr = arrays['postings_indptr']
+        term_matrix._entries = (
+            arrays['postings_passages'],
+            np.repeat(np.arange(len(indptr) - 1, dtype=np.int32), np.diff(indptr)),
+            arrays['postings_frequencies'],
+        )
+        term_matrix._params = (BM25_K1, BM25_B, BM25_FIELD_WEIGHTS)
+        term_matrix.matrix = sparse.csr_matrix(
+            (arrays['matrix_data'], arrays['matrix_indices'], arrays['matrix_indptr']),
+            shape=(len(index.passages), len(term_matrix.term_ids)),
+            copy=False,
+        )
+        return term_matrix
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        """(จำนวน passage, จำนวนคำ)"""
+        return self.matrix.shape
+
+    def query_matrix(self, queries: Sequence[Sequence[str]]) -> sparse.csc_matrix:
+        """แปลงคำถามที่ตัดคำแล้วเป็นเมทริกซ์ คำ x คำถาม (ค่าคือจำนวนครั้งที่คำปรากฏ)"""
+        rows: List[int] = []
+        cols: List[int] = []
+        for query_id, terms in enumerate(queries):
+            for term in terms:
+                term_id = self.term_ids.get(term)
+                if term_id is not None:
+                    rows.append(term_id)
+                    cols.append(query_id)
+        data = np.ones(len(rows), dtype=np.float64)
+        # ช่องที่ซ้ำกันจะถูกรวมกันเป็นจำนวนครั้งของคำในคำถาม
+        return sparse.csc_matrix((data, (rows, cols)), shape=(len(self.term_ids), len(queries)))
+
+    def score(self, queries: Sequence[Sequence[str]]) -> np.ndarray:
+        """คะแนนของทุกเอกสารสำหรับทุกคำถาม (เอกสาร x คำถาม) ด้วยการคูณเมทริกซ์ครั้งเดียว"""
+        passage_scores = np.asarray((self.matrix @ self.query_matrix(queries)).todense())
+        if not self.num_docs:
+            return passage_scores
+        return np.maximum.reduceat(passage_scores, self.doc_starts, axis=0)
+
+    def nonzero_scores(self, queries: Sequence[Sequence[str]]) -> List[List[Tuple[int, float]]]:
+        """คะแนนที่ไม่เป็นศูนย์ของแต่ละคำถามเป็น [(เลขเอกสาร, คะแนน), ...] ตามลำดับเอกสาร"""
+        results: List[List[Tuple[int, float]]] = []
+        for start in range(0, len(queries), BATCH_SIZE):
+            scores = self.score(queries[start:start + BATCH_SIZE])
+            for column in scores.T:
+                doc_ids = np.flatnonzero(column)
+                results.append(list(zip(doc_ids.tolist(), column[doc_ids].tolist())))
+        return results
+
+    def top_k(self, queries: Sequence[Sequence[str]], k: int = 10,
+              doc_mask: Optional[np.ndarray] = None) -> List[List[Tuple[int, float]]]:
+        """
+        k อันดับแรกของแต่ละคำถามเป็น [(เลขเอกสาร, คะแนน), ...] คะแนนปัดเป็นทศนิยม 4 ตำแหน่งเหมือนตัวจัดอันดับ bm25
+        ใช้ argpartition แทนการเรียงทั้งหมด และตัดเอกสารที่คะแนนเป็นศูนย์ทิ้ง
+        doc_mask (bool ขนาดเท่าจำนวนเอกสาร) ใช้จำกัดเอกสาร เช่น กรองตามหมวดหมู่
+        """
+        results: List[List[Tuple[int, float]]] = []
+        for start in range(0, len(queries), BATCH_SIZE):
+            # ปัดก่อนเลือก คะแนนที่ต่างกันหลังทศนิยมตำแหน่งที่ 4 จึงเรียงตามลำดับในฐานข้อมูลเหมือนค้นทีละคำถาม
+            scores = np.round(self.score(queries[start:start + BATCH_SIZE]), 4)
+            if doc_mask is not None:
+                scores[~doc_mask] = 0.0
+            for column in scores.T:
+                if 0 < k < len(column):
+                    top = np.argpartition(-column, k - 1)[:k]
+                    # คะแนนเท่ากันที่ขอบตัด k เลือกเอกสารลำดับแรก ๆ ให้ตรงกับการเรียงทั้งหมด
+                    threshold = column[top].min()
+                    above = np.flatnonzero(column > threshold)
+                    top = np.concatenate([above, np.flatnonzero(column == threshold)[:k - len(above)]])
+                else:
+                    top = np.arange(len(column) if k > 0 else 0)
+                top = top[column[top] > 0]
+                # เรียงตามคะแนน คะแนนเท่ากันเรียงตามลำดับในฐานข้อมูลเหมือนการค้นหาทีละคำถาม
+                order = np.lexsort((top, -column[top]))
+                results.append([(int(doc_id), float(column[doc_id])) for doc_id in top[order]])
+        return results
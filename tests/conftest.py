@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+Thai AI Lawyer - Test Fixtures
+ชุดข้อมูลและ helper ที่การทดสอบใช้ร่วมกัน (รันด้วย python -m pytest จากรากของ repository)
+"""
+
+import json
+import os
+import sys
+from contextlib import contextmanager
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import main  # noqa: E402
+from snapshot import build_snapshot, data_version  # noqa: E402
+
+
+def load_records():
+    """ข้อกฎหมายทั้งหมดใน law_data.json ของ repository"""
+    with open(os.path.join(ROOT, "law_data.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.fixture(scope="session")
+def records():
+    return load_records()
+
+
+@pytest.fixture(scope="session")
+def matcher():
+    return main.LAW_MATCHER
+
+
+@pytest.fixture(scope="session")
+def snapshot(records):
+    """snapshot ที่สร้างจาก law_data.json โดยตรง (ไม่ใช้ไฟล์ดัชนีสำเร็จรูป)"""
+    raw_data = json.dumps(records, ensure_ascii=False).encode("utf-8")
+    return build_snapshot(raw_data, data_version(raw_data), "", main.LAW_MATCHER)
+
+
+@contextmanager
+def pinned(snapshot):
+    """ใช้ snapshot นี้กับ main.search_laws/rank_laws เหมือนคำขอที่ตรึง snapshot ไว้ (ดู SnapshotMiddleware)"""
+    token = main._request_snapshot.set(snapshot)
+    try:
+        yield snapshot
+    finally:
+        main._request_snapshot.reset(token)
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+Thai AI Lawyer - Index Artifact Tests
+ดัชนีที่โหลดจากไฟล์ดัชนีสำเร็จรูป (อ่าน array จาก mmap เมื่อใช้) ต้องเท่ากับดัชนีที่สร้างจาก JSON
+ทั้งข้อมูลต่อข้อ bitset ผลการค้นหา และการแก้ไขรายข้อต่อจากดัชนีที่โหลด
+"""
+
+import pytest
+
+import main
+from artifact import load_artifact, write_artifact
+from conftest import pinned
+from snapshot import LawSnapshot, update_snapshot
+from test_search_parity import CATEGORIES, QUERIES
+
+
+@pytest.fixture(scope="module")
+def loaded(snapshot, tmp_path_factory):
+    """snapshot ที่โหลดจากไฟล์ดัชนีของ snapshot ที่สร้างจาก law_data.json"""
+    path = str(tmp_path_factory.mktemp("artifact") / "law_data.idx")
+    write_artifact(path, "test", snapshot.store, snapshot.index, snapshot.matrix)
+    store, index, matrix = load_artifact(path, "test")
+    return LawSnapshot(snapshot.version, store, index, matrix, "artifact")
+
+
+def test_loaded_index_equals_built(snapshot, loaded):
+    index, expected = loaded.index, snapshot.index
+    for attribute in ("doc_categories", "category_bits", "category_summary", "all_bits", "_mixed_case"):
+        assert getattr(index, attribute) == getattr(expected, attribute), attribute
+    assert dict(index.code_docs) == expected.code_docs
+    assert dict(index._code_bits) == expected._code_bits
+    assert dict(index._label_docs) == expected._label_docs
+    assert dict(index._gram_bits) == expected._gram_bits
+    assert list(index.text_labels) == expected.text_labels
+    assert list(index.title_labels) == expected.title_labels
+
+
+def test_artifact_key_mismatch(snapshot, tmp_path):
+    path = str(tmp_path / "law_data.idx")
+    write_artifact(path, "test", snapshot.store, snapshot.index, snapshot.matrix)
+    assert load_artifact(path, "other") is None
+
+
+@pytest.mark.parametrize("ranker", sorted(main.RANKERS))
+@pytest.mark.parametrize("category", CATEGORIES)
+def test_loaded_search_matches_built(snapshot, loaded, records, ranker, category):
+    for query in QUERIES:
+        with pinned(snapshot):
+            expected = main.search_laws(query, category, ranker, limit=len(records))
+        with pinned(loaded):
+            assert main.search_laws(query, category, ranker, limit=len(records)) == expected
+
+
+def test_update_after_load_matches_built(snapshot, loaded, records, matcher):
+    replacement = {**records[5], "text": records[5]["text"] + " ลักทรัพย์ในเวลากลางคืน"}
+    expected, _ = update_snapshot(snapshot, [replacement], [0, 5], matcher)
+    updated, _ = update_snapshot(loaded, [replacement], [0, 5], matcher)
+    assert dict(updated.index.code_docs) == expected.index.code_docs
+    assert updated.index.category_summary == expected.index.category_summary
+    for query in QUERIES:
+        for ranker in main.RANKERS:
+            with pinned(expected):
+                results = main.search_laws(query, None, ranker)
+            with pinned(updated):
+                assert main.search_laws(query, None, ranker) == results
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Thai AI Lawyer - Batch Search Tests
+การค้นและตอบหลายคำถามพร้อมกัน (warm_rankings, answer_batch, search_laws_batch, TermMatrix.top_k)
+ต้องให้ผลเท่ากับการค้นทีละคำถาม
+"""
+
+import pytest
+
+import main
+from conftest import pinned
+from law_index import LawIndex, bits_mask
+from law_store import LawStore
+from snapshot import update_snapshot
+from term_matrix import TermMatrix
+from test_search_parity import CATEGORIES, QUERIES, search_laws as baseline_search_laws
+
+ITEMS = [
+    ("ลักทรัพย์ต้องรับโทษอย่างไร", None),
+    ("มาตรา 277", "ประมวลกฎหมายอาญา"),
+    ("ผิดสัญญาเช่าต้องชดใช้ค่าเสียหาย", "ประมวลกฎหมายแพ่งและพาณิชย์"),
+    ("ทำท้องผู้เยาว์", None),
+]
+
+
+def test_warm_rankings_legacy_matches_baseline(snapshot, records):
+    main.RANKING_CACHE.clear()
+    queries = [main.QueryAnalysis(query) for query in QUERIES]
+    with pinned(snapshot):
+        main.warm_rankings(queries, "legacy")
+        for query in queries:
+            cached = main.RANKING_CACHE.get(main._ranking_key(snapshot, query, "legacy", None))
+            assert (cached is None) == bool(query.section_numbers)
+        for query in QUERIES:
+            assert main.search_laws(query, None, "legacy", limit=len(records)) == \
+                baseline_search_laws(records, query, None)
+
+
+def test_answer_batch_analyzes_each_question_once(snapshot, monkeypatch):
+    with pinned(snapshot):
+        expected = [main.answer_question(question, category, "legacy") for question, category in ITEMS]
+
+        analyzed = []
+
+        class CountingAnalysis(main.QueryAnalysis):
+            def __init__(self, question):
+                analyzed.append(question)
+                super().__init__(question)
+
+        monkeypatch.setattr(main, "QueryAnalysis", CountingAnalysis)
+        main.RANKING_CACHE.clear()
+        assert main.answer_batch(ITEMS, "legacy") == expected
+    assert sorted(analyzed) == sorted(question for question, _ in ITEMS)
+
+
+def expected_top(scores, k, allowed=None):
+    """k อันดับแรกจากการเรียงคะแนน (ปัดทศนิยม 4 ตำแหน่ง) ทั้งหมด คะแนนเท่ากันเรียงตามเลขเอกสาร"""
+    ranked = [(doc_id, round(float(score), 4)) for doc_id, score in enumerate(scores)
+              if (allowed is None or allowed[doc_id]) and round(float(score), 4) > 0]
+    return sorted(ranked, key=lambda item: (-item[1], item[0]))[:k]
+
+
+@pytest.mark.parametrize("k", [1, 3, 10, 1000])
+def test_top_k_matches_full_sort(snapshot, k):
+    queries = [main.QueryAnalysis(query).search_words for query in QUERIES]
+    allowed = bits_mask(snapshot.index.category_bits["ประมวลกฎหมายอาญา"], len(snapshot.index))
+    scores = snapshot.matrix.score(queries)
+    assert snapshot.matrix.top_k(queries, k) == [expected_top(column, k) for column in scores.T]
+    assert snapshot.matrix.top_k(queries, k, allowed) == [expected_top(column, k, allowed) for column in scores.T]
+
+
+def test_top_k_breaks_ties_by_document_order(matcher):
+    law = {"title": "มาตรา 1", "text": "ผู้ใดลักทรัพย์ของผู้อื่น", "code": "1", "category": "ทดสอบ"}
+    other = {"title": "มาตรา 2", "text": "ผู้ใดทำร้ายร่างกายผู้อื่น", "code": "2", "category": "ทดสอบ"}
+    store = LawStore.from_records([other, law, other, law, law, law])
+    matrix = TermMatrix(LawIndex(store, matcher))
+    # ข้อ 1, 3, 4 และ 5 ได้คะแนนเท่ากัน จึงต้องเลือกตามลำดับในฐานข้อมูลที่ขอบตัด k
+    for k in (1, 2, 3):
+        top, = matrix.top_k([["ลักทรัพย์"]], k)
+        assert [doc_id for doc_id, _ in top] == [1, 3, 4][:k]
+        assert len({score for _, score in top}) == 1
+
+
+@pytest.mark.parametrize("limit", [10, 50])
+@pytest.mark.parametrize("category", CATEGORIES)
+def test_search_laws_batch_matches_search_laws(snapshot, category, limit):
+    with pinned(snapshot):
+        expected = [main.search_laws(query, category, "bm25", limit) for query in QUERIES]
+        assert main.search_laws_batch(QUERIES, category, limit) == expected
+
+
+def test_search_laws_batch_after_update(snapshot, records, matcher):
+    # ลบบางข้อ (tombstone) และเพิ่มข้อใหม่ท้ายข้อมูล โดยไม่ compact
+    replacement = {**records[5], "text": records[5]["text"] + " ลักทรัพย์ในเวลากลางคืน"}
+    updated, _ = update_snapshot(snapshot, [replacement], [0, 5, 42], matcher)
+    with pinned(updated):
+        for category in CATEGORIES:
+            expected = [main.search_laws(query, category, "bm25") for query in QUERIES]
+            assert main.search_laws_batch(QUERIES, category) == expected
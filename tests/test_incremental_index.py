@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""
+Thai AI Lawyer - Incremental Index Tests
+ดัชนีที่แก้ไขรายข้อด้วย LawIndex.updated() และที่ compact แล้วด้วย compacted()
+ต้องให้ผลเท่ากับ LawIndex ที่สร้างใหม่จากข้อกฎหมายชุดเดียวกัน
+"""
+
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from conftest import pinned
+from law_index import LawIndex, iter_bits
+from law_store import LawStore
+from snapshot import AmbiguousLaw, LawSnapshot, target_docs, update_snapshot
+from term_matrix import TermMatrix
+
+AMENDMENT = "พระราชบัญญัติแก้ไขเพิ่มเติมประมวลกฎหมายอาญา"
+CRIMINAL_CODE = "ประมวลกฎหมายอาญา"
+# มาตราที่มีหลายข้อใน law_data.json (ต้องเลือกข้อด้วย ordinal)
+DUPLICATE_CODE = "277"
+COMPUTER_ACT = "พระราชบัญญัติว่าด้วยการกระทำความผิดเกี่ยวกับคอมพิวเตอร์"
+
+QUERIES = [
+    "มาตรา 277",
+    "มาตรา 5",
+    "มาตรา 14 นำเข้าสู่ระบบคอมพิวเตอร์",
+    "ลักทรัพย์ในเคหสถาน",
+    "ฆ่าผู้อื่นโดยเจตนา",
+    "ทำร้ายร่างกายผู้อื่น",
+    "ชำเราเด็กอายุยังไม่เกินสิบห้าปี",
+    "สัญญาเช่าทรัพย์",
+    "สิทธิและเสรีภาพของประชาชน",
+    "ข้อมูลคอมพิวเตอร์ปลอม",
+]
+
+
+def law(category, code, text):
+    return {"title": f"{category} มาตรา {code}", "text": f"มาตรา {code} {text}", "code": code, "category": category}
+
+
+# แต่ละขั้น: (ข้อกฎหมายที่เพิ่ม/แทนที่, (หมวดหมู่, รหัสมาตรา) ที่ลบ)
+STEPS = [
+    # แทนที่มาตราที่มีอยู่แล้ว
+    ([law("ประมวลกฎหมายอาญา", "334", "ผู้ใดเอาทรัพย์ของผู้อื่นไปโดยทุจริต ผู้นั้นกระทำความผิดฐานลักทรัพย์ แก้ไขใหม่")], []),
+    # มาตราใหม่ในหมวดเดิม และหมวดหมู่ใหม่
+    ([law("ประมวลกฎหมายอาญา", "9001", "ผู้ใดฆ่าผู้อื่นโดยทารุณโหดร้าย"),
+      law(COMPUTER_ACT, "14", "ผู้ใดนำเข้าสู่ระบบคอมพิวเตอร์ซึ่งข้อมูลคอมพิวเตอร์ปลอม")], []),
+    # ลบมาตรา และลบทั้งหมวดหมู่
+    ([], [("ประมวลกฎหมายอาญา", "288")]),
+    ([], "amendments"),
+    # ข้อความยาวหลาย passage
+    ([law(AMENDMENT, "5", "ผู้ใดกระทำชำเราเด็กอายุยังไม่เกินสิบห้าปี ทำร้ายร่างกาย " * 200)], []),
+    # แทนที่มาตราที่เพิ่งเพิ่ม แล้วลบมาตราที่เพิ่งแทนที่
+    ([law(COMPUTER_ACT, "14", "ผู้ใดนำเข้าสู่ระบบคอมพิวเตอร์ซึ่งข้อมูลอันเป็นเท็จ")], [("ประมวลกฎหมายอาญา", "334")]),
+]
+
+
+@pytest.fixture(scope="module")
+def sample(records):
+    """ข้อกฎหมายบางส่วนจากทุกหมวดหมู่ (สร้างดัชนีได้เร็ว) รวมมาตราที่ STEPS แก้ไข"""
+    keep = {("ประมวลกฎหมายอาญา", "334"), ("ประมวลกฎหมายอาญา", "288"), ("ประมวลกฎหมายอาญา", "277")}
+    return [record for position, record in enumerate(records)
+            if position % 8 == 0 or record["category"] == AMENDMENT or (record["category"], record["code"]) in keep]
+
+
+@pytest.fixture(scope="module")
+def updated(sample, matcher):
+    """ดัชนีหลังแก้ไขทุกขั้นใน STEPS ด้วย LawIndex.updated()"""
+    store = LawStore.from_records(sample)
+    index = LawIndex(store, matcher)
+    for upserts, deletes in STEPS:
+        if deletes == "amendments":
+            deletes = [(category, code) for category, code in index.code_docs if category == AMENDMENT]
+        keys = [(record["category"], record["code"]) for record in upserts] + deletes
+        removed = sorted({doc_id for category, code in keys for doc_id in index.lookup(category, code)})
+        store = store.extended(upserts)
+        index = index.updated(store, removed, matcher)
+    return store, index
+
+
+@pytest.fixture(scope="module")
+def fresh(updated, matcher):
+    """ดัชนีที่สร้างใหม่จากข้อกฎหมายที่เหลือหลังแก้ไข"""
+    store, index = updated
+    fresh_store = LawStore.from_records([store.record(doc_id) for doc_id in iter_bits(index.all_bits)])
+    return fresh_store, LawIndex(fresh_store, matcher)
+
+
+@pytest.fixture(scope="module")
+def compacted(updated, fresh):
+    """ดัชนีที่ compact แล้ว (store คือข้อที่ยังอยู่ตามลำดับเดิม)"""
+    _, index = updated
+    store = LawStore.from_records(fresh[0].records())
+    return store, index.compacted(store)
+
+
+def snapshot_of(store, index):
+    return LawSnapshot("test", store, index, TermMatrix(index), "test")
+
+
+def live_positions(index):
+    """เลขเอกสารเดิม -> ลำดับในข้อที่ยังอยู่ และเลข passage เดิม -> ลำดับใน passage ที่ยังอยู่"""
+    docs, passages = {}, {}
+    for position, doc_id in enumerate(iter_bits(index.all_bits)):
+        docs[doc_id] = position
+        for passage_id in range(index.doc_passages[doc_id], index.doc_passages[doc_id + 1]):
+            passages[passage_id] = len(passages)
+    return docs, passages
+
+
+def remap_bits(bits, positions):
+    return sorted(positions[doc_id] for doc_id in iter_bits(bits))
+
+
+def rankings(store, index, positions=None):
+    """ผลของ rank_laws ทุกคำถามและทุกตัวจัดอันดับ เรียงตามคะแนน (เลขเอกสารแปลงด้วย positions)"""
+    results = {}
+    with pinned(snapshot_of(store, index)):
+        for ranker in main.RANKERS:
+            for query in QUERIES:
+                for category in (None, "ประมวลกฎหมายอาญา"):
+                    scores = [(positions[doc_id] if positions else doc_id, score)
+                              for doc_id, score in main.rank_laws(query, category, ranker)]
+                    results[(ranker, query, category)] = sorted(scores, key=lambda item: (-item[1], item[0]))
+    return results
+
+
+def test_updated_index_has_pending_deletions(updated):
+    store, index = updated
+    assert index.deleted_count > 0
+    assert len(index) == len(store)
+
+
+def test_updated_postings_match_fresh(updated, fresh):
+    _, index = updated
+    _, expected = fresh
+    _, passages = live_positions(index)
+    assert index.vocabulary == expected.vocabulary
+    assert index.doc_freq == expected.doc_freq
+    for term in expected.vocabulary:
+        postings = {passages[passage_id]: frequencies for passage_id, frequencies in index.postings[term].items()}
+        assert postings == expected.postings[term], term
+
+
+def test_updated_doc_stats_match_fresh(updated, fresh):
+    _, index = updated
+    _, expected = fresh
+    _, passages = live_positions(index)
+    assert index.live_passages == expected.live_passages
+    assert index.avg_field_lengths == expected.avg_field_lengths
+    for field, lengths in expected.field_lengths.items():
+        assert [index.field_lengths[field][passage_id] for passage_id in passages] == lengths
+
+
+def test_updated_section_lookup_matches_fresh(updated, fresh):
+    _, index = updated
+    _, expected = fresh
+    docs, _ = live_positions(index)
+    assert {key: [docs[doc_id] for doc_id in doc_ids] for key, doc_ids in index.code_docs.items()} == expected.code_docs
+    assert index.category_summary == expected.category_summary
+    assert list(index.category_bits) == list(expected.category_bits)
+    for category, bits in expected.category_bits.items():
+        assert remap_bits(index.category_bits[category], docs) == list(iter_bits(bits))
+
+
+def test_updated_label_bitsets_match_fresh(updated, fresh):
+    _, index = updated
+    _, expected = fresh
+    docs, _ = live_positions(index)
+    assert set(index._label_docs) == set(expected._label_docs)
+    for label, bits in expected._label_docs.items():
+        assert remap_bits(index._label_docs[label], docs) == list(iter_bits(bits))
+    assert [index.text_labels[doc_id] for doc_id in docs] == expected.text_labels
+    assert [index.title_labels[doc_id] for doc_id in docs] == expected.title_labels
+    grams = {gram: remap_bits(bits, docs) for gram, bits in index._gram_bits.items() if bits}
+    assert grams == {gram: list(iter_bits(bits)) for gram, bits in expected._gram_bits.items()}
+
+
+def test_updated_rankings_match_fresh(updated, fresh):
+    store, index = updated
+    docs, _ = live_positions(index)
+    assert rankings(store, index, docs) == rankings(*fresh)
+
+
+def test_compacted_index_equals_fresh(compacted, fresh):
+    _, index = compacted
+    _, expected = fresh
+    assert index.deleted_count == 0
+    assert dict(index.postings) == dict(expected.postings)
+    for attribute in ("vocabulary", "doc_freq", "passages", "doc_passages", "live_passages", "field_lengths",
+                      "avg_field_lengths", "code_docs", "category_bits", "category_summary", "all_bits",
+                      "text_labels", "title_labels", "_label_docs"):
+        assert getattr(index, attribute) == getattr(expected, attribute), attribute
+    assert {gram: bits for gram, bits in index._gram_bits.items() if bits} == expected._gram_bits
+
+
+def test_compacted_rankings_match_fresh(compacted, fresh):
+    assert rankings(*compacted) == rankings(*fresh)
+
+
+@pytest.fixture(scope="module")
+def duplicated(sample, matcher):
+    """snapshot ของ sample ที่แทนที่ข้อลำดับที่ 3 แล้วลบข้อลำดับที่ 0 ของมาตราที่มีหลายข้อ"""
+    store = LawStore.from_records(sample)
+    snapshot = snapshot_of(store, LawIndex(store, matcher))
+    before = [snapshot.store.record(doc_id) for doc_id in snapshot.index.lookup(CRIMINAL_CODE, DUPLICATE_CODE)]
+    replacement = law(CRIMINAL_CODE, DUPLICATE_CODE, "ผู้ใดกระทำชำเราผู้อื่น แก้ไขใหม่")
+    snapshot, _ = update_snapshot(snapshot, [replacement], target_docs(snapshot, CRIMINAL_CODE, DUPLICATE_CODE, 3),
+                                  matcher)
+    snapshot, _ = update_snapshot(snapshot, [], target_docs(snapshot, CRIMINAL_CODE, DUPLICATE_CODE, 0), matcher)
+    return before, replacement, snapshot
+
+
+def test_duplicate_key_requires_ordinal(sample, matcher):
+    store = LawStore.from_records(sample)
+    snapshot = snapshot_of(store, LawIndex(store, matcher))
+    assert len(snapshot.index.lookup(CRIMINAL_CODE, DUPLICATE_CODE)) > 1
+    with pytest.raises(AmbiguousLaw):
+        target_docs(snapshot, CRIMINAL_CODE, DUPLICATE_CODE)
+    assert target_docs(snapshot, CRIMINAL_CODE, DUPLICATE_CODE, 99) == []
+
+
+def test_duplicate_key_edits_touch_one_record(duplicated):
+    before, replacement, snapshot = duplicated
+    after = [snapshot.store.record(doc_id) for doc_id in snapshot.index.lookup(CRIMINAL_CODE, DUPLICATE_CODE)]
+    assert after == before[1:3] + before[4:] + [replacement]
+
+
+def test_duplicate_key_edits_match_fresh(duplicated, matcher):
+    _, _, snapshot = duplicated
+    index = snapshot.index
+    fresh_store = LawStore.from_records([snapshot.store.record(doc_id) for doc_id in iter_bits(index.all_bits)])
+    expected = LawIndex(fresh_store, matcher)
+    docs, passages = live_positions(index)
+    assert index.vocabulary == expected.vocabulary
+    for term in expected.vocabulary:
+        postings = {passages[passage_id]: frequencies for passage_id, frequencies in index.postings[term].items()}
+        assert postings == expected.postings[term], term
+    assert {key: [docs[doc_id] for doc_id in doc_ids] for key, doc_ids in index.code_docs.items()} == expected.code_docs
+    assert rankings(snapshot.store, index, docs) == rankings(fresh_store, expected)
+
+
+def test_admin_edits_of_duplicate_key(sample, matcher, tmp_path, monkeypatch):
+    """PUT/DELETE ที่ไม่ระบุ ordinal ของมาตราที่มีหลายข้อตอบ 409 โดยไม่แก้ไขไฟล์ข้อมูล ระบุ ordinal แล้วแก้ไขข้อเดียว"""
+    store = LawStore.from_records(sample)
+    data_path = tmp_path / "law_data.json"
+    data_path.write_text(json.dumps(sample, ensure_ascii=False), encoding="utf-8")
+    monkeypatch.setattr(main, "SNAPSHOT", snapshot_of(store, LawIndex(store, matcher)))
+    monkeypatch.setattr(main, "LAW_DATA_PATH", str(data_path))
+    monkeypatch.setattr(main, "LAW_ARTIFACT_PATH", "")
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "secret")
+    client = TestClient(main.app)
+    headers = {"X-Admin-Token": "secret"}
+    path = f"/admin/laws/{CRIMINAL_CODE}/{DUPLICATE_CODE}"
+    count = len(main.SNAPSHOT.index.lookup(CRIMINAL_CODE, DUPLICATE_CODE))
+
+    def stored():
+        return [record for record in json.loads(data_path.read_text(encoding="utf-8"))
+                if (record["category"], record["code"]) == (CRIMINAL_CODE, DUPLICATE_CODE)]
+
+    assert client.put(path, json={"title": "แก้ไข", "text": "ข้อความใหม่"}, headers=headers).status_code == 409
+    assert client.delete(path, headers=headers).status_code == 409
+    assert client.delete(path, params={"ordinal": count}, headers=headers).status_code == 404
+    assert len(stored()) == count
+
+    response = client.delete(path, params={"ordinal": 1}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["removed"] == 1
+    assert len(stored()) == count - 1
+    response = client.put(path, params={"ordinal": 0}, json={"title": "แก้ไข", "text": "ข้อความใหม่"}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["status"] == "updated"
+    assert [record["text"] for record in stored()][-1] == "ข้อความใหม่"
+    assert len(stored()) == count - 1
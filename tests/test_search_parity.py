@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+Thai AI Lawyer - Search Parity Tests
+search_laws (ตัวจัดอันดับ legacy ที่ใช้ดัชนี) ต้องให้ผลเท่ากับ search_laws ต้นฉบับก่อนสร้างดัชนี ทุกคำถามและทุกหมวดหมู่
+ฟังก์ชันต้นฉบับคัดลอกมาทั้งฟังก์ชันโดยไม่แก้ไข ยกเว้นบรรทัดที่มีเครื่องหมาย [ต่างจากต้นฉบับ]
+(การจับเลขมาตราแบบตรงทุกตัวอักษรของ user-014 การรับข้อกฎหมายเป็นพารามิเตอร์ และการคืนผลทั้งหมด)
+"""
+
+from typing import List, Optional
+
+import pythainlp
+import pytest
+
+import main
+from conftest import pinned
+
+QUERIES = [
+    "มาตรา 277",
+    "มาตรา 276-280",
+    "มาตรา 80 หรือ 81",
+    "มาตรา 1268",
+    "มาตรา 334 ลักทรัพย์",
+    "มาตรา 9999",
+    "ลักทรัพย์ต้องรับโทษอย่างไร",
+    "ขโมยของในบ้านผู้อื่น",
+    "ฆ่าผู้อื่นโดยเจตนา",
+    "ทำร้ายร่างกายจนบาดเจ็บ",
+    "ข่มขืนเด็กอายุไม่เกินสิบห้าปี",
+    "ทำท้องผู้เยาว์",
+    "ฉ้อโกงหลอกลวงประชาชน",
+    "ยักยอกทรัพย์ของนายจ้าง",
+    "ผิดสัญญาเช่าต้องชดใช้ค่าเสียหาย",
+    "หนี้เงินกู้ผิดนัดชำระ",
+    "แบ่งมรดกตามพินัยกรรม",
+    "จดทะเบียนสมรสและหย่า",
+    "จำนองที่ดินและขายฝาก",
+    "สิทธิและเสรีภาพของประชาชน",
+    "รัฐสภาและรัฐบาล",
+    "ภาษี VAT มูลค่าเพิ่ม",
+    "ลูกจ้างถูกเลิกจ้างได้ค่าชดเชย",
+    "เจาะระบบคอมพิวเตอร์ของผู้อื่น",
+    "อัตราโทษจำคุกและปรับ",
+    "ประมวลกฎหมายแพ่งและพาณิชย์",
+]
+
+CATEGORIES = [None, "ประมวลกฎหมายอาญา", "ประมวลกฎหมายแพ่งและพาณิชย์", "รัฐธรรมนูญแห่งราชอาณาจักรไทย"]
+
+
+# ---- search_laws ต้นฉบับ (git show 82dc956:main.py) ----
+
+# [ต่างจากต้นฉบับ] รับข้อกฎหมายเป็นพารามิเตอร์ laws แทน LAW_DATA
+def search_laws(laws: List[dict], query: str, category: Optional[str] = None) -> List[dict]:
+    """ค้นหาข้อกฎหมายที่เกี่ยวข้อง - ปรับปรุงให้แม่นยำและครอบคลุมมากขึ้น"""
+    query_words = pythainlp.word_tokenize(query, keep_whitespace=False)
+    results = []
+    
+    # คำสำคัญและคำพ้องความหมายที่ครอบคลุม
+    keyword_mappings = {
+        # อาญา - ความผิดต่อชีวิตและร่างกาย
+        'ฆ่า': ['ฆ่า', 'ฆาตกรรม', 'ประหาร', 'ฆ่าคนตาย', 'ฆาตกร', 'ฆาตร'],
+        'ทำร้ายร่างกาย': ['ทำร้าย', 'ร่างกาย', 'ตบ', 'ตี', 'ทุบ', 'เตะ', 'ต่อย', 'ชก', 'ทำร้ายร่างกาย', 'บาดเจ็บ'],
+        'ชำเรา': ['ชำเรา', 'ข่มขืน', 'อนาจาร', 'ข่มขืนกระทำชำเรา', 'กระทำชำเรา', 'ข่มขืนใจ'],
+        'พรากผู้เยาว์': ['พราก', 'ผู้เยาว์', 'เยาว์', 'เด็ก', 'พรากเด็ก', 'ลักพา', 'พาไป'],
+        
+        # อาญา - ความผิดต่อทรัพย์
+        'ลักทรัพย์': ['ลัก', 'ทรัพย์', 'ขโมย', 'ลักขโมย', 'ลักทรัพย์', 'ขโมยของ', 'ลักของ'],
+        'ฉ้อโกง': ['ฉ้อ', 'โกง', 'หลอก', 'ฉ้อโกง', 'หลอกลวง', 'โกงกิน', 'ทุจริต'],
+        'ปล้น': ['ปล้น', 'ชิง', 'โจร', 'ปล้นทรัพย์', 'ชิงทรัพย์', 'โจรกรรม'],
+        'ยักยอก': ['ยักยอก', 'ยักยอกทรัพย์', 'ยักยอกเงิน', 'ยักยอกของ'],
+        
+        # อาญา - ความผิดต่อความสงบสุข
+        'ยาเสพติด': ['ยาเสพติด', 'ยา', 'เสพ', 'ติด', 'เฮโรอีน', 'มอร์ฟีน', 'โคเคน', 'กัญชา', 'ยาบ้า', 'ไอซ์', 'แอมเฟตามีน'],
+        'คอร์รัปชัน': ['คอร์รัปชัน', 'ทุจริต', 'รับสินบน', 'สินบน', 'คอร์รัปชั่น', 'ทุจริตคอร์รัปชัน'],
+        
+        # อาญา - ความผิดเกี่ยวกับคอมพิวเตอร์
+        'คอมพิวเตอร์': ['คอมพิวเตอร์', 'ระบบ', 'ข้อมูล', 'แฮก', 'ไวรัส', 'สแปม', 'ลามก', 'เท็จ', 'ไซเบอร์', 'อินเทอร์เน็ต'],
+        'แฮก': ['แฮก', 'แฮกเกอร์', 'เข้าถึง', 'เจาะระบบ', 'เจาะข้อมูล'],
+        'ไวรัส': ['ไวรัส', 'มัลแวร์', 'สปายแวร์', 'ทรอยจัน', 'แรนซัมแวร์'],
+        
+        # แพ่ง - สัญญาและหนี้
+        'สัญญา': ['สัญญา', 'ข้อตกลง', 'สัญญาซื้อขาย', 'สัญญาเช่า', 'สัญญาจ้าง'],
+        'หนี้': ['หนี้', 'เงินกู้', 'เงินยืม', 'ชำระหนี้', 'ผิดนัด', 'ผิดสัญญา'],
+        'ละเมิด': ['ละเมิด', 'เสียหาย', 'ค่าสินไหม', 'ชดใช้', 'ชดเชย'],
+        
+        # แพ่ง - ครอบครัว
+        'สมรส': ['สมรส', 'แต่งงาน', 'จดทะเบียนสมรส', 'คู่สมรส'],
+        'หย่า': ['หย่า', 'หย่าร้าง', 'เลิกสมรส', 'แยกทาง'],
+        'มรดก': ['มรดก', 'พินัยกรรม', 'ทายาท', 'แบ่งมรดก', 'ผู้จัดการมรดก'],
+        
+        # แพ่ง - ที่ดินและอสังหาริมทรัพย์
+        'ที่ดิน': ['ที่ดิน', 'โฉนด', 'กรรมสิทธิ์', 'ภาระจำยอม', 'จำนอง', 'ขายฝาก'],
+        
+        # ภาษี
+        'ภาษี': ['ภาษี', 'vat', 'มูลค่าเพิ่ม', 'เงินได้', 'ยื่นแบบ', 'เสียภาษี', 'สรรพากร'],
+        
+        # ทรัพย์สินทางปัญญา
+        'ลิขสิทธิ์': ['ลิขสิทธิ์', 'ลิขสิทธิ์', 'ละเมิดลิขสิทธิ์'],
+        'สิทธิบัตร': ['สิทธิบัตร', 'สิทธิบัตร', 'ละเมิดสิทธิบัตร'],
+        'เครื่องหมายการค้า': ['เครื่องหมายการค้า', 'แบรนด์', 'โลโก้', 'เครื่องหมายการค้า'],
+        
+        # แรงงาน
+        'แรงงาน': ['แรงงาน', 'ลูกจ้าง', 'นายจ้าง', 'ไล่ออก', 'เลิกจ้าง', 'ค่าชดเชย'],
+        
+        # รัฐธรรมนูญ
+        'รัฐธรรมนูญ': ['รัฐธรรมนูญ', 'สิทธิ', 'เสรีภาพ', 'รัฐสภา', 'รัฐบาล', 'ศาล'],
+        'สิทธิ': ['สิทธิ', 'เสรีภาพ', 'สิทธิพลเมือง', 'สิทธิพื้นฐาน'],
+        
+        # คำถามทั่วไป
+        'โทษ': ['โทษ', 'จำคุก', 'ปรับ', 'ประหาร', 'กักขัง', 'คุมขัง'],
+        'อายุ': ['อายุ', 'ปี', 'ขวบ', 'ผู้เยาว์', 'ผู้ใหญ่', 'เด็ก'],
+        'เงิน': ['เงิน', 'บาท', 'ค่าปรับ', 'ค่าชดเชย', 'ค่าสินไหม', 'เงินกู้', 'เงินยืม']
+    }
+    
+    # คำหยุดที่ไม่ต้องค้นหา
+    stop_words = {'คือ', 'ที่', 'ใน', 'ของ', 'กับ', 'และ', 'หรือ', 'แต่', 'แล้ว', 'จะ', 'ได้', 'ให้', 'มี', 'เป็น', 'อยู่', 'ไป', 'มา', 'ทำ', 'ให้', 'ได้', 'ต้อง', 'ควร', 'จะ', 'อาจ', 'คง', 'น่าจะ', 'คงจะ', 'อาจจะ'}
+    
+    # [ต่างจากต้นฉบับ: user-014] เลขมาตราทุกตัวที่คำถามกล่าวถึง (รวมช่วงและรายการ) ต้องตรงกับรหัสทุกตัวอักษร
+    # และถ้าหมวดหมู่ที่เลือกมีมาตรานั้น ให้คะแนนเฉพาะมาตรานั้น ๆ
+    section_numbers = {code for match in main.SECTION_PATTERN.finditer(query.lower())
+                       for code in main.parse_section_numbers(match.group(1))}
+    section_found = any(law.get('code', '') in section_numbers for law in laws
+                        if not category or law.get("category") == category)
+
+    for law in laws:
+        # กรองตามหมวดหมู่
+        if category and law.get("category") != category:
+            continue
+            
+        # คำนวณคะแนนความเกี่ยวข้อง
+        score = 0
+        law_text = f"{law.get('title', '')} {law.get('text', '')}".lower()
+        query_lower = query.lower()
+        
+        # 1. ค้นหาตามเลขมาตรา (ให้คะแนนสูงสุด)
+        # [ต่างจากต้นฉบับ: user-014] แทน re.search ของเลขมาตราแรกและการตรวจ substring ของรหัส/ชื่อมาตรา
+        if section_found:
+            if law.get('code', '') not in section_numbers:
+                continue
+            score += 1000  # คะแนนสูงสุดสำหรับการค้นหาตามเลขมาตรา
+        
+        # 2. ค้นหาตามคำสำคัญและคำพ้องความหมาย
+        for keyword_group, synonyms in keyword_mappings.items():
+            if any(synonym in query_lower for synonym in synonyms):
+                if any(synonym in law_text for synonym in synonyms):
+                    score += 50  # คะแนนสูงสำหรับคำสำคัญ
+                    
+                    # ให้คะแนนเพิ่มถ้าคำสำคัญอยู่ในชื่อมาตรา
+                    if any(synonym in law.get('title', '').lower() for synonym in synonyms):
+                        score += 30
+        
+        # 3. ค้นหาตามคำทั่วไป (ยกเว้นคำหยุด)
+        for word in query_words:
+            word_lower = word.lower()
+            if word_lower not in stop_words and len(word_lower) > 1:
+                if word_lower in law_text:
+                    score += 2
+                    
+                    # ให้คะแนนเพิ่มถ้าคำอยู่ในชื่อมาตรา
+                    if word_lower in law.get('title', '').lower():
+                        score += 5
+        
+        # 4. ค้นหาตามวลีหรือประโยคที่เกี่ยวข้อง
+        # แบ่งคำถามเป็นวลี 2-3 คำ
+        query_phrases = []
+        for i in range(len(query_words) - 1):
+            phrase = ' '.join(query_words[i:i+2])
+            if len(phrase) > 3:
+                query_phrases.append(phrase)
+        
+        for phrase in query_phrases:
+            if phrase.lower() in law_text:
+                score += 10
+        
+        # 5. ค้นหาตามหมวดกฎหมายที่เกี่ยวข้อง
+        law_category = law.get('category', '').lower()
+        if 'อาญา' in law_category and any(word in query_lower for word in ['ผิด', 'โทษ', 'อาญา', 'จำคุก', 'ปรับ', 'ประหาร']):
+            score += 15
+        elif 'แพ่ง' in law_category and any(word in query_lower for word in ['สัญญา', 'หนี้', 'ละเมิด', 'มรดก', 'ครอบครัว']):
+            score += 15
+        elif 'รัฐธรรมนูญ' in law_category and any(word in query_lower for word in ['สิทธิ', 'เสรีภาพ', 'รัฐสภา', 'รัฐบาล']):
+            score += 15
+        
+        # 6. ค้นหาตามบริบทพิเศษ
+        # กรณีชำเราผู้เยาว์
+        if any(word in query_lower for word in ['ท้อง', 'ทำท้อง', 'ชำเรา', 'ข่มขืน', 'เด็ก', 'ผู้เยาว์']):
+            if law.get('code', '') == '277':  # [ต่างจากต้นฉบับ: user-014] รหัสตรงทุกตัวอักษร
+                score += 200
+            elif 'ชำเรา' in law_text:
+                score += 150
+            elif 'ผู้เยาว์' in law_text:
+                score += 100
+        
+        # กรณีลักทรัพย์
+        if any(word in query_lower for word in ['ลัก', 'ขโมย', 'ทรัพย์']):
+            if 'ลักทรัพย์' in law_text or 'ขโมย' in law_text:
+                score += 100
+        
+        # กรณีทำร้ายร่างกาย
+        if any(word in query_lower for word in ['ทำร้าย', 'ตบ', 'ตี', 'ต่อย']):
+            if 'ทำร้าย' in law_text:
+                score += 100
+        
+        # กรณีฆ่า
+        if any(word in query_lower for word in ['ฆ่า', 'ฆาตกรรม']):
+            if 'ฆ่า' in law_text:
+                score += 100
+        
+        # 7. ค้นหาตามความถี่ของคำ
+        for word in query_words:
+            word_lower = word.lower()
+            if word_lower not in stop_words and len(word_lower) > 1:
+                word_count = law_text.count(word_lower)
+                if word_count > 0:
+                    score += min(word_count, 10)  # จำกัดคะแนนสูงสุดที่ 10
+        
+        # 8. ค้นหาตามความยาวของคำที่ตรงกัน
+        for word in query_words:
+            word_lower = word.lower()
+            if word_lower not in stop_words and len(word_lower) > 2:
+                if word_lower in law_text:
+                    score += len(word_lower)  # ยิ่งคำยาวยิ่งให้คะแนนสูง
+        
+        if score > 0:
+            results.append({
+                **law,
+                "relevance_score": score
+            })
+    
+    # เรียงตามคะแนนความเกี่ยวข้อง
+    results.sort(key=lambda x: x["relevance_score"], reverse=True)
+    return results  # [ต่างจากต้นฉบับ] คืนผลทั้งหมด (ต้นฉบับตัดเหลือ 10 อันดับแรก)
+
+
+@pytest.mark.parametrize("category", CATEGORIES)
+@pytest.mark.parametrize("query", QUERIES)
+def test_search_laws_matches_baseline(snapshot, records, query, category):
+    expected = search_laws(records, query, category)
+    with pinned(snapshot):
+        results = main.search_laws(query, category, "legacy", limit=len(records))
+    assert results == expected
+
+
+@pytest.mark.parametrize("query", QUERIES[:6])
+def test_search_laws_top_results_match_baseline(snapshot, records, query):
+    with pinned(snapshot):
+        results = main.search_laws(query, None, "legacy")
+    assert results == search_laws(records, query, None)[:10]